@@ -11,6 +11,7 @@ from typing import List, Dict, Any
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import math
 import os
 import time
 import psycopg2
@@ -18,9 +19,11 @@ import hashlib
 
 # New architecture imports
 try:
-    from deps import get_db_pool, get_redis_client
+    from deps import PRIORITY_LOW, get_db_pool, get_redis_client
     from ranking.rank import rank_jobs
-    from scoring import compute_unified_score
+    from scoring import compute_unified_score, memoized_unified_score, profile_signature as scoring_profile_signature
+    from scoring.memo import REQUEST_LOCK_WAIT_ATTEMPTS
+    from utils.locations import parse_location
     from utils.search_queue import enqueue_search_query, get_cache_key
     NEW_ARCH_ENABLED = True
 except Exception as e:
@@ -29,13 +32,21 @@ except Exception as e:
 
 # Optional import for geonames aliases
 try:
-    from utils.geonames import get_city_aliases as _get_city_aliases  # type: ignore
+    from utils.geonames import get_city_aliases as _get_city_aliases, start_prewarm as _start_geonames_prewarm  # type: ignore
 except Exception:
     _get_city_aliases = None
+    _start_geonames_prewarm = None
 
 app = Flask(__name__)
 CORS(app)
 
+
+@app.before_request
+def _prewarm_geonames():
+    """Warm alias caches for the top cities in the serving process, not at import (start_prewarm runs once)."""
+    if _start_geonames_prewarm is not None:
+        _start_geonames_prewarm()
+
 # Ensure UTF-8 encoding for JSON responses
 app.config['JSON_AS_ASCII'] = False  # This ensures Unicode characters are not escaped
 
@@ -537,6 +548,51 @@ def health_check():
         'version': '1.0.0'
     })
 
+@app.route('/api/metrics/queue-delay', methods=['GET'])
+def queue_delay_metrics():
+    """Queueing delay of fetch tasks per priority lane (interactive vs refresh)."""
+    try:
+        from deps import LANES
+        from utils.queue_metrics import get_queue_delay_metrics
+        redis_client = get_redis_client()
+        if not redis_client:
+            return jsonify({'error': 'Redis not configured'}), 503
+        return jsonify(get_queue_delay_metrics(redis_client, LANES))
+    except Exception as e:
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/metrics/refresh-yield', methods=['GET'])
+def refresh_yield_metrics():
+    """Per-source refresh yield (new vs duplicate jobs, cost) and the resulting cadence multiplier."""
+    try:
+        from deps import SOURCE_CLASSES
+        from pipelines.yield_stats import YieldStats, cadence_factor
+        redis_client = get_redis_client()
+        if not redis_client:
+            return jsonify({'error': 'Redis not configured'}), 503
+        yield_stats = YieldStats(redis_client)
+        metrics = {}
+        for source in SOURCE_CLASSES:
+            summary = yield_stats.summary(source)
+            metrics[source] = {**summary, 'cadence_factor': cadence_factor(summary)}
+        return jsonify(metrics)
+    except Exception as e:
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/metrics/adaptive-limits', methods=['GET'])
+def adaptive_limit_metrics():
+    """Current AIMD concurrency limits shared by workers (from Redis)."""
+    try:
+        from utils.adaptive_limit import get_adaptive_metrics
+        redis_client = get_redis_client()
+        if not redis_client:
+            return jsonify({'error': 'Redis not configured'}), 503
+        return jsonify({
+            'linkedin_detail': get_adaptive_metrics(redis_client, 'linkedin:detail'),
+        })
+    except Exception as e:
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
 # Legacy /api/search-agent endpoint removed - use /api/search-new instead
 # Legacy /api/keywords-agent endpoint removed
 
@@ -664,9 +720,19 @@ def search_new():
         experience_level = data.get('experience_level')
         remote_type = data.get('remote_type')
         where_in = data.get('where')  # Search location preference ("Any", "Remote", or specific location)
+        within_km = data.get('within_km')  # Optional radius around the user's city
+        if within_km in (None, ''):
+            within_km = None
+        else:
+            try:
+                within_km = float(within_km)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'within_km must be a number of kilometres'}), 400
+            if not math.isfinite(within_km) or within_km <= 0:
+                return jsonify({'error': 'within_km must be greater than 0'}), 400
         
         # Debug: log received location
-        print(f"[Search-New] Received location='{location}', where='{where_in}', remote_type='{remote_type}'")
+        print(f"[Search-New] Received location='{location}', where='{where_in}', remote_type='{remote_type}', within_km={within_km}")
         
         # Extract user's location components for tiered matching when "Any" is selected
         user_location_city = None
@@ -760,7 +826,18 @@ def search_new():
         # Normalize skills for cache key (sort to ensure consistent keys)
         skills_normalized = sorted(skills_in) if skills_in else []
         sources_normalized = sorted(sources) if sources else []
-        cache_key = f"search:{get_cache_key(keywords, location, experience_level=experience_level, remote_type=remote_type, where=where_in, page=page, page_size=page_size, sources=sources_normalized, skills=skills_normalized)}"
+        cache_key = f"search:{get_cache_key(keywords, location, experience_level=experience_level, remote_type=remote_type, where=where_in, page=page, page_size=page_size, sources=sources_normalized, skills=skills_normalized, within_km=within_km)}"
+        # Feed the scheduler's popularity table (first pages only: paging is not extra demand)
+        if redis_client and page == 1:
+            try:
+                from pipelines.popularity import QueryPopularity
+                popularity_location = location if use_tiered_location else (search_location or location or "")
+                popularity_sources = [s for s in (sources or []) if str(s).lower() != 'naukri']
+                if len(popularity_sources) != 1:
+                    popularity_sources = list({*popularity_sources, 'linkedin'})  # same sources a fetch would use
+                QueryPopularity(redis_client).record(keywords, popularity_location, remote_type, popularity_sources)
+            except Exception as pe:
+                print(f"[Search-New] Popularity record failed: {pe}")
         cached = None
         if redis_client and not no_cache:
             try:
@@ -808,6 +885,7 @@ def search_new():
                                 page=page,
                                 page_size=page_size,
                                 user_id=user_id,
+                                priority=PRIORITY_LOW,  # Results were already served from cache
                             )
                             print(f"[Search-New] Enqueued background refresh on cache hit: {msg_id}")
                             # Set cooldown (5 minutes)
@@ -948,6 +1026,7 @@ def search_new():
                     user_location_city=user_location_city,  # Always pass for tiered ranking
                     user_location_country=user_location_country,  # Always pass for tiered ranking
                     user_id=user_id,  # Order by user-specific scores when available
+                    within_km=within_km,
                 )
                 print(f"[Search-New] Page {page}: Fetched {len(all_jobs)} jobs from rank_jobs (offset={offset}, requested {page_size + 1})")
                 # Log job IDs for debugging duplicate pages
@@ -990,6 +1069,15 @@ def search_new():
                     except Exception as e:
                         print(f"[Search-New] ⚠️  Failed to fetch search location aliases: {e}")
 
+                # Searcher's canonical city/country for location tiers, resolved once per request
+                user_location_resolved = None
+                if location and user_location_city:
+                    try:
+                        from utils.locations import resolve_user_location
+                        user_location_resolved = resolve_user_location(user_location_city, user_location_country)
+                    except Exception as e:
+                        print(f"[Search-New] ⚠️  Failed to resolve user location: {e}")
+
                 def apply_unified_scoring(records):
                     """
                     Calculate user-specific match scores for jobs.
@@ -1001,6 +1089,15 @@ def search_new():
                     redis_client = get_redis_client()
                     # Cache key now incorporates profile signature so stale scores aren't reused
                     cache_prefix = f"job_score:{user_id}:{profile_signature}:"
+                    # Shared score memo (same keys the worker uses) so identical content is scored once
+                    memo_signature = scoring_profile_signature(
+                        keywords=unified_context['keywords'],
+                        skills=unified_context['skills'],
+                        location=unified_context['location'],
+                        experience_level=unified_context['experience_level'],
+                        remote_preference=unified_context['remote_preference'],
+                        search_location_aliases=search_location_aliases,
+                    )
                     
                     for idx, job in enumerate(records):
                         job_id = job.get('id')
@@ -1072,7 +1169,7 @@ def search_new():
                             job['match_score'] = cached_score
                             # Still compute components for display
                             try:
-                                scoring = compute_unified_score(
+                                scoring = memoized_unified_score(
                                     job,
                                     keywords=unified_context['keywords'],
                                     skills=unified_context['skills'],
@@ -1080,6 +1177,9 @@ def search_new():
                                     experience_level=unified_context['experience_level'],
                                     remote_preference=unified_context['remote_preference'],
                                     search_location_aliases=search_location_aliases,
+                                    signature=memo_signature,
+                                    redis_client=redis_client,
+                                    lock_wait_attempts=REQUEST_LOCK_WAIT_ATTEMPTS,
                                 )
                                 job['match_components'] = scoring.get('components', {})
                                 job['match_details'] = scoring.get('details', {})
@@ -1098,7 +1198,7 @@ def search_new():
                                 job['_user_score'] = db_score
                                 job['match_score'] = db_score
                             try:
-                                scoring = compute_unified_score(
+                                scoring = memoized_unified_score(
                                     job,
                                     keywords=unified_context['keywords'],
                                     skills=unified_context['skills'],
@@ -1106,6 +1206,9 @@ def search_new():
                                     experience_level=unified_context['experience_level'],
                                     remote_preference=unified_context['remote_preference'],
                                     search_location_aliases=search_location_aliases,
+                                    signature=memo_signature,
+                                    redis_client=redis_client,
+                                    lock_wait_attempts=REQUEST_LOCK_WAIT_ATTEMPTS,
                                 )
                                 job['match_components'] = scoring.get('components', {})
                                 job['match_details'] = scoring.get('details', {})
@@ -1114,7 +1217,7 @@ def search_new():
                         else:
                             # No cache, compute score
                             try:
-                                scoring = compute_unified_score(
+                                scoring = memoized_unified_score(
                                     job,
                                     keywords=unified_context['keywords'],
                                     skills=unified_context['skills'],
@@ -1122,69 +1225,17 @@ def search_new():
                                     experience_level=unified_context['experience_level'],
                                     remote_preference=unified_context['remote_preference'],
                                     search_location_aliases=search_location_aliases,
+                                    signature=memo_signature,
+                                    redis_client=redis_client,
+                                    lock_wait_attempts=REQUEST_LOCK_WAIT_ATTEMPTS,
                                 )
                                 match_score = scoring['score']
                                 
-                                # Apply location tier boost (user-specific, not stored in DB)
-                                if unified_context['location'] and user_location_city:
+                                # Apply location tier / distance boost (user-specific, not stored in DB)
+                                if unified_context['location'] and user_location_resolved is not None:
                                     try:
-                                        from ranking.rank import _city_matches_with_aliases, get_country_variants
-                                        from utils.geonames import get_city_aliases
-                                        
-                                        def country_matches(job_location: str, country_variants: set) -> bool:
-                                            job_loc_lower = job_location.lower()
-                                            return any(variant.lower() in job_loc_lower for variant in country_variants)
-                                        
-                                        user_location_parts = (unified_context['location'] or "").lower().split(",")
-                                        user_city = user_location_parts[0].strip() if user_location_parts else None
-                                        user_country = user_location_parts[-1].strip() if len(user_location_parts) > 1 else None
-                                        
-                                        tier_boost = {
-                                            'exact': 1.3,
-                                            'city': 1.2,
-                                            'country': 1.1,
-                                            'other': 1.0,
-                                        }
-                                        
-                                        job_location = (job.get("location") or "").lower()
-                                        job_location_raw = job.get("location") or ""
-                                        location_tier = 'other'
-                                        
-                                        if user_city and user_country:
-                                            user_city_aliases = None
-                                            try:
-                                                user_city_lower = user_city.lower()
-                                                user_city_aliases = {user_city_lower} | set(get_city_aliases(user_city_lower))
-                                            except Exception:
-                                                user_city_aliases = {user_city.lower()}
-                                            
-                                            city_match = _city_matches_with_aliases(job_location_raw, user_city, user_city_aliases)
-                                            country_variants = get_country_variants(user_country)
-                                            country_match = country_matches(job_location, country_variants)
-                                            
-                                            if city_match and country_match:
-                                                location_tier = 'exact'
-                                            elif city_match:
-                                                location_tier = 'city'
-                                            elif country_match:
-                                                location_tier = 'country'
-                                        elif user_city:
-                                            user_city_aliases = None
-                                            try:
-                                                user_city_lower = user_city.lower()
-                                                user_city_aliases = {user_city_lower} | set(get_city_aliases(user_city_lower))
-                                            except Exception:
-                                                user_city_aliases = {user_city.lower()}
-                                            
-                                            if _city_matches_with_aliases(job_location_raw, user_city, user_city_aliases):
-                                                location_tier = 'city'
-                                        elif user_country:
-                                            country_variants = get_country_variants(user_country)
-                                            if country_matches(job_location, country_variants):
-                                                location_tier = 'country'
-                                        
-                                        boost_multiplier = tier_boost.get(location_tier, 1.0)
-                                        match_score = min(1.0, match_score * boost_multiplier)
+                                        from utils.locations import location_boost
+                                        match_score = min(1.0, match_score * location_boost(user_location_resolved, job))
                                     except Exception:
                                         pass  # Use original score if boost fails
                                 
@@ -2120,14 +2171,24 @@ def search_new():
                                                     j.get('normalized_title'),
                                                     j.get('description'),
                                                     j.get('location'),
+                                                    j.get('city'),
+                                                    j.get('region'),
+                                                    j.get('country_code'),
+                                                    j.get('geoname_id'),
+                                                    j.get('latitude'),
+                                                    j.get('longitude'),
+                                                    j.get('geo_cell'),
                                                     j.get('url'),
                                                     j.get('posted_at'),
                                                     j.get('hash'),
                                                 ))
                                             if rows:
+                                                # Canonical location columns too: the re-read below ranks and radius-filters on them
                                                 _exec_vals(
                                                     cold_cur,
-                                                    """INSERT INTO jobs (source_id, external_id, company, title, normalized_title, description, location, url, posted_at, hash)
+                                                    """INSERT INTO jobs (source_id, external_id, company, title, normalized_title, description, location,
+                                                                         city, region, country_code, geoname_id, latitude, longitude, geo_cell,
+                                                                         url, posted_at, hash)
                                                        VALUES %s ON CONFLICT (source_id, external_id) DO NOTHING""",
                                                     rows
                                                 )
@@ -2157,6 +2218,7 @@ def search_new():
                                 user_location_city=user_location_city,  # Pass for tiered ranking
                                 user_location_country=user_location_country,  # Pass for tiered ranking
                                 user_id=user_id,  # Order by user-specific scores when available
+                                within_km=within_km,
                             )
                             print(f"[Search-New] Cold-start: re-read {len(all_jobs)} jobs from DB after upsert")
 
@@ -2221,7 +2283,7 @@ def search_new():
                         desc = _re.sub(r"\bshow\s*(more|less)\b", "", desc, flags=_re.I)
                         url_v = getattr(j, 'url', '') or ''
 
-                        scoring = compute_unified_score(
+                        scoring = memoized_unified_score(
                             {
                                 'title': title,
                                 'description': desc,
@@ -2236,6 +2298,7 @@ def search_new():
                             location=location,
                             experience_level=experience_level,
                             remote_preference=remote_type or where_in,
+                            lock_wait_attempts=REQUEST_LOCK_WAIT_ATTEMPTS,
                         )
 
                         shaped.append({
@@ -2364,7 +2427,7 @@ def search_new():
                         desc = _re.sub(r"\bshow\s*(more|less)\b", "", desc, flags=_re.I)
                         url_v = getattr(j, 'url', '') or ''
 
-                        scoring = compute_unified_score(
+                        scoring = memoized_unified_score(
                             {
                                 'title': title,
                                 'description': desc,
@@ -2379,6 +2442,7 @@ def search_new():
                             location=location,
                             experience_level=experience_level,
                             remote_preference=remote_type or where_in,
+                            lock_wait_attempts=REQUEST_LOCK_WAIT_ATTEMPTS,
                         )
 
                         shaped.append({
@@ -2534,18 +2598,29 @@ def search_new():
                                                         ext_candidates.append(c_clean)
                                             
                                             upserted = False
+                                            parsed_loc = parse_location(item.get('location') or None)
                                             for ext_candidate in ext_candidates:
                                                 try:
+                                                    # Canonical location columns follow whichever location is kept
                                                     _cur2.execute(
                                                         """
-                                                        INSERT INTO jobs (source_id, external_id, title, company, description, location, url, last_match_score)
-                                                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                                                        INSERT INTO jobs (source_id, external_id, title, company, description, location,
+                                                                          city, region, country_code, geoname_id, latitude, longitude, geo_cell,
+                                                                          url, last_match_score)
+                                                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                                                         ON CONFLICT (source_id, external_id) DO UPDATE SET
                                                             last_match_score = EXCLUDED.last_match_score,
                                                             title = COALESCE(EXCLUDED.title, jobs.title),
                                                             company = COALESCE(EXCLUDED.company, jobs.company),
                                                             description = COALESCE(EXCLUDED.description, jobs.description),
                                                             location = COALESCE(NULLIF(EXCLUDED.location, ''), jobs.location),
+                                                            city = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.city ELSE jobs.city END,
+                                                            region = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.region ELSE jobs.region END,
+                                                            country_code = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.country_code ELSE jobs.country_code END,
+                                                            geoname_id = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.geoname_id ELSE jobs.geoname_id END,
+                                                            latitude = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.latitude ELSE jobs.latitude END,
+                                                            longitude = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.longitude ELSE jobs.longitude END,
+                                                            geo_cell = CASE WHEN NULLIF(EXCLUDED.location, '') IS NOT NULL THEN EXCLUDED.geo_cell ELSE jobs.geo_cell END,
                                                             url = COALESCE(EXCLUDED.url, jobs.url)
                                                         """,
                                                         (
@@ -2555,6 +2630,13 @@ def search_new():
                                                             item.get('company') or None,
                                                             item.get('description') or None,
                                                             item.get('location') or None,
+                                                            parsed_loc.city,
+                                                            parsed_loc.region,
+                                                            parsed_loc.country_code,
+                                                            parsed_loc.geoname_id,
+                                                            parsed_loc.latitude,
+                                                            parsed_loc.longitude,
+                                                            parsed_loc.geo_cell,
                                                             url_v or None,
                                                             float(score_val),
                                                         )
@@ -2600,17 +2682,30 @@ def search_new():
                                         if m2:
                                             ext_id = m2.group(1)
                                     if ext_id:
-                                        loc_rows.append((ext_id, loc_v))
+                                        loc_rows.append((ext_id, loc_v) + tuple(parse_location(loc_v)))
                                 if loc_rows and _source_id:
-                                    _cur2.execute("CREATE TEMPORARY TABLE IF NOT EXISTS temp_li_locs (external_id TEXT, location TEXT) ON COMMIT DROP")
+                                    _cur2.execute(
+                                        """CREATE TEMPORARY TABLE IF NOT EXISTS temp_li_locs (
+                                               external_id TEXT, location TEXT, city TEXT, region TEXT, country_code TEXT,
+                                               geoname_id BIGINT, latitude DOUBLE PRECISION, longitude DOUBLE PRECISION, geo_cell INTEGER
+                                           ) ON COMMIT DROP"""
+                                    )
                                     from psycopg2.extras import execute_values as _exec_vals
-                                    _exec_vals(_cur2, "INSERT INTO temp_li_locs (external_id, location) VALUES %s", loc_rows)
+                                    _exec_vals(
+                                        _cur2,
+                                        """INSERT INTO temp_li_locs (external_id, location, city, region, country_code, geoname_id, latitude, longitude, geo_cell)
+                                           VALUES %s""",
+                                        loc_rows,
+                                    )
+                                    # Only rows without a location take the new one, with its canonical parts
                                     _cur2.execute(
                                         """
                                         UPDATE jobs j
-                                        SET location = COALESCE(NULLIF(j.location, ''), t.location)
+                                        SET location = t.location, city = t.city, region = t.region, country_code = t.country_code,
+                                            geoname_id = t.geoname_id, latitude = t.latitude, longitude = t.longitude, geo_cell = t.geo_cell
                                         FROM temp_li_locs t
                                         WHERE j.source_id = %s AND j.external_id = t.external_id
+                                          AND NULLIF(j.location, '') IS NULL
                                         """,
                                         (_source_id,)
                                     )
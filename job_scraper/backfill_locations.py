@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from deps import get_db_pool
 from connectors.linkedin import LinkedInConnector
+from utils.locations import parse_location
 
 
 async def backfill_linkedin_locations(
@@ -133,6 +134,9 @@ async def backfill_linkedin_locations(
                     stats['processed'] += 1
                     try:
                         detail = await task
+                        if detail.get('_blocked') and not connector.disable_playwright:
+                            # HTTP got a 999 block: render the page on a pooled browser instead
+                            detail = await connector._fetch_detail_with_playwright(url)
                         location = detail.get('location')
                         description = detail.get('description_html')
                         
@@ -158,7 +162,8 @@ async def backfill_linkedin_locations(
                                 has_updates = True
                         
                         if has_updates:
-                            updates.append((external_id, update_location, update_description))
+                            parsed = parse_location(update_location) if update_location else (None,) * 7
+                            updates.append((external_id, update_location, update_description, *parsed))
                             updates_str = []
                             if update_location:
                                 updates_str.append(f"location='{update_location}'")
@@ -183,14 +188,21 @@ async def backfill_linkedin_locations(
                             CREATE TEMPORARY TABLE IF NOT EXISTS temp_location_updates (
                                 external_id TEXT,
                                 location TEXT,
-                                description TEXT
+                                description TEXT,
+                                city TEXT,
+                                region TEXT,
+                                country_code TEXT,
+                                geoname_id INTEGER,
+                                latitude DOUBLE PRECISION,
+                                longitude DOUBLE PRECISION,
+                                geo_cell INTEGER
                             ) ON COMMIT DROP
                         """)
                         
                         # Insert updates
                         execute_values(
                             update_cur,
-                            "INSERT INTO temp_location_updates (external_id, location, description) VALUES %s",
+                            "INSERT INTO temp_location_updates (external_id, location, description, city, region, country_code, geoname_id, latitude, longitude, geo_cell) VALUES %s",
                             updates
                         )
                         
@@ -200,6 +212,13 @@ async def backfill_linkedin_locations(
                             UPDATE jobs j
                             SET 
                                 location = COALESCE(NULLIF(t.location, ''), j.location),
+                                city = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.city ELSE j.city END,
+                                region = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.region ELSE j.region END,
+                                country_code = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.country_code ELSE j.country_code END,
+                                geoname_id = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.geoname_id ELSE j.geoname_id END,
+                                latitude = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.latitude ELSE j.latitude END,
+                                longitude = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.longitude ELSE j.longitude END,
+                                geo_cell = CASE WHEN NULLIF(t.location, '') IS NOT NULL THEN t.geo_cell ELSE j.geo_cell END,
                                 description = CASE 
                                     WHEN t.description IS NOT NULL AND t.description != '' 
                                          AND (j.description IS NULL OR j.description = '' OR LENGTH(t.description) > LENGTH(j.description))
@@ -239,6 +258,11 @@ async def backfill_linkedin_locations(
     finally:
         if conn:
             db_pool.putconn(conn)
+        try:
+            from utils.browser_pool import close_browser_pools
+            await close_browser_pools()
+        except Exception:
+            pass
     
     return stats
 
@@ -265,6 +289,80 @@ async def backfill_all_sources(limit: Optional[int] = None, dry_run: bool = Fals
     }
 
 
+def backfill_canonical_locations(
+    limit: Optional[int] = None,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    recompute: bool = False,
+) -> Dict[str, Any]:
+    """
+    Parse jobs.location into the canonical city/region/country_code/geoname_id and
+    latitude/longitude/geo_cell columns for rows stored before sql/005_job_locations.sql
+    (no network; each distinct location string is parsed once). recompute also
+    re-parses rows that have a city but no coordinates (sql/006_job_coordinates.sql).
+    """
+    from psycopg2.extras import execute_values
+
+    stats = {'processed': 0, 'updated': 0, 'unparsed': 0}
+    db_pool = get_db_pool()
+    if not db_pool:
+        print("[Backfill] ❌ Database not configured")
+        return stats
+    conn = db_pool.getconn()
+    last_id = 0
+    missing = "latitude IS NULL" if recompute else "city IS NULL AND country_code IS NULL"
+    try:
+        while limit is None or stats['processed'] < limit:
+            take = batch_size if limit is None else min(batch_size, limit - stats['processed'])
+            with conn.cursor() as cur:
+                # Keyset pagination: rows that don't parse are not revisited
+                cur.execute(
+                    f"""
+                    SELECT id, location FROM jobs
+                    WHERE location IS NOT NULL AND {missing}
+                      AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (last_id, take),
+                )
+                rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            stats['processed'] += len(rows)
+            updates = []
+            for job_id, location in rows:
+                parsed = parse_location(location)
+                if parsed.city is None and parsed.country_code is None:
+                    stats['unparsed'] += 1
+                    continue
+                updates.append((job_id, *parsed))
+            if updates and not dry_run:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        """
+                        UPDATE jobs j
+                        SET city = v.city, region = v.region, country_code = v.country_code, geoname_id = v.geoname_id,
+                            latitude = v.latitude, longitude = v.longitude, geo_cell = v.geo_cell
+                        FROM (VALUES %s) AS v(id, city, region, country_code, geoname_id, latitude, longitude, geo_cell)
+                        WHERE j.id = v.id
+                        """,
+                        updates,
+                        template="(%s::bigint, %s, %s, %s, %s::integer, %s::double precision, %s::double precision, %s::integer)",
+                    )
+                conn.commit()
+            stats['updated'] += len(updates)
+            print(f"[Backfill] Canonical locations: {stats['processed']} processed, {stats['updated']} parsed, {stats['unparsed']} unparsed")
+    except Exception as e:
+        print(f"[Backfill] ❌ Error: {e}")
+        conn.rollback()
+    finally:
+        db_pool.putconn(conn)
+    return stats
+
+
 def main():
     """CLI entry point."""
     import argparse
@@ -275,12 +373,16 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Dry run mode (no database updates)')
     parser.add_argument('--source', type=str, choices=['linkedin', 'all'], default='all', help='Source to backfill (default: all)')
     parser.add_argument('--no-descriptions', action='store_true', help='Skip description backfill (only update locations)')
+    parser.add_argument('--canonical', action='store_true', help='Only parse stored locations into city/region/country_code/geoname_id and coordinates')
+    parser.add_argument('--recompute', action='store_true', help='With --canonical: also re-parse rows that have no coordinates yet')
     
     args = parser.parse_args()
     
     backfill_descriptions = not args.no_descriptions
     
-    if args.source == 'linkedin':
+    if args.canonical:
+        backfill_canonical_locations(limit=args.limit, dry_run=args.dry_run, recompute=args.recompute)
+    elif args.source == 'linkedin':
         stats = asyncio.run(backfill_linkedin_locations(
             limit=args.limit,
             batch_size=args.batch_size,
@@ -1,16 +1,23 @@
 """
 Adzuna connector (async HTTP API).
 """
+import asyncio
+import math
 import os
-import httpx
-from typing import List, Optional
-from datetime import datetime
-from connectors.base import JobConnector, RawJob, SearchQuery
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+from datetime import datetime, timezone
+from connectors.base import JobConnector, RawJob, SearchQuery, count_token, older_than, posted_since
+
+# Longest a request waits for a rate-limit token before its phrase stops paging
+ADZUNA_TOKEN_WAIT_SECONDS = float(os.getenv("ADZUNA_TOKEN_WAIT_SECONDS", "15"))
 
 
 class AdzunaConnector(JobConnector):
     """Adzuna job aggregator API connector."""
     
+    meters_requests = True
+    
     @property
     def name(self) -> str:
         return "adzuna"
@@ -23,15 +30,32 @@ class AdzunaConnector(JobConnector):
         self.base_url = "https://api.adzuna.com/v1/api/jobs"
         self.app_id = os.getenv("ADZUNA_APP_ID", "")
         self.app_key = os.getenv("ADZUNA_APP_KEY", "")
+        self.max_pages = 3
+        self.max_concurrency = int(os.getenv("ADZUNA_MAX_CONCURRENCY", "8"))
     
     async def fetch(self, query: SearchQuery, since: Optional[datetime] = None) -> List[RawJob]:
-        """Fetch jobs from Adzuna API."""
+        """
+        Fetch jobs from Adzuna API.
+        Phrases are fetched concurrently (bounded by the source's rate-limit burst), each
+        page only after the phrase's previous page, which can stop the phrase early.
+        Every request takes its own token from the source's rate-limit bucket.
+        """
+        collected = [item async for item in self._stream_grid(query, since)]
+        collected.sort(key=lambda item: item[0])
+        jobs = [raw for _, raw in collected]
+        return jobs[:query.max_results]
+    
+    async def fetch_stream(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[RawJob]:
+        """Yield jobs page by page as Adzuna responds (completion order)."""
+        async for _, raw in self._stream_grid(query, since):
+            yield raw
+    
+    async def _stream_grid(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[Tuple[tuple, RawJob]]:
+        """Yield ((phrase, page, position), job) for unique jobs as each grid cell completes."""
         if not self.app_id or not self.app_key:
             print("[Adzuna] Missing credentials")
-            return []
+            return
         
-        jobs: List[RawJob] = []
-
         # Build per-profile phrases; we'll query Adzuna separately for each phrase
         kws = [str(k).strip() for k in (query.keywords or []) if str(k).strip()]
         phrases: List[str] = []
@@ -43,70 +67,149 @@ class AdzunaConnector(JobConnector):
 
         country = self._infer_country(query.location)
         is_remote = query.remote_type == "remote" or any("remote" in k.lower() for k in query.keywords)
-        
-        async with httpx.AsyncClient(timeout=12.0) as client:
-            # Treat each phrase as an OR branch: stop when we have enough jobs
-            for phrase_idx, phrase in enumerate(phrases):
-                if len(jobs) >= query.max_results:
-                    break
+        per_page = min(query.max_results, 50)
+        url_base = f"{self.base_url}/{country}/search"
 
-                try:
-                    print(
-                        f"[Adzuna] Fetch phrase {phrase_idx+1}/{len(phrases)}: "
-                        f"what='{phrase}' loc='{query.location or ''}' "
-                        f"country='{country}' remote={is_remote} max_results={query.max_results}"
-                    )
-                except Exception:
-                    pass
-
-                for page in range(1, 4):
-                    if len(jobs) >= query.max_results:
-                        break
+        # Page-major order: every phrase's first page is queued before any deeper page
+        grid = [(phrase_idx, page) for page in range(1, self.max_pages + 1) for phrase_idx in range(len(phrases))]
+        concurrency = max(1, min(len(grid), self.max_concurrency, self._source_burst()))
+        try:
+            print(
+                f"[Adzuna] Fetch {len(phrases)} phrase(s) x {self.max_pages} page(s): "
+                f"loc='{query.location or ''}' country='{country}' remote={is_remote} "
+                f"max_results={query.max_results} concurrency={concurrency}"
+            )
+        except Exception:
+            pass
 
-                params = {
-                    "app_id": self.app_id,
-                    "app_key": self.app_key,
-                        "what": phrase,
-                    "results_per_page": min(query.max_results, 50),
-                }
-                    # Location handling
-                if is_remote:
-                    params["what_or"] = "remote"
-                    params["where"] = ""
-                    else:
-                        # Use a normalized city-only location for Adzuna's "where" filter when not remote
-                        if query.location:
-                            # Adzuna behaves better with just the city (e.g. "Bengaluru" instead of "Bengaluru, KA")
-                            raw_loc = str(query.location).strip()
-                            city_only = raw_loc.split(",")[0].strip()
-                            if city_only:
-                                params["where"] = city_only
+        semaphore = asyncio.Semaphore(concurrency)
+        # Last page worth requesting per phrase; lowered as soon as a short page comes back
+        last_page = {phrase_idx: self.max_pages for phrase_idx in range(len(phrases))}
+        # Set when a (phrase, page) cell has finished, so the next page can decide whether to run
+        page_done = {cell: asyncio.Event() for cell in grid}
+        limiter = self._rate_limiter()
 
-                url = f"{self.base_url}/{country}/search/{page}"
+        async with self.http_client(url_base) as client:
+            async def fetch_cell(phrase_idx: int, page: int):
                 try:
-                    resp = await client.get(url, params=params)
-                    resp.raise_for_status()
-                    data = resp.json()
+                    return await request_cell(phrase_idx, page)
+                finally:
+                    page_done[(phrase_idx, page)].set()
 
-                        results = data.get("results", [])
-                        if phrase_idx == 0 and page == 1:
-                            print(f"[Adzuna] First page results count for phrase '{phrase}': {len(results)}")
+            async def request_cell(phrase_idx: int, page: int):
+                phrase = phrases[phrase_idx]
+                if page > 1:
+                    await page_done[(phrase_idx, page - 1)].wait()
+                async with semaphore:
+                    if page > last_page[phrase_idx]:
+                        return phrase_idx, page, []
+                    if not await self._take_token(limiter):
+                        print(f"[Adzuna] No rate-limit token for phrase '{phrase}' page {page}; stopping this phrase")
+                        last_page[phrase_idx] = min(last_page[phrase_idx], page - 1)
+                        return phrase_idx, page, []
+                    params = self._build_params(phrase, query.location, is_remote, per_page, since)
+                    try:
+                        resp = await client.get(f"{url_base}/{page}", params=params, timeout=self.http_timeout(12.0))
+                        resp.raise_for_status()
+                        results = resp.json().get("results", []) or []
+                    except Exception as e:
+                        print(f"[Adzuna] Error phrase '{phrase}' page {page}: {e}")
+                        return phrase_idx, page, []
+                if len(results) < per_page:
+                    # Stop paging this phrase: Adzuna has no more results beyond this page
+                    last_page[phrase_idx] = min(last_page[phrase_idx], page)
+                elif since and older_than(self._posted_at(results[-1]), since):
+                    # Results are sorted newest first, so deeper pages are all behind the watermark
+                    last_page[phrase_idx] = min(last_page[phrase_idx], page)
+                if page == 1:
+                    print(f"[Adzuna] First page results count for phrase '{phrase}': {len(results)}")
+                return phrase_idx, page, results
 
-                        for job_data in results:
+            tasks = [asyncio.create_task(fetch_cell(phrase_idx, page)) for phrase_idx, page in grid]
+            # Dedupe as pages stream in; stop once max_results unique jobs have been produced
+            seen_ids = set()
+            produced = 0
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    phrase_idx, page, results = await next_done
+                    for pos, job_data in enumerate(results):
                         raw = self._parse_job(job_data)
-                        if raw and (not since or (raw.posted_at and raw.posted_at >= since)):
-                            jobs.append(raw)
-                            if len(jobs) >= query.max_results:
-                                break
-
-                        # Stop paging this phrase if Adzuna has no more results
-                        if not results:
+                        if not raw or not posted_since(raw.posted_at, since):
+                            continue
+                        dedupe_key = raw.external_id or raw.url or id(raw)
+                        if dedupe_key in seen_ids:
+                            continue
+                        seen_ids.add(dedupe_key)
+                        produced += 1
+                        yield (phrase_idx, page, pos), raw
+                    if produced >= query.max_results:
                         break
-                except Exception as e:
-                        print(f"[Adzuna] Error phrase '{phrase}' page {page}: {e}")
-                    continue
-        
-        return jobs[:query.max_results]
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _build_params(self, phrase: str, location: Optional[str], is_remote: bool, per_page: int, since: Optional[datetime] = None) -> dict:
+        params = {
+            "app_id": self.app_id,
+            "app_key": self.app_key,
+            "what": phrase,
+            "results_per_page": per_page,
+        }
+        if since:
+            # Incremental: newest first, and nothing Adzuna knows is older than the watermark
+            params["sort_by"] = "date"
+            age = datetime.now(timezone.utc) - (since if since.tzinfo else since.replace(tzinfo=timezone.utc))
+            params["max_days_old"] = max(1, math.ceil(age.total_seconds() / 86400))
+        # Location handling
+        if is_remote:
+            params["what_or"] = "remote"
+            params["where"] = ""
+        elif location:
+            # Adzuna behaves better with just the city (e.g. "Bengaluru" instead of "Bengaluru, KA")
+            city_only = str(location).strip().split(",")[0].strip()
+            if city_only:
+                params["where"] = city_only
+        return params
+    
+    def _rate_limiter(self):
+        """The source's shared token bucket (None without Redis: requests are not metered)."""
+        try:
+            from utils.rate_limit import get_source_limiter
+            return get_source_limiter(self.name)
+        except Exception as e:
+            print(f"[Adzuna] Rate limiter unavailable, requests are not metered: {e}")
+            return None
+
+    async def _take_token(self, limiter) -> bool:
+        """One token per upstream request, waiting up to ADZUNA_TOKEN_WAIT_SECONDS for a refill."""
+        if limiter is None:
+            count_token()
+            return True
+        deadline = time.time() + ADZUNA_TOKEN_WAIT_SECONDS
+        delay = 0.5
+        while True:
+            try:
+                if await asyncio.to_thread(limiter.acquire):
+                    count_token()
+                    return True
+            except Exception as e:
+                print(f"[Adzuna] Rate limiter error, proceeding: {e}")
+                count_token()
+                return True
+            if time.time() + delay > deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(4.0, delay * 2)
+
+    def _source_burst(self) -> int:
+        """In-flight request cap derived from the Adzuna rate-limit bucket."""
+        try:
+            from utils.rate_limit import get_source_burst
+            return get_source_burst(self.name)
+        except Exception:
+            return self.max_concurrency
     
     def _infer_country(self, location: str) -> str:
         """Infer country code from location."""
@@ -121,6 +224,14 @@ class AdzunaConnector(JobConnector):
             return "ca"
         return "in"
     
+    @staticmethod
+    def _posted_at(data: dict) -> Optional[datetime]:
+        try:
+            from dateutil import parser as date_parser
+            return date_parser.parse(data["created"]) if data.get("created") else None
+        except Exception:
+            return None
+    
     def _parse_job(self, data: dict) -> Optional[RawJob]:
         """Parse Adzuna API response to RawJob."""
         try:
@@ -2,10 +2,52 @@
 Base connector interface for all job sources.
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, AsyncIterator
+from datetime import datetime, timezone
 from dataclasses import dataclass, field
 
+# Rate-limit tokens spent by the fetch running in this context (see token_meter)
+_TOKENS_SPENT: ContextVar[Optional[List[int]]] = ContextVar("tokens_spent", default=None)
+
+
+def to_utc(value: datetime) -> datetime:
+    """Naive timestamps are treated as UTC so they compare with aware ones."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def posted_since(posted_at: Optional[datetime], since: Optional[datetime]) -> bool:
+    """True if a job passes the `since` filter (undated jobs only pass without one)."""
+    if since is None:
+        return True
+    if posted_at is None:
+        return False
+    return to_utc(posted_at) >= to_utc(since)
+
+
+def older_than(posted_at: Optional[datetime], since: Optional[datetime]) -> bool:
+    """True if a dated job is older than `since` (the point where newest-first pagination can stop)."""
+    return since is not None and posted_at is not None and to_utc(posted_at) < to_utc(since)
+
+
+def count_token(tokens: int = 1) -> None:
+    """Record tokens a metered connector took for an upstream request of the current fetch."""
+    spent = _TOKENS_SPENT.get()
+    if spent is not None:
+        spent[0] += tokens
+
+
+@contextmanager
+def token_meter():
+    """Count the tokens connectors spend inside this block (and tasks it starts); yields [count]."""
+    spent = [0]
+    reset = _TOKENS_SPENT.set(spent)
+    try:
+        yield spent
+    finally:
+        _TOKENS_SPENT.reset(reset)
+
 
 @dataclass
 class RawJob:
@@ -47,6 +89,10 @@ class SearchQuery:
 class JobConnector(ABC):
     """Base interface for all job source connectors."""
     
+    # True when fetch() takes a rate-limit token per upstream request itself,
+    # so the worker must not charge the whole fetch an extra one up front
+    meters_requests: bool = False
+    
     @property
     @abstractmethod
     def name(self) -> str:
@@ -66,13 +112,40 @@ class JobConnector(ABC):
         
         Args:
             query: Search parameters
-            since: Only return jobs posted after this timestamp (for incremental refresh)
+            since: Only return jobs posted after this timestamp (the per-query watermark
+                for incremental refresh); connectors stop paginating once results are older
         
         Returns:
             List of RawJob objects
         """
         pass
     
+    async def fetch_stream(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[RawJob]:
+        """
+        Yield jobs as soon as they are parsed, so callers can dedupe/upsert while
+        the connector is still fetching.
+        
+        Default adapter over fetch(); connectors that page or fetch details
+        override this to yield per page. A connector may yield the same job
+        again once it has been enriched (same external_id, more fields).
+        """
+        for job in await self.fetch(query, since=since):
+            yield job
+    
+    def http_client(self, url: str):
+        """
+        Async context manager yielding the shared pooled client for `url`'s host.
+        On the worker's loop connections are kept alive across fetches; elsewhere
+        the client lives for the `async with` block (see connectors.http).
+        """
+        from connectors.http import pooled_client
+        return pooled_client(url)
+    
+    def http_timeout(self, seconds: Optional[float]):
+        """Per-request timeout to pass to the pooled client."""
+        from connectors.http import request_timeout
+        return request_timeout(seconds)
+    
     def normalize(self, raw: RawJob) -> Dict[str, Any]:
         """
         Convert RawJob to canonical dict for database upsert.
@@ -0,0 +1,128 @@
+"""
+Shared, long-lived HTTP clients for connectors (one pooled AsyncClient per host).
+"""
+import asyncio
+import os
+import weakref
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+# Pool tuning (per host)
+MAX_CONNECTIONS = int(os.getenv("CONNECTOR_HTTP_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("CONNECTOR_HTTP_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("CONNECTOR_HTTP_KEEPALIVE_EXPIRY", "60"))
+DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=5.0, pool=10.0)
+
+# httpx clients are bound to the event loop they were first used on, so the pool
+# is keyed by (loop, origin). Only loops that call enable_pooling() (the worker's)
+# pool clients; short asyncio.run() calls in the app get a client per call instead.
+_CLIENTS: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_POOLED_LOOPS: "weakref.WeakSet[asyncio.AbstractEventLoop]" = weakref.WeakSet()
+
+
+class _NoCookieJar(CookieJar):
+    """Drops Set-Cookie: a shared client must not replay one response's cookies to other requests."""
+
+    def set_cookie(self, cookie) -> None:
+        pass
+
+    def extract_cookies(self, response, request) -> None:
+        pass
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme or 'https'}://{parts.netloc}"
+
+
+def _prune_closed_loops() -> None:
+    for key, (loop, _client) in list(_CLIENTS.items()):
+        if loop.is_closed():
+            # Its owner exited without close_all_clients(); the sockets can no longer be closed cleanly
+            _CLIENTS.pop(key, None)
+            print(f"[HTTP] Dropped pooled client for {key[1]}: its event loop closed without close_all_clients()")
+
+
+def _new_client() -> httpx.AsyncClient:
+    """Keep-alive client with HTTP/2 when `h2` is installed, redirects followed and no cookie persistence."""
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+        cookies=_NoCookieJar(),
+    )
+
+
+def enable_pooling() -> None:
+    """
+    Pool clients on the running loop for its lifetime. Call from a long-lived loop
+    only, and await close_all_clients() before that loop exits.
+    """
+    _POOLED_LOOPS.add(asyncio.get_running_loop())
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """
+    Return the pooled AsyncClient for the host of `url` on the running loop, which
+    must have called enable_pooling(). Timeouts and headers can be overridden per request.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _POOLED_LOOPS:
+        raise RuntimeError("get_async_client() needs enable_pooling() on the running loop; use pooled_client()")
+    origin = _origin(url)
+    key = (id(loop), origin)
+    entry = _CLIENTS.get(key)
+    if entry and entry[0] is loop and not entry[1].is_closed:
+        return entry[1]
+    _prune_closed_loops()
+    client = _new_client()
+    _CLIENTS[key] = (loop, client)
+    return client
+
+
+@asynccontextmanager
+async def pooled_client(url: str):
+    """
+    Drop-in for `async with httpx.AsyncClient() as client`: the loop's pooled client
+    (not closed on exit) when pooling is enabled, otherwise a client closed on exit.
+    """
+    if asyncio.get_running_loop() in _POOLED_LOOPS:
+        yield get_async_client(url)
+        return
+    async with _new_client() as client:
+        yield client
+
+
+def request_timeout(seconds: Optional[float]) -> httpx.Timeout:
+    """Per-request timeout with a short connect budget (reused connections skip connect entirely)."""
+    if not seconds:
+        return DEFAULT_TIMEOUT
+    return httpx.Timeout(seconds, connect=min(5.0, seconds), pool=seconds)
+
+
+async def close_all_clients() -> None:
+    """Close every pooled client owned by the running loop (call on shutdown)."""
+    loop = asyncio.get_running_loop()
+    _POOLED_LOOPS.discard(loop)
+    for key, (owner, client) in list(_CLIENTS.items()):
+        if owner is loop:
+            _CLIENTS.pop(key, None)
+            try:
+                await client.aclose()
+            except Exception:
+                pass
@@ -1,13 +1,27 @@
 """
 IIMJobs connector (Playwright-based scraper).
 """
+import asyncio
+import os
 import re
 import json
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
 from urllib.parse import quote_plus
 from bs4 import BeautifulSoup
-from connectors.base import JobConnector, RawJob, SearchQuery
+from connectors.base import JobConnector, RawJob, SearchQuery, older_than
+
+CARD_SELECTOR = 'div[class*="jobCard"], .job-card, a[href*="/j/"]'
+DETAIL_SELECTOR = 'div[class*="jobDescription"], div[class*="job-description"], div[class*="JobDescription"], #jobDescription, script[type="application/ld+json"]'
+# Third-party requests that never affect the job list
+BLOCKED_URL_PATTERNS = (
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net", r"facebook\.net",
+    r"hotjar\.com", r"clarity\.ms", r"segment\.(io|com)", r"mixpanel\.com", r"newrelic\.com", r"/analytics",
+)
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+    window.navigator.chrome = {runtime: {}};
+"""
 
 
 class IIMJobsConnector(JobConnector):
@@ -24,9 +38,41 @@ class IIMJobsConnector(JobConnector):
     def __init__(self):
         self.base_url = "https://www.iimjobs.com"
         self.search_url = "https://www.iimjobs.com/search"
+        # Detail pages fetched per search (0 disables) and how many load at once
+        self.detail_limit = int(os.getenv("IIMJOBS_DETAIL_LIMIT", "20"))
+        self.detail_concurrency = int(os.getenv("IIMJOBS_DETAIL_CONCURRENCY", "4"))
     
     async def fetch(self, query: SearchQuery, since: Optional[datetime] = None) -> List[RawJob]:
         """Fetch jobs from IIMJobs using Playwright."""
+        jobs = self._not_older(await self._search_cards(query), since)
+        if jobs and self.detail_limit > 0:
+            async for _ in self._stream_details(jobs[:self.detail_limit]):
+                pass
+        
+        # Filter by since if provided (detail pages fill in the dates cards lack)
+        jobs = self._not_older(jobs, since)
+        
+        return jobs[:query.max_results]
+    
+    async def fetch_stream(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[RawJob]:
+        """Yield jobs beyond the detail limit right away, the rest as each detail page finishes."""
+        jobs = self._not_older(await self._search_cards(query), since)
+        limit = max(0, self.detail_limit)
+        for job in jobs[limit:]:
+            yield job
+        async for job in self._stream_details(jobs[:limit]):
+            if not older_than(job.posted_at, since):
+                yield job
+    
+    @staticmethod
+    def _not_older(jobs: List[RawJob], since: Optional[datetime]) -> List[RawJob]:
+        """Drop jobs dated before `since`; undated cards are kept (dedupe drops the known ones)."""
+        if not since:
+            return jobs
+        return [j for j in jobs if not older_than(j.posted_at, since)]
+    
+    async def _search_cards(self, query: SearchQuery) -> List[RawJob]:
+        """Load the search page on a pooled browser page and parse job cards (no detail pages)."""
         # Build OR-joined phrase query: "kw1" OR "kw2" OR "kw3"
         kws = [str(k).strip() for k in (query.keywords or []) if str(k).strip()]
         phrases = []
@@ -37,7 +83,7 @@ class IIMJobsConnector(JobConnector):
         location = query.location or ""
         
         try:
-            from playwright.async_api import async_playwright
+            import playwright  # noqa: F401
         except ImportError:
             print("[IIMJobs] Playwright not installed")
             return []
@@ -45,21 +91,7 @@ class IIMJobsConnector(JobConnector):
         jobs: List[RawJob] = []
         
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-dev-shm-usage'])
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    viewport={'width': 1920, 'height': 1080},
-                )
-                
-                # Add stealth script
-                await context.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-                    window.navigator.chrome = {runtime: {}};
-                """)
-                
-                page = await context.new_page()
-                
+            async with self._browser_page() as page:
                 # Build search URL with proper encoding
                 params = []
                 if keywords_str:
@@ -70,25 +102,25 @@ class IIMJobsConnector(JobConnector):
                 
                 print(f"[IIMJobs] Fetching: {url}")
                 try:
-                await page.goto(url, wait_until="networkidle", timeout=30000)
+                    # Readiness is the job-card selector below, not networkidle (analytics keep the network busy)
+                    await page.goto(url, wait_until="domcontentloaded", timeout=30000)
                     final_url = page.url
                     if final_url != url:
                         print(f"[IIMJobs] Redirected from {url} to {final_url}")
                 except Exception as e:
                     print(f"[IIMJobs] Navigation error: {e}")
-                    await browser.close()
                     return []
                 
                 # Wait for job cards
                 try:
-                    await page.wait_for_selector('div[class*="jobCard"], .job-card, a[href*="/j/"]', timeout=10000)
-                except:
+                    await page.wait_for_selector(CARD_SELECTOR, timeout=10000)
+                except Exception:
                     print(f"[IIMJobs] Job card selector not found, continuing anyway")
                 
-                # Scroll to load more
+                # Scroll to load more (wait for new cards rather than a fixed delay)
                 for _ in range(2):
-                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    await page.wait_for_timeout(2000)
+                    if not await self._scroll_for_more_cards(page):
+                        break
                 
                 # Get page HTML and parse
                 html = await page.content()
@@ -105,7 +137,6 @@ class IIMJobsConnector(JobConnector):
                     print(f"[IIMJobs][Debug] Blocked/redirect page detected. HTML snippet (first 500 chars): {html[:500]}")
                     if has_blocked:
                         print(f"[IIMJobs] Warning: Page appears to be blocked. Consider using authenticated cookies or proxy.")
-                    await browser.close()
                     return []
                 
                 soup = BeautifulSoup(html, 'html.parser')
@@ -338,8 +369,8 @@ class IIMJobsConnector(JobConnector):
                             continue
                         
                         # Normalize URL
-                            if not url.startswith('http'):
-                            url = f"{self.base_url}{url}" if not url.startswith('/') else f"{self.base_url}{url}"
+                        if not url.startswith('http'):
+                            url = f"{self.base_url}{url}" if url.startswith('/') else f"{self.base_url}/{url}"
                         
                         # Filter out non-job URLs more carefully
                         url_lower = url.lower()
@@ -417,8 +448,8 @@ class IIMJobsConnector(JobConnector):
                         company = self._extract_company_from_title(title_raw) or ""
                         if card.name != 'a':
                             company_elem = card.find(['div', 'span', 'a'], class_=re.compile(r'company|employer|recruiter', re.I))
-                        if company_elem:
-                            company = company_elem.get_text(strip=True)
+                            if company_elem:
+                                company = company_elem.get_text(strip=True)
                         
                         # If still no title, try using link text or URL
                         if not title:
@@ -461,9 +492,8 @@ class IIMJobsConnector(JobConnector):
                                 exp_text = exp_elem.get_text(strip=True)
                         exp_min, exp_max = self._parse_experience(exp_text)
                         
-                        # Skip detail page fetching for now (too slow, can add later if needed)
+                        # Filled in by _fetch_details() on pooled pages after the search page is released
                         description = ""
-                        # TODO: Add detail page fetching if needed for better descriptions
                         
                         # Add job if we have at least a title
                         if title:
@@ -563,19 +593,124 @@ class IIMJobsConnector(JobConnector):
                         print(f"[IIMJobs][Debug] Fallback completed, total jobs after fallback: {len(jobs)}")
                     except Exception as fb_err:
                         print(f"[IIMJobs][Debug] Fallback extraction failed: {fb_err}")
-                
-                await browser.close()
         except Exception as e:
             print(f"[IIMJobs] Error: {e}")
             import traceback
             traceback.print_exc()
         
-        # Filter by since if provided
-        if since:
-            jobs = [j for j in jobs if j.posted_at and j.posted_at >= since]
-        
         return jobs[:query.max_results]
     
+    def _browser_page(self):
+        """Check out a page from the IIMJobs browser pool (analytics, images and fonts blocked)."""
+        from utils.browser_pool import get_browser_pool
+        return get_browser_pool(
+            "iimjobs",
+            browsers=1,
+            pages_per_browser=max(1, self.detail_concurrency),
+            launch_args=['--no-sandbox', '--disable-dev-shm-usage'],
+            context_options={'viewport': {'width': 1920, 'height': 1080}},
+            init_script=STEALTH_SCRIPT,
+            blocked_url_patterns=BLOCKED_URL_PATTERNS,
+        ).page()
+    
+    async def _scroll_for_more_cards(self, page, timeout: int = 2500) -> bool:
+        """Scroll to the bottom; True if more job cards rendered before the timeout."""
+        try:
+            before = await page.evaluate("(sel) => document.querySelectorAll(sel).length", CARD_SELECTOR)
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            await page.wait_for_function(
+                "([sel, n]) => document.querySelectorAll(sel).length > n",
+                arg=[CARD_SELECTOR, before],
+                timeout=timeout,
+            )
+            return True
+        except Exception:
+            return False
+    
+    async def _stream_details(self, jobs: List[RawJob]) -> AsyncIterator[RawJob]:
+        """
+        Fill description / posted_at / location from detail pages, concurrently across
+        pooled pages, yielding each job as soon as its page is done (failed ones unchanged).
+        """
+        async def enrich(job: RawJob) -> RawJob:
+            if not job.url:
+                return job
+            # The pool hands out at most detail_concurrency pages, so this also bounds parallelism
+            try:
+                async with self._browser_page() as page:
+                    await page.goto(job.url, wait_until="domcontentloaded", timeout=20000)
+                    try:
+                        await page.wait_for_selector(DETAIL_SELECTOR, timeout=8000, state="attached")
+                    except Exception:
+                        pass
+                    html = await page.content()
+            except Exception as e:
+                print(f"[IIMJobs] Detail fetch failed for {job.url[:80]}: {e}")
+                return job
+            detail = self._parse_detail(html)
+            if detail.get("description"):
+                job.description = detail["description"]
+            if detail.get("posted_at") and not job.posted_at:
+                job.posted_at = detail["posted_at"]
+            if detail.get("location") and not job.location:
+                job.location = detail["location"]
+            return job
+        
+        if not jobs:
+            return
+        tasks = [asyncio.create_task(enrich(job)) for job in jobs]
+        enriched = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                job = await next_done
+                if job.description:
+                    enriched += 1
+                yield job
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"[IIMJobs] Enriched {enriched}/{len(jobs)} jobs from detail pages")
+    
+    def _parse_detail(self, html: str) -> dict:
+        """Extract description / posted_at / location from a job detail page."""
+        out = {"description": None, "posted_at": None, "location": None}
+        if not html:
+            return out
+        soup = BeautifulSoup(html, 'html.parser')
+        # JSON-LD JobPosting is the most stable source
+        for script in soup.find_all('script', type='application/ld+json'):
+            try:
+                data = json.loads(script.string or "")
+            except Exception:
+                continue
+            for item in (data if isinstance(data, list) else [data]):
+                if not isinstance(item, dict) or item.get("@type") != "JobPosting":
+                    continue
+                out["description"] = item.get("description") or None
+                if item.get("datePosted"):
+                    try:
+                        from dateutil import parser as date_parser
+                        out["posted_at"] = date_parser.parse(item["datePosted"])
+                    except Exception:
+                        pass
+                job_loc = item.get("jobLocation")
+                if isinstance(job_loc, list):
+                    job_loc = job_loc[0] if job_loc else None
+                if isinstance(job_loc, dict):
+                    addr = job_loc.get("address") or {}
+                    parts = [addr.get("addressLocality"), addr.get("addressRegion"), addr.get("addressCountry")]
+                    parts = [p for p in parts if isinstance(p, str) and p]
+                    if parts:
+                        out["location"] = ", ".join(parts)
+                break
+        if not out["description"]:
+            elem = soup.select_one('div[class*="jobDescription"], div[class*="job-description"], div[class*="JobDescription"], #jobDescription')
+            if elem:
+                out["description"] = str(elem)
+        return out
+    
     def _clean_title(self, title: str) -> str:
         """Clean IIMJobs title (remove artifacts like 'Posted X ago', experience ranges)."""
         if not title:
@@ -1,11 +1,11 @@
 """
 Jooble connector (async HTTP API).
 """
+import asyncio
 import os
-import httpx
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime
-from connectors.base import JobConnector, RawJob, SearchQuery
+from connectors.base import JobConnector, RawJob, SearchQuery, posted_since
 
 
 class JoobleConnector(JobConnector):
@@ -22,12 +22,57 @@ class JoobleConnector(JobConnector):
     def __init__(self):
         self.api_key = os.getenv("JOOBLE_API_KEY", "")
         self.base_url = f"https://jooble.org/api/{self.api_key}"
+        # A located first page with fewer results than this is merged with the location-less one
+        self.sparse_threshold = int(os.getenv("JOOBLE_SPARSE_THRESHOLD", "5"))
     
     async def fetch(self, query: SearchQuery, since: Optional[datetime] = None) -> List[RawJob]:
         """Fetch jobs from Jooble API."""
+        per_phrase = {}
+        async for phrase_idx, results in self._stream_phrases(query, since):
+            per_phrase[phrase_idx] = results
+        
+        # Merge in phrase order with O(1) URL/ID dedupe
+        jobs: List[RawJob] = []
+        seen = (set(), set())
+        for phrase_idx in sorted(per_phrase):
+            for raw in self._unique_jobs(per_phrase[phrase_idx], since, seen):
+                if len(jobs) >= query.max_results:
+                    break
+                jobs.append(raw)
+        
+        return jobs[:query.max_results]
+    
+    async def fetch_stream(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[RawJob]:
+        """Yield each phrase's jobs as soon as that phrase's request completes."""
+        produced = 0
+        seen = (set(), set())
+        async for _, results in self._stream_phrases(query, since):
+            for raw in self._unique_jobs(results, since, seen):
+                if produced >= query.max_results:
+                    return
+                produced += 1
+                yield raw
+    
+    def _unique_jobs(self, results: list, since: Optional[datetime], seen: Tuple[set, set]):
+        """Parse results, skipping jobs already seen by URL or ID."""
+        seen_urls, seen_ids = seen
+        for job_data in results:
+            raw = self._parse_job(job_data)
+            if not raw or not posted_since(raw.posted_at, since):
+                continue
+            if (raw.url and raw.url in seen_urls) or (raw.external_id and raw.external_id in seen_ids):
+                continue
+            if raw.url:
+                seen_urls.add(raw.url)
+            if raw.external_id:
+                seen_ids.add(raw.external_id)
+            yield raw
+    
+    async def _stream_phrases(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[Tuple[int, list]]:
+        """Yield (phrase_idx, raw results) in completion order, all phrases in flight at once."""
         if not self.api_key:
             print("[Jooble] Missing API key")
-            return []
+            return
         
         # Build OR-joined phrase query: search each keyword phrase separately
         kws = [str(k).strip() for k in (query.keywords or []) if str(k).strip()]
@@ -44,65 +89,59 @@ class JoobleConnector(JobConnector):
             city_only = raw_loc.split(",")[0].strip()
             location = city_only
         
-        jobs: List[RawJob] = []
-        
-        # Fetch jobs for each phrase separately (OR condition across profiles)
-        for phrase_idx, phrase in enumerate(phrases, 1):
-            if len(jobs) >= query.max_results:
-                break
+        # Fetch every phrase concurrently over one shared client (OR condition across profiles)
+        async with self.http_client(self.base_url) as client:
+            async def post(phrase: str, loc: str) -> list:
+                payload = {
+                    "keywords": phrase,
+                    "location": loc,
+                    "page": 1,
+                    "searchMode": 1,
+                }
+                if since:
+                    # Incremental: let Jooble drop everything older than the watermark
+                    payload["datecreatedfrom"] = since.strftime("%Y-%m-%d")
+                resp = await client.post(self.base_url, json=payload, timeout=self.http_timeout(10.0))
+                resp.raise_for_status()
+                return resp.json().get("jobs", []) or []
             
-            try:
-                print(f"[Jooble] Fetch phrase {phrase_idx}/{len(phrases)}: keywords='{phrase}' loc='{location}' remote={is_remote} max_results={query.max_results}")
-            except Exception:
-                pass
+            async def fetch_phrase(phrase_idx: int, phrase: str) -> list:
+                try:
+                    print(f"[Jooble] Fetch phrase {phrase_idx}/{len(phrases)}: keywords='{phrase}' loc='{location}' remote={is_remote} max_results={query.max_results}")
+                except Exception:
+                    pass
+                try:
+                    results = await post(phrase, location)
+                except Exception as e:
+                    print(f"[Jooble] Error phrase {phrase_idx} ('{phrase}'): {e}")
+                    results = []
+                if phrase_idx == 1:
+                    print(f"[Jooble] First page results count for phrase '{phrase}' (with location): {len(results)}")
+                # Only a sparse located page pays for the location-less search
+                if not location or is_remote or len(results) >= self.sparse_threshold:
+                    return results
+                try:
+                    extra = await post(phrase, "")
+                    print(f"[Jooble] Sparse results with location '{location}' ({len(results)}), adding {len(extra)} without location for '{phrase}'")
+                    return results + extra
+                except Exception as e:
+                    print(f"[Jooble] Error phrase {phrase_idx} ('{phrase}') without location: {e}")
+                    return results
             
-            # Try with location first
-        payload = {
-                "keywords": phrase,
-            "location": location,
-            "page": 1,
-            "searchMode": 1,
-        }
-        
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(self.base_url, json=payload)
-                resp.raise_for_status()
-                data = resp.json()
-                    
-                    first_page_count = len(data.get("jobs", []))
-                    if phrase_idx == 1:
-                        print(f"[Jooble] First page results count for phrase '{phrase}' (with location): {first_page_count}")
-                    
-                    # If no results with location and location was specified, try without location
-                    if first_page_count == 0 and location and not is_remote:
-                        print(f"[Jooble] No results with location '{location}', trying without location...")
-                        payload_no_loc = {
-                            "keywords": phrase,
-                            "location": "",
-                            "page": 1,
-                            "searchMode": 1,
-                        }
-                        resp_no_loc = await client.post(self.base_url, json=payload_no_loc)
-                        resp_no_loc.raise_for_status()
-                        data = resp_no_loc.json()
-                        first_page_count = len(data.get("jobs", []))
-                        if phrase_idx == 1:
-                            print(f"[Jooble] First page results count for phrase '{phrase}' (without location): {first_page_count}")
-                    
-                    for job_data in data.get("jobs", []):
-                        if len(jobs) >= query.max_results:
-                            break
-                    raw = self._parse_job(job_data)
-                    if raw and (not since or (raw.posted_at and raw.posted_at >= since)):
-                            # Check for duplicates by URL
-                            if not any(j.url == raw.url for j in jobs):
-                        jobs.append(raw)
-        except Exception as e:
-                print(f"[Jooble] Error phrase {phrase_idx} ('{phrase}'): {e}")
-                continue
-        
-        return jobs[:query.max_results]
+            task_phrase = {asyncio.create_task(fetch_phrase(idx, phrase)): idx for idx, phrase in enumerate(phrases, 1)}
+            tasks = list(task_phrase)
+            try:
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            yield task_phrase[task], task.result()
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
     
     def _parse_job(self, data: dict) -> Optional[RawJob]:
         """Parse Jooble API response to RawJob."""
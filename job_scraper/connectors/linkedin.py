@@ -1,15 +1,21 @@
 """
 LinkedIn connector (HTTP-based, with Playwright fallback).
 """
+import asyncio
 import httpx
+import math
 import re
-from typing import List, Optional
-from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from datetime import datetime, timezone
 from bs4 import BeautifulSoup
-from connectors.base import JobConnector, RawJob, SearchQuery
+from connectors.base import JobConnector, RawJob, SearchQuery, older_than
 import os
 from urllib.parse import unquote
 
+# fetch_stream hands jobs over through a queue this size, so a slow consumer pauses the scrape
+# (same bound as the ingest pipeline's stage queues)
+STREAM_QUEUE_SIZE = int(os.getenv("WORKER_PIPELINE_QUEUE_SIZE", "100"))
+
 
 class LinkedInConnector(JobConnector):
     """LinkedIn job search connector (HTTP-first, Playwright fallback)."""
@@ -70,7 +76,7 @@ class LinkedInConnector(JobConnector):
                     if page_max <= 0:
                         break
                     print(f"[LinkedIn][Playwright] Fetching page {page_num + 1}/{pages_to_fetch} (start={start_offset})")
-                    pw_jobs = await self._fetch_with_playwright(keywords_str, location, page_max, start_offset)
+                    pw_jobs = await self._fetch_with_playwright(keywords_str, location, page_max, start_offset, since)
                     if pw_jobs:
                         # Collect identifiers from this page to check if it's the same as any previous page
                         current_page_ids = set()
@@ -183,8 +189,10 @@ class LinkedInConnector(JobConnector):
                     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
                     "Accept-Language": "en-US,en;q=0.9",
                 }
-                cookies = {"li_at": self.li_at} if self.li_at else None
-                async with httpx.AsyncClient(timeout=15.0, follow_redirects=True, headers=headers, cookies=cookies) as client:
+                if self.li_at:
+                    # Send the session cookie per request; the pooled client is shared across connectors
+                    headers["Cookie"] = f"li_at={self.li_at}"
+                async with self.http_client(self.base_url) as client:
                     # Fetch exactly one page (based on start_offset)
                     desired = max(1, query.max_results or 25)
                     start_offset = getattr(query, 'start_offset', 0)
@@ -195,11 +203,12 @@ class LinkedInConnector(JobConnector):
                     }
                     if location and location.strip():
                         params["location"] = location
+                    params.update(self._since_params(since))
                     try:
                         print(f"[LinkedIn][HTTP] GET {self.base_url} params={params} (page fetch, max_results={desired})")
                     except Exception:
                         pass
-                    resp = await client.get(self.base_url, params=params)
+                    resp = await client.get(self.base_url, params=params, headers=headers, timeout=self.http_timeout(15.0))
                     if resp.status_code == 200:
                         try:
                             print(f"[LinkedIn][HTTP] status={resp.status_code} len={len(resp.text)} url={resp.url}")
@@ -221,14 +230,15 @@ class LinkedInConnector(JobConnector):
         # If we did HTTP first (because Playwright disabled) and still need, optionally try Playwright
         if (not self.disable_playwright) and (len(jobs) < (query.max_results or 20)):
             try:
-                pw_jobs = await self._fetch_with_playwright(keywords_str, location, (query.max_results or 20) - len(jobs))
+                pw_jobs = await self._fetch_with_playwright(keywords_str, location, (query.max_results or 20) - len(jobs), since=since)
                 jobs.extend(pw_jobs)
             except Exception as e:
                 print(f"[LinkedIn] Playwright fetch error (late): {e}")
         
-        # Filter by since if provided
+        # Filter by since if provided. Search cards rarely carry a date (it comes from the detail
+        # page), so only drop jobs known to be older; f_TPR already narrowed the search server-side
         if since:
-            jobs = [j for j in jobs if j.posted_at and j.posted_at >= since]
+            jobs = [j for j in jobs if not older_than(j.posted_at, since)]
         
         # If callback provided, yield jobs immediately with initial data (before detail fetching)
         # This allows jobs to be inserted into DB immediately, then enriched with details later
@@ -255,9 +265,8 @@ class LinkedInConnector(JobConnector):
             detail_fetch_count = 0
             detail_success_count = 0
             
-            # Process in smaller batches with delays to avoid rate limiting
-            batch_size = 5  # Process 5 jobs at a time
-            batch_delay = 3.0  # 3 second delay between batches
+            # Concurrency adapts to LinkedIn's responses (grows while healthy, halves on 429/999/timeouts)
+            detail_limiter = self._detail_limiter()
             
             async def fetch_detail_for_job(job, idx):
                 """Fetch detail for a single job and update it."""
@@ -271,11 +280,13 @@ class LinkedInConnector(JobConnector):
                     detail = None
                     enable_debug = (idx < 3)  # Debug first 3 jobs
                     
-                    # Try HTTP with retry
+                    # Try HTTP with retry (in-flight requests bounded by the shared AIMD limiter)
                     max_retries = 2
                     for retry in range(max_retries):
                         try:
-                            detail = await self._fetch_detail_and_location_http_async(job.url, debug=enable_debug and retry == max_retries - 1)
+                            async with detail_limiter.slot() as slot:
+                                detail = await self._fetch_detail_and_location_http_async(job.url, debug=enable_debug and retry == max_retries - 1)
+                                slot.report(self._detail_outcome(detail))
                             # Check if we got blocked (999) or got data
                             if detail.get('description_html') or detail.get('location'):
                                 break  # Got something, stop retrying
@@ -293,7 +304,7 @@ class LinkedInConnector(JobConnector):
                                         print(f"[LinkedIn] Job {idx}: HTTP blocked/failed{' (in.linkedin.com)' if is_indian_linkedin else ''}, but Playwright is disabled - skipping")
                                     break
                             if retry < max_retries - 1:
-                                await asyncio.sleep(2.0 * (retry + 1))  # Longer delay to avoid rate limiting
+                                await asyncio.sleep(detail_limiter.backoff(retry + 1))
                         except Exception as fetch_err:
                             if retry == max_retries - 1:
                                 # Last retry failed, try Playwright as final fallback (only if not disabled)
@@ -309,7 +320,7 @@ class LinkedInConnector(JobConnector):
                                     if idx < 5:
                                         print(f"[LinkedIn] Job {idx}: HTTP failed, but Playwright is disabled - skipping: {fetch_err}")
                             else:
-                                await asyncio.sleep(2.0 * (retry + 1))
+                                await asyncio.sleep(detail_limiter.backoff(retry + 1))
                     
                     fetch_time = time.time() - fetch_start
                     detail_fetch_count += 1
@@ -419,18 +430,9 @@ class LinkedInConnector(JobConnector):
                         import traceback
                         traceback.print_exc()
             
-            # Process jobs in parallel batches for detail fetching
-            batch_size = 10  # Process 10 jobs in parallel at a time (increased from 5 for faster processing)
-            for batch_start in range(0, top_count, batch_size):
-                batch_end = min(batch_start + batch_size, top_count)
-                batch_tasks = [enrich_and_update(jobs[idx], idx) for idx in range(batch_start, batch_end)]
-                
-                # Process batch in parallel
-                await asyncio.gather(*batch_tasks, return_exceptions=True)
-                
-                # Minimal delay between batches to avoid rate limiting (reduced from 0.5s)
-                if batch_end < top_count:
-                    await asyncio.sleep(0.2)  # 0.2s delay between batches
+            # All jobs are scheduled at once; the adaptive limiter decides how many run concurrently
+            await asyncio.gather(*(enrich_and_update(jobs[idx], idx) for idx in range(top_count)), return_exceptions=True)
+            print(f"[LinkedIn] Detail limiter: {detail_limiter.metrics()}")
             
             detail_total_time = time.time() - detail_start
             if detail_fetch_count > 0:
@@ -465,6 +467,39 @@ class LinkedInConnector(JobConnector):
 
         return jobs[: (query.max_results or len(jobs))]
     
+    async def fetch_stream(self, query: SearchQuery, since: Optional[datetime] = None) -> AsyncIterator[RawJob]:
+        """
+        Yield jobs as soon as the search results are parsed, then yield each job again
+        once its detail page has enriched it (description / location / posted_at).
+        The hand-off queue is bounded, so fetching waits while the consumer is behind.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, STREAM_QUEUE_SIZE))
+        finished = object()
+        
+        async def on_job_ready(job):
+            await queue.put(job)
+        
+        async def run():
+            try:
+                await self.fetch(query, since=since, on_job_ready=on_job_ready)
+            except asyncio.CancelledError:
+                raise  # the consumer is gone: nobody reads the (possibly full) queue any more
+            except Exception as e:
+                print(f"[LinkedIn] Stream fetch error: {e}")
+            await queue.put(finished)
+        
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                yield item
+        finally:
+            if not task.done():
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    
     def _parse_html(self, html: str, keywords: str, max_results: int = 25) -> List[RawJob]:
         """Parse LinkedIn HTML response. Attempts to return up to max_results without filtering."""
         jobs: List[RawJob] = []
@@ -638,30 +673,20 @@ class LinkedInConnector(JobConnector):
         
         return jobs
     
-    async def _fetch_with_playwright(self, keywords: str, location: str, max_results: int, start_offset: int = 0) -> List[RawJob]:
+    def _since_params(self, since: Optional[datetime]) -> dict:
+        """Search params restricting results to jobs posted after `since`, newest first."""
+        if not since:
+            return {}
+        now = datetime.now(timezone.utc) if since.tzinfo else datetime.now()
+        seconds = max(3600, math.ceil((now - since).total_seconds()))
+        return {"f_TPR": f"r{seconds}", "sortBy": "DD"}
+    
+    async def _fetch_with_playwright(self, keywords: str, location: str, max_results: int, start_offset: int = 0, since: Optional[datetime] = None) -> List[RawJob]:
         """Fetch jobs using Playwright (for dynamic content)."""
         try:
-            from playwright.async_api import async_playwright
-            
             print(f"[LinkedIn][Playwright] Starting fetch for keywords='{keywords}', location='{location}', max_results={max_results}")
             jobs: List[RawJob] = []
-            async with async_playwright() as p:
-                print("[LinkedIn][Playwright] Launching browser...")
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                )
-                # Inject LI cookie if provided
-                if self.li_at:
-                    try:
-                        await context.add_cookies([
-                            {"name": "li_at", "value": self.li_at, "domain": ".linkedin.com", "path": "/", "httpOnly": True, "secure": True}
-                        ])
-                        print("[LinkedIn][Playwright] Added li_at cookie")
-                    except Exception as e:
-                        print(f"[LinkedIn][Playwright] Cookie add error: {e}")
-                page = await context.new_page()
-                
+            async with self._browser_page() as page:
                 # Build URL params - only include location if it's not empty (to fetch from everywhere when "Any" is selected)
                 params = {
                     "keywords": keywords,
@@ -669,6 +694,7 @@ class LinkedInConnector(JobConnector):
                 }
                 if location and location.strip():
                     params["location"] = location
+                params.update(self._since_params(since))
                 url = f"{self.base_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
                 print(f"[LinkedIn][Playwright] Navigating to: {url}")
                 await page.goto(url, wait_until="domcontentloaded", timeout=30000)
@@ -694,29 +720,26 @@ class LinkedInConnector(JobConnector):
                                 break
                             except Exception:
                                 pass
-                    # Small wait after consent
-                    await page.wait_for_timeout(1000)
                 except Exception as e:
                     print(f"[LinkedIn][Playwright] Consent handling skipped: {e}")
                 
                 # Wait for job cards
+                card_selector = 'a[href*="/jobs/view/"]'
                 try:
-                    await page.wait_for_selector('a[href*="/jobs/view/"]', timeout=10000)
+                    await page.wait_for_selector(card_selector, timeout=10000)
                 except Exception:
-                    # One more small scroll+wait if slow content
+                    # One more scroll if slow content, then wait for the first card again
                     await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    await page.wait_for_timeout(1500)
+                    try:
+                        await page.wait_for_selector(card_selector, timeout=3000)
+                    except Exception:
+                        pass
                 
                 # Scroll multiple times to load more jobs (especially for background worker)
                 scroll_count = 3 if max_results > 25 else 1  # More scrolls for larger fetches
                 print(f"[LinkedIn][Playwright] Scrolling {scroll_count} times to load jobs...")
                 for scroll_idx in range(scroll_count):
-                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    await page.wait_for_timeout(2000)
-                    if scroll_idx < scroll_count - 1:
-                        # Small scroll back up to trigger lazy loading
-                        await page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.8)")
-                        await page.wait_for_timeout(1000)
+                    await self._scroll_and_wait_for_more(page, card_selector)
                 print("[LinkedIn][Playwright] Scroll complete")
                 
                 # Extract job cards
@@ -937,8 +960,6 @@ class LinkedInConnector(JobConnector):
                         continue
                 
                 print(f"[LinkedIn][Playwright] Successfully parsed {len(jobs)} jobs from {len(job_cards)} cards")
-                await browser.close()
-                print("[LinkedIn][Playwright] Browser closed")
         except ImportError:
             print("[LinkedIn] Playwright not installed, skipping")
             import traceback
@@ -951,6 +972,66 @@ class LinkedInConnector(JobConnector):
         print(f"[LinkedIn][Playwright] Returning {len(jobs)} jobs")
         return jobs
 
+    def _detail_limiter(self):
+        """Shared AIMD limiter for detail-page requests (state in Redis when available)."""
+        from utils.adaptive_limit import get_adaptive_limiter
+        redis_client = None
+        try:
+            from deps import get_shared_redis_client
+            redis_client = get_shared_redis_client()
+        except Exception:
+            pass
+        return get_adaptive_limiter(
+            redis_client,
+            "linkedin:detail",
+            min_limit=1,
+            max_limit=int(os.getenv("LINKEDIN_DETAIL_MAX_CONCURRENCY", "20")),
+            initial_limit=int(os.getenv("LINKEDIN_DETAIL_INITIAL_CONCURRENCY", "5")),
+        )
+
+    def _detail_outcome(self, detail: dict) -> str:
+        """Classify a detail response for the adaptive limiter."""
+        from utils.adaptive_limit import OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_TIMEOUT, OUTCOME_ERROR
+        if detail.get("_timeout"):
+            return OUTCOME_TIMEOUT
+        if detail.get("_status_999") or detail.get("_status") == 429:
+            return OUTCOME_THROTTLED
+        if detail.get("_status"):
+            return OUTCOME_ERROR
+        return OUTCOME_OK
+
+    def _browser_page(self):
+        """Check out a page from the shared browser pool (li_at cookie applied when configured)."""
+        from utils.browser_pool import get_browser_pool
+        cookies = None
+        if self.li_at:
+            cookies = [{"name": "li_at", "value": self.li_at, "domain": ".linkedin.com", "path": "/", "httpOnly": True, "secure": True}]
+        return get_browser_pool("linkedin").page(cookies=cookies)
+
+    async def _scroll_and_wait_for_more(self, page, card_selector: str, timeout: int = 2500) -> None:
+        """Scroll to the bottom and wait until more cards render (or the timeout passes)."""
+        try:
+            before = await page.evaluate(f"document.querySelectorAll('{card_selector}').length")
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            await page.wait_for_function(
+                f"document.querySelectorAll('{card_selector}').length > {int(before)}",
+                timeout=timeout,
+            )
+        except Exception:
+            pass
+
+    async def _wait_for_detail_content(self, page, timeout: int = 5000) -> None:
+        """Wait for the job description / top card to attach instead of sleeping."""
+        try:
+            await page.wait_for_selector(
+                "[data-test-job-description], section.show-more-less-html, .description__text, "
+                ".jobs-description__content, script[type='application/ld+json']",
+                timeout=timeout,
+                state="attached",
+            )
+        except Exception:
+            pass
+
     def _fetch_description_http(self, job_url: str, return_html: bool = True) -> str:
         """Fetch job description from a LinkedIn job detail page without login using HTTP.
         Returns HTML if return_html=True (default), otherwise plain text (may be empty if blocked)."""
@@ -1045,16 +1126,16 @@ class LinkedInConnector(JobConnector):
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
                 "Accept-Language": "en-US,en;q=0.9",
                 "Accept-Encoding": "gzip, deflate, br",
-                "Connection": "keep-alive",
                 "Upgrade-Insecure-Requests": "1",
                 "Referer": "https://www.linkedin.com/jobs/search/",
             }
-            async with httpx.AsyncClient(timeout=20.0, follow_redirects=True, headers=headers) as client:
-                resp = await client.get(normalized_url)
+            async with self.http_client(normalized_url) as client:
+                resp = await client.get(normalized_url, headers=headers, timeout=self.http_timeout(20.0))
                 
                 if resp.status_code != 200:
                     if debug:
                         print(f"[LinkedIn Detail] Status {resp.status_code} for {job_url[:60]}...")
+                    out["_status"] = resp.status_code
                     # Mark as blocked if 999
                     if resp.status_code == 999:
                         out["_blocked"] = True
@@ -1339,6 +1420,8 @@ class LinkedInConnector(JobConnector):
                         if debug:
                             print(f"[LinkedIn Detail] Error extracting posted_at: {e}")
                         pass
+        except httpx.TimeoutException:
+            out["_timeout"] = True
         except Exception as e:
             # Don't fail silently - log errors for debugging
             pass
@@ -1538,33 +1621,17 @@ class LinkedInConnector(JobConnector):
         """Fallback: Fetch job detail using Playwright when HTTP is blocked (999)."""
         out = {"description_html": None, "location": None, "posted_at": None}
         try:
-            from playwright.async_api import async_playwright
-            
             # Normalize URL: convert in.linkedin.com to www.linkedin.com for consistency
             # Also remove query params to avoid duplicates
             normalized_url = job_url.replace("in.linkedin.com", "www.linkedin.com")
             normalized_url = normalized_url.split('?')[0].split('#')[0]  # Remove query params and fragments
             
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                )
-                # Inject LI cookie if provided
-                if self.li_at:
-                    try:
-                        await context.add_cookies([
-                            {"name": "li_at", "value": self.li_at, "domain": ".linkedin.com", "path": "/", "httpOnly": True, "secure": True}
-                        ])
-                    except Exception:
-                        pass
-                
-                page = await context.new_page()
-                
+            async with self._browser_page() as page:
                 # Handle consent/blocking for Indian LinkedIn
                 try:
                     await page.goto(normalized_url, wait_until="domcontentloaded", timeout=20000)
-                    await page.wait_for_timeout(5000)  # Wait longer for content to load (especially for in.linkedin.com)
+                    # Wait for job content instead of a fixed sleep (in.linkedin.com can be slow)
+                    await self._wait_for_detail_content(page, timeout=8000)
                     
                     # Try to handle consent dialogs (common on in.linkedin.com)
                     consent_selectors = [
@@ -1580,7 +1647,7 @@ class LinkedInConnector(JobConnector):
                             btn = await page.query_selector(sel)
                             if btn:
                                 await btn.click(timeout=3000)
-                                await page.wait_for_timeout(2000)  # Wait after consent
+                                await self._wait_for_detail_content(page, timeout=3000)
                                 break
                         except Exception:
                             continue
@@ -1614,7 +1681,6 @@ class LinkedInConnector(JobConnector):
                     
                     if is_login_page:
                         print(f"[LinkedIn Playwright] Actually redirected to login/signup page for {job_url[:60]}...")
-                        await browser.close()
                         return out
                     
                     # Check if page has job-related content
@@ -1622,9 +1688,8 @@ class LinkedInConnector(JobConnector):
                     if not page_text or len(page_text) < 100:
                         # Page might not have loaded, try scrolling to trigger lazy loading
                         await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        await page.wait_for_timeout(2000)
+                        await self._wait_for_detail_content(page, timeout=3000)
                         await page.evaluate("window.scrollTo(0, 0)")
-                        await page.wait_for_timeout(1000)
                         
                         # Re-check if it's actually a login page (not just has sign-in buttons)
                         is_login_page = await page.evaluate("""
@@ -1645,16 +1710,14 @@ class LinkedInConnector(JobConnector):
                         """)
                         if is_login_page:
                             print(f"[LinkedIn Playwright] Actually redirected to login/signup page after scroll for {job_url[:60]}...")
-                            await browser.close()
                             return out
                     
                 except Exception as nav_err:
                     # If navigation fails, try original URL
                     try:
                         await page.goto(job_url, wait_until="domcontentloaded", timeout=20000)
-                        await page.wait_for_timeout(3000)
+                        await self._wait_for_detail_content(page, timeout=5000)
                     except Exception:
-                        await browser.close()
                         return out
                 
                 # Extract description - try multiple strategies
@@ -1718,7 +1781,7 @@ class LinkedInConnector(JobConnector):
                             show_more_btn = await page.query_selector("button:has-text('Show more'), button[aria-label*='Show more']")
                             if show_more_btn:
                                 await show_more_btn.click(timeout=3000)
-                                await page.wait_for_timeout(1000)
+                                await self._wait_for_detail_content(page, timeout=2000)
                                 # Retry selectors after clicking show more
                                 for sel in desc_selectors[:3]:  # Try first 3 again
                                     try:
@@ -1781,7 +1844,6 @@ class LinkedInConnector(JobConnector):
                         
                         if is_login_page:
                             print(f"[LinkedIn Playwright] ⚠️  Actually on login/signup page for {job_url[:60]}... (title: {page_title[:50]})")
-                            await browser.close()
                             return out
                         
                         # Find all elements with data-test attributes
@@ -2001,8 +2063,6 @@ class LinkedInConnector(JobConnector):
                                     continue
                     except Exception:
                         pass
-                
-                await browser.close()
         except Exception as e:
             # Silently fail - this is a fallback
             pass
@@ -1,11 +1,10 @@
 """
 RemoteOK connector (async HTTP API).
 """
-import httpx
-import re
 from typing import List, Optional
 from datetime import datetime
-from connectors.base import JobConnector, RawJob, SearchQuery
+from connectors.base import JobConnector, RawJob, SearchQuery, older_than, posted_since
+from connectors.remoteok_feed import get_remoteok_feed, tokenize
 
 
 class RemoteOKConnector(JobConnector):
@@ -24,58 +23,47 @@ class RemoteOKConnector(JobConnector):
         self.base_url = "https://remoteok.com/api"
     
     async def fetch(self, query: SearchQuery, since: Optional[datetime] = None) -> List[RawJob]:
-        """Fetch jobs from RemoteOK API."""
+        """Fetch jobs from the shared RemoteOK feed snapshot (downloaded at most once per TTL)."""
         try:
-            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                print(f"[RemoteOK] GET {self.base_url}")
-                resp = await client.get(self.base_url)
-                resp.raise_for_status()
-                data = resp.json()
-                print(f"[RemoteOK] status={resp.status_code} items={len(data)}")
+            feed = get_remoteok_feed()
+            await feed.refresh()
+            tokens = self._tokenize_keywords(query.keywords)
+            print(f"[RemoteOK] snapshot rows={len(feed.rows)} filters tokens={tokens}")
+            jobs: List[RawJob] = []
 
-                tokens = self._tokenize_keywords(query.keywords)
-                phrases = [p.strip().lower() for p in (query.keywords or []) if isinstance(p, str) and p.strip()]
-                print(f"[RemoteOK] filters tokens={tokens} phrases={phrases}")
-                jobs: List[RawJob] = []
-
-                rows = [row for row in data[1:] if isinstance(row, dict)]  # skip metadata row
-                if not tokens:
-                    # No keywords → take top rows
-                    for job_data in rows[: query.max_results]:
-                        raw = self._parse_job(job_data)
-                        if raw and (not since or (raw.posted_at and raw.posted_at >= since)):
-                            jobs.append(raw)
-                    return jobs
-
-                # With keywords: previous behavior — any-of token OR phrase match; fallback to top rows if none
-                for job_data in rows:
-                    text = f"{job_data.get('position', '')} {job_data.get('description', '')}".lower()
-                    phrase_hit = any(ph in text for ph in phrases if len(ph) > 3)
-                    token_hit = any(tok in text for tok in tokens)
-                    if phrase_hit or token_hit:
-                        raw = self._parse_job(job_data)
-                        if raw and (not since or (raw.posted_at and raw.posted_at >= since)):
-                            jobs.append(raw)
-                            if len(jobs) >= query.max_results:
-                                break
-                if jobs:
-                    return jobs
-
-                # Fallback: return top rows when nothing matched
-                for job_data in rows[: query.max_results]:
+            if not tokens:
+                # No keywords → take top rows
+                for job_data in feed.top(query.max_results):
                     raw = self._parse_job(job_data)
-                    if raw and (not since or (raw.posted_at and raw.posted_at >= since)):
+                    if raw and posted_since(raw.posted_at, since):
                         jobs.append(raw)
                 return jobs
+
+            # With keywords: any-of token OR phrase match via the index; fallback to top rows if none
+            for job_data in feed.search(query.keywords):
+                raw = self._parse_job(job_data)
+                if raw and older_than(raw.posted_at, since):
+                    break  # the feed is newest first: everything after this is behind the watermark
+                if raw and posted_since(raw.posted_at, since):
+                    jobs.append(raw)
+                    if len(jobs) >= query.max_results:
+                        break
+            if jobs:
+                return jobs
+
+            # Fallback: return top rows when nothing matched
+            for job_data in feed.top(query.max_results):
+                raw = self._parse_job(job_data)
+                if raw and posted_since(raw.posted_at, since):
+                    jobs.append(raw)
+            return jobs
         except Exception as e:
             print(f"[RemoteOK] Error: {e}")
             return []
     
     def _tokenize_keywords(self, keywords: List[str]) -> List[str]:
         """Tokenize keywords for filtering."""
-        text = " ".join(keywords).lower()
-        parts = re.split(r"[^a-z0-9+]+", text)
-        return [p for p in parts if p and len(p) >= 2][:8]
+        return tokenize(" ".join(keywords or []))[:8]
     
     def _parse_job(self, data: dict) -> Optional[RawJob]:
         """Parse RemoteOK API response to RawJob."""
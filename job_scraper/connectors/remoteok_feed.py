@@ -0,0 +1,202 @@
+"""
+Shared snapshot of the RemoteOK feed with a local inverted index.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Set
+
+FEED_URL = "https://remoteok.com/api"
+FEED_TTL_SECONDS = int(os.getenv("REMOTEOK_FEED_TTL", "600"))
+REDIS_KEY = "remoteok:feed:snapshot"
+REDIS_META_KEY = "remoteok:feed:meta"
+
+_TOKEN_SPLIT = re.compile(r"[^a-z0-9+]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Same token rules the connector has always used for keyword matching."""
+    return [p for p in _TOKEN_SPLIT.split((text or "").lower()) if p and len(p) >= 2]
+
+
+class RemoteOKFeed:
+    """
+    Downloads the RemoteOK feed at most once per TTL (conditional GET with
+    ETag / Last-Modified), keeps the rows in memory with a token -> row index,
+    and mirrors the snapshot in Redis so other processes skip the download.
+    """
+
+    def __init__(self, ttl: int = FEED_TTL_SECONDS):
+        self.ttl = ttl
+        self.rows: List[Dict[str, Any]] = []
+        self.index: Dict[str, Set[int]] = {}
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.fetched_at: float = 0.0
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._redis_client = None
+
+    def _lock(self) -> asyncio.Lock:
+        # asyncio.Lock binds to a loop; the app runs connectors under separate asyncio.run() loops
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(id(loop))
+        if lock is None:
+            self._locks = {id(loop): asyncio.Lock()}
+            lock = self._locks[id(loop)]
+        return lock
+
+    def is_fresh(self) -> bool:
+        return bool(self.rows) and (time.time() - self.fetched_at) < self.ttl
+
+    @staticmethod
+    def _text(row: Dict[str, Any]) -> str:
+        return f"{row.get('position', '')} {row.get('description', '')}".lower()
+
+    def _load_rows(self, rows: List[Dict[str, Any]]) -> None:
+        index: Dict[str, Set[int]] = {}
+        for i, row in enumerate(rows):
+            for tok in set(tokenize(self._text(row))):
+                index.setdefault(tok, set()).add(i)
+        self.rows = rows
+        self.index = index
+
+    def _redis(self):
+        """The process-wide Redis client, looked up once per feed."""
+        if self._redis_client is None:
+            try:
+                from deps import get_shared_redis_client
+                self._redis_client = get_shared_redis_client()
+            except Exception:
+                return None
+        return self._redis_client
+
+    def _read_redis(self, r):
+        """(meta, rows) of the Redis snapshot if it is fresher than ours; rows is None when our rows are current."""
+        try:
+            meta_raw = r.get(REDIS_META_KEY)
+            if not meta_raw:
+                return None
+            meta = json.loads(meta_raw)
+            if float(meta.get("fetched_at") or 0) <= self.fetched_at:
+                return None
+            rows = None
+            if meta.get("etag") != self.etag or not self.rows:
+                blob = r.get(REDIS_KEY)
+                if not blob:
+                    return None
+                rows = json.loads(zlib.decompress(blob))
+            return meta, rows
+        except Exception as e:
+            print(f"[RemoteOK][Feed] Redis snapshot load failed: {e}")
+            return None
+
+    async def _load_from_redis(self, r) -> bool:
+        """Adopt the Redis snapshot if it is fresher than ours (Redis I/O and decoding run off the loop)."""
+        snapshot = await asyncio.to_thread(self._read_redis, r)
+        if snapshot is None:
+            return False
+        meta, rows = snapshot
+        if rows is not None:
+            self._load_rows(rows)
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        self.fetched_at = float(meta.get("fetched_at") or 0)
+        return True
+
+    def _save_meta(self, r) -> None:
+        if r is None:
+            return
+        try:
+            meta = {"etag": self.etag, "last_modified": self.last_modified, "fetched_at": self.fetched_at, "rows": len(self.rows)}
+            r.setex(REDIS_META_KEY, self.ttl * 6, json.dumps(meta))
+        except Exception:
+            pass
+
+    def _save_to_redis(self, r) -> None:
+        if r is None:
+            return
+        try:
+            blob = zlib.compress(json.dumps(self.rows, separators=(",", ":")).encode(), 6)
+            r.setex(REDIS_KEY, self.ttl * 6, blob)
+            self._save_meta(r)
+        except Exception as e:
+            print(f"[RemoteOK][Feed] Redis snapshot save failed: {e}")
+
+    async def refresh(self, force: bool = False) -> None:
+        """Ensure the snapshot is no older than the TTL."""
+        if not force and self.is_fresh():
+            return
+        async with self._lock():
+            if not force and self.is_fresh():
+                return
+            r = self._redis()
+            if r is not None and not force and await self._load_from_redis(r) and self.is_fresh():
+                print(f"[RemoteOK][Feed] Using Redis snapshot ({len(self.rows)} rows)")
+                return
+
+            from connectors.http import pooled_client, request_timeout
+            headers = {}
+            if self.rows and self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.rows and self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+            try:
+                print(f"[RemoteOK][Feed] GET {FEED_URL} conditional={bool(headers)}")
+                async with pooled_client(FEED_URL) as client:
+                    resp = await client.get(FEED_URL, headers=headers, timeout=request_timeout(10.0))
+                if resp.status_code == 304:
+                    self.fetched_at = time.time()
+                    await asyncio.to_thread(self._save_meta, r)  # sync Redis client: off the loop
+                    print(f"[RemoteOK][Feed] Not modified ({len(self.rows)} rows)")
+                    return
+                resp.raise_for_status()
+                data = resp.json()
+                rows = [row for row in data[1:] if isinstance(row, dict)]  # skip metadata row
+                self._load_rows(rows)
+                self.etag = resp.headers.get("etag")
+                self.last_modified = resp.headers.get("last-modified")
+                self.fetched_at = time.time()
+                print(f"[RemoteOK][Feed] status={resp.status_code} rows={len(rows)} tokens={len(self.index)}")
+                await asyncio.to_thread(self._save_to_redis, r)
+            except Exception as e:
+                # Keep serving the stale snapshot if we have one
+                print(f"[RemoteOK][Feed] Refresh failed: {e}")
+
+    def search(self, keywords: List[str], max_tokens: int = 8) -> List[Dict[str, Any]]:
+        """
+        Rows matching any keyword token or phrase, in feed order.
+        Phrases are resolved by intersecting their tokens' postings, then confirmed on the text.
+        """
+        phrases = [p.strip().lower() for p in (keywords or []) if isinstance(p, str) and p.strip()]
+        tokens = tokenize(" ".join(phrases))[:max_tokens]
+        hits: Set[int] = set()
+        for tok in tokens:
+            hits |= self.index.get(tok, set())
+        for ph in phrases:
+            if len(ph) <= 3:
+                continue
+            ph_tokens = tokenize(ph)
+            if not ph_tokens:
+                continue
+            candidates = set(self.index.get(ph_tokens[0], set()))
+            for tok in ph_tokens[1:]:
+                candidates &= self.index.get(tok, set())
+            hits |= {i for i in candidates if ph in self._text(self.rows[i])}
+        return [self.rows[i] for i in sorted(hits)]
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return self.rows[:limit]
+
+
+_FEED: Optional[RemoteOKFeed] = None
+
+
+def get_remoteok_feed() -> RemoteOKFeed:
+    """Process-wide feed snapshot shared by all RemoteOK callers."""
+    global _FEED
+    if _FEED is None:
+        _FEED = RemoteOKFeed()
+    return _FEED
@@ -2,6 +2,7 @@
 Dependencies and configuration.
 """
 import os
+import time
 import psycopg2
 import redis
 from psycopg2.pool import ThreadedConnectionPool
@@ -193,7 +194,91 @@ def get_redis_client() -> Optional[redis.Redis]:
         return None
 
 
+_SHARED_REDIS: Optional[redis.Redis] = None
+_SHARED_REDIS_CHECKED_AT = 0.0
+_SHARED_REDIS_RETRY_SECONDS = 60
+
+
+def get_shared_redis_client() -> Optional[redis.Redis]:
+    """
+    One Redis client per process for helpers called per request (connection
+    attempts retried at most once a minute). redis-py clients are thread-safe.
+    """
+    global _SHARED_REDIS, _SHARED_REDIS_CHECKED_AT
+    if _SHARED_REDIS is None and time.time() - _SHARED_REDIS_CHECKED_AT >= _SHARED_REDIS_RETRY_SECONDS:
+        _SHARED_REDIS_CHECKED_AT = time.time()
+        _SHARED_REDIS = get_redis_client()
+    return _SHARED_REDIS
+
+
 # Stream names
-STREAM_FANOUT = "jobs:fanout"
+STREAM_FANOUT = "jobs:fanout"  # legacy shared stream; the worker re-routes anything left on it
 STREAM_GROUP = "aggregators"
 
+# Fetch tasks are split by source class so slow browser (Playwright) sources
+# never sit in front of fast API sources. Each class has its own stream,
+# consumer group and consumer pool size.
+SOURCE_CLASSES = {
+    "adzuna": "api",
+    "jooble": "api",
+    "remoteok": "api",
+    "linkedin": "browser",
+    "iimjobs": "browser",
+}
+DEFAULT_SOURCE_CLASS = "api"
+FETCH_STREAMS = {
+    "api": "jobs:fetch:api",
+    "browser": "jobs:fetch:browser",
+}
+FETCH_GROUPS = {
+    "api": f"{STREAM_GROUP}:api",
+    "browser": f"{STREAM_GROUP}:browser",
+}
+# Max in-flight messages per class, per worker process
+FETCH_CONCURRENCY = {
+    "api": int(os.getenv("WORKER_API_CONCURRENCY", "4")),
+    "browser": int(os.getenv("WORKER_BROWSER_CONCURRENCY", "2")),
+}
+# Max in-flight messages across all classes, per worker process
+WORKER_MAX_INFLIGHT = int(os.getenv("WORKER_MAX_INFLIGHT", "8"))
+# Max concurrent fetch tasks per source, per worker process ("linkedin=2,iimjobs=1")
+SOURCE_CONCURRENCY_DEFAULT = int(os.getenv("WORKER_SOURCE_DEFAULT_CONCURRENCY", "4"))
+SOURCE_CONCURRENCY = {
+    "linkedin": 2,
+    "iimjobs": 1,
+}
+for _item in os.getenv("WORKER_SOURCE_CONCURRENCY", "").split(","):
+    if "=" in _item:
+        _name, _value = _item.split("=", 1)
+        try:
+            SOURCE_CONCURRENCY[_name.strip().lower()] = int(_value)
+        except ValueError:
+            pass
+
+
+# Priority lanes: interactive searches (a user is waiting) vs. scheduled refreshes.
+# The low lane is the class stream itself; the high lane is "<stream>:high".
+PRIORITY_HIGH = "high"
+PRIORITY_LOW = "low"
+LANES = (PRIORITY_HIGH, PRIORITY_LOW)
+# Out of every (high + low) reads a consumer tries the low lane first `low` times
+LANE_WEIGHTS = {
+    PRIORITY_HIGH: int(os.getenv("WORKER_HIGH_LANE_WEIGHT", "4")),
+    PRIORITY_LOW: int(os.getenv("WORKER_LOW_LANE_WEIGHT", "1")),
+}
+# In-flight slots per class that only ever take interactive work (so refresh bursts cannot occupy all of them)
+RESERVED_HIGH_SLOTS = int(os.getenv("WORKER_RESERVED_HIGH_SLOTS", os.getenv("WORKER_RESERVED_HIGH_CONSUMERS", "1")))
+# Interactive tasks older than this move to the low lane: the user has already been answered from cache/DB
+INTERACTIVE_DEADLINE_SECONDS = float(os.getenv("INTERACTIVE_DEADLINE_SECONDS", "45"))
+
+
+def fetch_stream_name(cls: str, lane: str = PRIORITY_LOW) -> str:
+    """Stream for a source class and priority lane."""
+    base = FETCH_STREAMS[cls]
+    return base if lane == PRIORITY_LOW else f"{base}:{lane}"
+
+
+def source_class(source: str) -> str:
+    """Stream class ('api' or 'browser') a source's fetch tasks are published to."""
+    return SOURCE_CLASSES.get((source or "").lower(), DEFAULT_SOURCE_CLASS)
+
@@ -0,0 +1,150 @@
+"""
+Coalescing of identical connector fetches across users (Redis leases keyed by canonical fetch key).
+"""
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+COALESCE_WINDOW_SECONDS = int(os.getenv("FETCH_COALESCE_WINDOW", "300"))
+LEASE_TTL_SECONDS = int(os.getenv("FETCH_COALESCE_LEASE_TTL", "300"))
+
+ROLE_LEADER = "leader"  # run the fetch
+ROLE_JOINED = "joined"  # identical fetch in flight; wait to be scored by its leader
+ROLE_RECENT = "recent"  # identical fetch finished within the window; reuse its jobs
+
+# Delete the lease only if we still own it
+_RELEASE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['token'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class FetchCoalescer:
+    """
+    One connector fetch per canonical key at a time. The first task takes a lease
+    and fetches; identical tasks arriving meanwhile register as waiters, which the
+    leader scores against the jobs it stored once it is done. Identical tasks that
+    arrive within `window` seconds after completion reuse those jobs directly.
+
+    A fetch only covers another if it asked for at least as many results and was
+    not incremental (`since`) when the other is a full fetch.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        window: int = COALESCE_WINDOW_SECONDS,
+        lease_ttl: int = LEASE_TTL_SECONDS,
+    ):
+        self.redis = redis_client
+        self.window = window
+        self.lease_ttl = lease_ttl
+
+    @staticmethod
+    def _keys(key: str) -> Tuple[str, str, str]:
+        return f"fetch:lease:{key}", f"fetch:done:{key}", f"fetch:waiters:{key}"
+
+    @staticmethod
+    def _covers(info: Dict[str, Any], max_results: int, incremental: bool) -> bool:
+        if int(info.get("max_results") or 0) < max_results:
+            return False
+        return incremental or not info.get("incremental")
+
+    def _load(self, redis_key: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.get(redis_key)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except Exception:
+            return None
+
+    def recent(self, key: str) -> Optional[Dict[str, Any]]:
+        """Result summary of the last completed fetch for this key, if still in the window."""
+        return self._load(self._keys(key)[1])
+
+    def acquire(self, key: str, max_results: int, incremental: bool = False) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Returns (role, info): ROLE_RECENT with the completed fetch's summary, ROLE_JOINED with
+        the in-flight lease, or ROLE_LEADER with {"token": ...} (token None when an in-flight
+        fetch exists but does not cover this one, so this task fetches without the lease).
+        """
+        lease_key, done_key, _ = self._keys(key)
+        try:
+            done = self._load(done_key)
+            if done and self._covers(done, max_results, incremental):
+                return ROLE_RECENT, done
+            token = uuid.uuid4().hex
+            lease = {"token": token, "max_results": max_results, "incremental": incremental, "started_at": time.time()}
+            if self.redis.set(lease_key, json.dumps(lease), nx=True, ex=self.lease_ttl):
+                return ROLE_LEADER, {"token": token}
+            current = self._load(lease_key)
+            if current and self._covers(current, max_results, incremental):
+                return ROLE_JOINED, current
+            return ROLE_LEADER, {"token": None}
+        except Exception as e:
+            print(f"[Coalesce] Lease check failed for {key}: {e}")
+            return ROLE_LEADER, {"token": None}
+
+    def join(self, key: str, waiter: Dict[str, Any]) -> bool:
+        """
+        Register a requester with the in-flight fetch. Returns False if the leader already
+        finished (the caller must then serve itself from `recent`).
+        """
+        lease_key, _, waiters_key = self._keys(key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(waiters_key, json.dumps(waiter))
+        pipe.expire(waiters_key, self.lease_ttl + self.window)
+        pipe.exists(lease_key)
+        # The leader drops its lease before draining, so a live lease means we will be drained
+        return bool(pipe.execute()[-1])
+
+    def _release(self, key: str, token: Optional[str]) -> List[Dict[str, Any]]:
+        lease_key, _, waiters_key = self._keys(key)
+        if token:
+            self.redis.eval(_RELEASE_SCRIPT, 1, lease_key, token)
+        waiters = []
+        while True:
+            raw = self.redis.lpop(waiters_key)
+            if raw is None:
+                break
+            try:
+                waiters.append(json.loads(raw))
+            except Exception:
+                continue
+        return waiters
+
+    def complete(self, key: str, token: Optional[str], job_ids: List[str], max_results: int, incremental: bool = False) -> List[Dict[str, Any]]:
+        """Publish the finished fetch, release the lease and return the waiters to score."""
+        _, done_key, _ = self._keys(key)
+        try:
+            summary = {
+                "job_ids": job_ids,
+                "max_results": max_results,
+                "incremental": incremental,
+                "finished_at": time.time(),
+            }
+            self.redis.set(done_key, json.dumps(summary), ex=self.window)
+            if not token:
+                return []  # the lease holder drains its own waiters
+            return self._release(key, token)
+        except Exception as e:
+            print(f"[Coalesce] Failed to complete {key}: {e}")
+            return []
+
+    def abandon(self, key: str, token: Optional[str]) -> List[Dict[str, Any]]:
+        """Release the lease after a failed/skipped fetch; returns the waiters left unserved."""
+        if not token:
+            return []
+        try:
+            return self._release(key, token)
+        except Exception as e:
+            print(f"[Coalesce] Failed to release {key}: {e}")
+            return []
@@ -1,7 +1,7 @@
 """
 Job deduplication logic (hash-based, rule-based, optional fuzzy).
 """
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 import psycopg2
 from psycopg2.extras import execute_values
 from pipelines.normalize import canonicalize_job, compute_content_hash
@@ -20,114 +20,139 @@ def dedupe_jobs(
         (new_jobs, duplicate_jobs) - both as canonical dicts ready for upsert
     """
     canonical = [canonicalize_job(raw) for raw in raw_jobs]
+    with db_conn.cursor() as cur:
+        return dedupe_canonical_jobs(canonical, cur, source_id)
+
+
+# normalize_url() in SQL (query and fragment dropped, trailing slashes stripped, lowercased;
+# only ';params' path segments, which job URLs don't use, are kept);
+# indexed per source by sql/007_job_url_dedupe.sql
+URL_NORM_SQL = "lower(rtrim(split_part(split_part(url, '#', 1), '?', 1), '/'))"
+
+
+def find_existing_urls(cur, source_id: int, normalized_urls: List[str]) -> Set[str]:
+    """The given normalized URLs that are already stored for a source (index lookup per URL)."""
+    if not normalized_urls:
+        return set()
+    cur.execute(
+        f"SELECT DISTINCT {URL_NORM_SQL} FROM jobs WHERE source_id = %s AND url IS NOT NULL AND {URL_NORM_SQL} = ANY(%s)",
+        (source_id, list(normalized_urls)),
+    )
+    return {row[0] for row in cur.fetchall() if row[0]}
+
+
+def dedupe_canonical_jobs(
+    canonical: List[Dict[str, Any]],
+    cur,
+    source_id: int,
+    seen_urls: Optional[Set[str]] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split already-canonicalized jobs into (new, duplicate) using an open cursor.
+    Only this batch's URLs are looked up in the database. Callers that dedupe many
+    batches pass `seen_urls`: normalized URLs of jobs classified as new earlier
+    (possibly not persisted yet), extended with this batch's new jobs.
+    """
+    from pipelines.normalize import normalize_url
     new_jobs: List[Dict[str, Any]] = []
     duplicate_jobs: List[Dict[str, Any]] = []
+    if not canonical:
+        return new_jobs, duplicate_jobs
     
-    with db_conn.cursor() as cur:
-        # Fast check: same (source_id, external_id)
-        external_ids = [c["external_id"] for c in canonical]
-        cur.execute(
-            "SELECT external_id FROM jobs WHERE source_id = %s AND external_id = ANY(%s)",
-            (source_id, external_ids),
-        )
-        existing_external_ids = {row[0] for row in cur.fetchall()}
+    # Fast check: same (source_id, external_id)
+    external_ids = [c["external_id"] for c in canonical]
+    cur.execute(
+        "SELECT external_id FROM jobs WHERE source_id = %s AND external_id = ANY(%s)",
+        (source_id, external_ids),
+    )
+    existing_external_ids = {row[0] for row in cur.fetchall()}
+    
+    # URL check: normalize URLs and check for duplicates
+    normalized_urls_map = {}  # normalized -> original
+    for c in canonical:
+        orig_url = c.get("url")
+        if orig_url:
+            norm_url = normalize_url(orig_url)
+            if norm_url:
+                normalized_urls_map[norm_url] = orig_url
+    
+    existing_normalized_urls = find_existing_urls(cur, source_id, list(normalized_urls_map))
+    if seen_urls:
+        existing_normalized_urls |= seen_urls & normalized_urls_map.keys()
+    
+    # Hash check: exact content match
+    hashes = [c["hash"] for c in canonical]
+    cur.execute(
+        "SELECT encode(hash, 'hex') FROM jobs WHERE hash = ANY(%s)",
+        (hashes,),
+    )
+    existing_hashes = {row[0] for row in cur.fetchall()}
+    
+    # Rule-based: same (normalized_company, normalized_title, location) within ±14 days
+    for c in canonical:
+        if c["external_id"] in existing_external_ids:
+            duplicate_jobs.append(c)
+            continue
+        
+        # Check URL uniqueness using normalized URLs
+        orig_url = c.get("url")
+        norm_url = normalize_url(orig_url) if orig_url else None
+        if norm_url and norm_url in existing_normalized_urls:
+            duplicate_jobs.append(c)
+            continue
         
-        # URL check: normalize URLs and check for duplicates
-        from pipelines.normalize import normalize_url
-        normalized_urls_map = {}  # normalized -> original
-        for c in canonical:
-            orig_url = c.get("url")
-            if orig_url:
-                norm_url = normalize_url(orig_url)
-                if norm_url:
-                    normalized_urls_map[norm_url] = orig_url
+        hash_hex = c["hash"].hex() if isinstance(c["hash"], bytes) else c["hash"]
+        if hash_hex in existing_hashes:
+            duplicate_jobs.append(c)
+            continue
         
-        existing_normalized_urls = set()
-        if normalized_urls_map:
-            # Fetch existing URLs from same source and normalize them for comparison
-            # This is more efficient than fetching all URLs
+        # Rule-based check: same (normalized_company, normalized_title, location)
+        # Only check date range if posted_at is available
+        posted_at = c.get("posted_at")
+        if posted_at:
+            # Check with date range (±14 days)
             cur.execute(
-                "SELECT url FROM jobs WHERE source_id = %s AND url IS NOT NULL",
-                (source_id,)
+                """
+                SELECT id FROM jobs
+                WHERE company_id IN (SELECT id FROM companies WHERE name = %s)
+                AND normalized_title = %s
+                AND location = %s
+                AND posted_at IS NOT NULL
+                AND posted_at >= %s - INTERVAL '14 days'
+                AND posted_at <= %s + INTERVAL '14 days'
+                LIMIT 1
+                """,
+                (
+                    c["company"],
+                    c.get("normalized_title"),
+                    c["location"],
+                    posted_at,
+                    posted_at,
+                ),
             )
-            for row in cur.fetchall():
-                if row[0]:
-                    norm_existing = normalize_url(row[0])
-                    if norm_existing and norm_existing in normalized_urls_map:
-                        existing_normalized_urls.add(norm_existing)
-        
-        # Hash check: exact content match
-        hashes = [c["hash"] for c in canonical]
-        cur.execute(
-            "SELECT encode(hash, 'hex') FROM jobs WHERE hash = ANY(%s)",
-            (hashes,),
-        )
-        existing_hashes = {row[0] for row in cur.fetchall()}
+        else:
+            # Check without date range (just company, title, location)
+            cur.execute(
+                """
+                SELECT id FROM jobs
+                WHERE company_id IN (SELECT id FROM companies WHERE name = %s)
+                AND normalized_title = %s
+                AND location = %s
+                LIMIT 1
+                """,
+                (
+                    c["company"],
+                    c.get("normalized_title"),
+                    c["location"],
+                ),
+            )
+        if cur.fetchone():
+            duplicate_jobs.append(c)
+            continue
         
-        # Rule-based: same (normalized_company, normalized_title, location) within ±14 days
-        for c in canonical:
-            if c["external_id"] in existing_external_ids:
-                duplicate_jobs.append(c)
-                continue
-            
-            # Check URL uniqueness using normalized URLs
-            orig_url = c.get("url")
-            if orig_url:
-                norm_url = normalize_url(orig_url)
-                if norm_url and norm_url in existing_normalized_urls:
-                    duplicate_jobs.append(c)
-                    continue
-            
-            hash_hex = c["hash"].hex() if isinstance(c["hash"], bytes) else c["hash"]
-            if hash_hex in existing_hashes:
-                duplicate_jobs.append(c)
-                continue
-            
-            # Rule-based check: same (normalized_company, normalized_title, location)
-            # Only check date range if posted_at is available
-            posted_at = c.get("posted_at")
-            if posted_at:
-                # Check with date range (±14 days)
-                cur.execute(
-                    """
-                    SELECT id FROM jobs
-                    WHERE company_id IN (SELECT id FROM companies WHERE name = %s)
-                    AND normalized_title = %s
-                    AND location = %s
-                    AND posted_at IS NOT NULL
-                    AND posted_at >= %s - INTERVAL '14 days'
-                    AND posted_at <= %s + INTERVAL '14 days'
-                    LIMIT 1
-                    """,
-                    (
-                        c["company"],
-                        c.get("normalized_title"),
-                        c["location"],
-                        posted_at,
-                        posted_at,
-                    ),
-                )
-            else:
-                # Check without date range (just company, title, location)
-                cur.execute(
-                    """
-                    SELECT id FROM jobs
-                    WHERE company_id IN (SELECT id FROM companies WHERE name = %s)
-                    AND normalized_title = %s
-                    AND location = %s
-                    LIMIT 1
-                    """,
-                    (
-                        c["company"],
-                        c.get("normalized_title"),
-                        c["location"],
-                    ),
-                )
-            if cur.fetchone():
-                duplicate_jobs.append(c)
-                continue
-            
-            new_jobs.append(c)
+        if seen_urls is not None and norm_url:
+            seen_urls.add(norm_url)
+        new_jobs.append(c)
     
     return new_jobs, duplicate_jobs
 
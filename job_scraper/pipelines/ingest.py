@@ -0,0 +1,622 @@
+"""
+Staged ingest pipeline: fetch -> canonicalize -> dedupe -> persist -> score over bounded queues.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from connectors.base import JobConnector, SearchQuery, to_utc
+from pipelines.normalize import canonicalize_job
+from pipelines.dedupe import dedupe_canonical_jobs
+from utils.locations import UserLocation, extract_city, location_boost, resolve_user_location
+
+QUEUE_SIZE = int(os.getenv("WORKER_PIPELINE_QUEUE_SIZE", "100"))
+BATCH_SIZE = int(os.getenv("WORKER_PIPELINE_BATCH_SIZE", "25"))
+BATCH_WAIT_SECONDS = float(os.getenv("WORKER_PIPELINE_BATCH_WAIT", "0.5"))
+STAGE_CONCURRENCY = {
+    "canonicalize": int(os.getenv("WORKER_PIPELINE_CANONICALIZE_CONCURRENCY", "1")),
+    "dedupe": int(os.getenv("WORKER_PIPELINE_DEDUPE_CONCURRENCY", "1")),
+    "persist": int(os.getenv("WORKER_PIPELINE_PERSIST_CONCURRENCY", "1")),
+    "score": int(os.getenv("WORKER_PIPELINE_SCORE_CONCURRENCY", "2")),
+}
+# ThreadedConnectionPool raises instead of waiting when exhausted; stage threads queue here instead
+DB_CONNECTIONS = int(os.getenv("WORKER_DB_CONNECTIONS", "8"))
+_DB_SLOTS = threading.BoundedSemaphore(max(1, DB_CONNECTIONS))
+MAX_TRACKED_JOB_IDS = 1000
+STAGES = ("fetch", "canonicalize", "dedupe", "persist", "score")
+
+NO_DESCRIPTION = "No description available as of now"
+
+JOB_UPSERT_SQL = """
+    INSERT INTO jobs (
+        source_id, external_id, company_id, company, title, normalized_title,
+        description, location, city, region, country_code, geoname_id, latitude, longitude, geo_cell,
+        url, posted_at, min_salary, max_salary, currency, experience_min, experience_max,
+        employment_type, remote_type, skills, hash, last_match_score
+    ) VALUES %s
+    ON CONFLICT (source_id, external_id) DO UPDATE SET
+        company_id = COALESCE(EXCLUDED.company_id, jobs.company_id),
+        company = COALESCE(NULLIF(EXCLUDED.company, ''), jobs.company),
+        title = COALESCE(NULLIF(EXCLUDED.title, ''), jobs.title),
+        normalized_title = COALESCE(EXCLUDED.normalized_title, jobs.normalized_title),
+        -- Prefer a new non-empty description over an empty/placeholder or shorter one
+        description = CASE
+            WHEN EXCLUDED.description IS NOT NULL AND EXCLUDED.description != ''
+                 AND (jobs.description IS NULL OR jobs.description = ''
+                      OR jobs.description = 'No description available as of now')
+            THEN EXCLUDED.description
+            WHEN EXCLUDED.description IS NOT NULL AND EXCLUDED.description != ''
+                 AND LENGTH(EXCLUDED.description) > LENGTH(COALESCE(jobs.description, ''))
+            THEN EXCLUDED.description
+            ELSE COALESCE(jobs.description, EXCLUDED.description, 'No description available as of now')
+        END,
+        -- New non-empty location > existing location > new empty location
+        location = CASE
+            WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+            THEN EXCLUDED.location
+            WHEN jobs.location IS NOT NULL AND jobs.location != '' AND jobs.location != 'N/A'
+            THEN jobs.location
+            ELSE COALESCE(EXCLUDED.location, jobs.location)
+        END,
+        -- Canonical parts follow whichever location was kept
+        city = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                    THEN EXCLUDED.city ELSE COALESCE(jobs.city, EXCLUDED.city) END,
+        region = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                      THEN EXCLUDED.region ELSE COALESCE(jobs.region, EXCLUDED.region) END,
+        country_code = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                            THEN EXCLUDED.country_code ELSE COALESCE(jobs.country_code, EXCLUDED.country_code) END,
+        geoname_id = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                          THEN EXCLUDED.geoname_id ELSE COALESCE(jobs.geoname_id, EXCLUDED.geoname_id) END,
+        latitude = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                        THEN EXCLUDED.latitude ELSE COALESCE(jobs.latitude, EXCLUDED.latitude) END,
+        longitude = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                         THEN EXCLUDED.longitude ELSE COALESCE(jobs.longitude, EXCLUDED.longitude) END,
+        geo_cell = CASE WHEN EXCLUDED.location IS NOT NULL AND EXCLUDED.location != '' AND EXCLUDED.location != 'N/A'
+                        THEN EXCLUDED.geo_cell ELSE COALESCE(jobs.geo_cell, EXCLUDED.geo_cell) END,
+        url = COALESCE(NULLIF(EXCLUDED.url, ''), jobs.url),
+        posted_at = COALESCE(EXCLUDED.posted_at, jobs.posted_at),
+        min_salary = COALESCE(EXCLUDED.min_salary, jobs.min_salary),
+        max_salary = COALESCE(EXCLUDED.max_salary, jobs.max_salary),
+        currency = COALESCE(EXCLUDED.currency, jobs.currency),
+        experience_min = COALESCE(EXCLUDED.experience_min, jobs.experience_min),
+        experience_max = COALESCE(EXCLUDED.experience_max, jobs.experience_max),
+        employment_type = COALESCE(EXCLUDED.employment_type, jobs.employment_type),
+        remote_type = COALESCE(EXCLUDED.remote_type, jobs.remote_type),
+        skills = COALESCE(EXCLUDED.skills, jobs.skills),
+        hash = COALESCE(EXCLUDED.hash, jobs.hash),
+        scraped_at = NOW()
+    RETURNING id, external_id
+"""
+
+SCORE_UPSERT_SQL = """
+    INSERT INTO user_job_scores (user_id, job_id, last_match_score, match_components, match_details)
+    VALUES %s
+    ON CONFLICT (user_id, job_id)
+    DO UPDATE SET
+        last_match_score = EXCLUDED.last_match_score,
+        match_components = EXCLUDED.match_components,
+        match_details = EXCLUDED.match_details,
+        updated_at = now()
+"""
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+
+class _Item:
+    """A job travelling through the pipeline."""
+
+    __slots__ = ("raw", "job", "refresh", "existing", "job_id")
+
+    def __init__(self, raw: Any, refresh: bool = False):
+        self.raw = raw
+        self.job: Optional[Dict[str, Any]] = None
+        self.refresh = refresh  # re-yield of a job already seen this run (e.g. enriched by a detail page)
+        self.existing = False
+        self.job_id: Optional[str] = None
+
+
+class StageStats:
+    """Per-stage counters and timings."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy = 0.0  # doing the stage's own work
+        self.starved = 0.0  # waiting for upstream
+        self.blocked = 0.0  # waiting on a full downstream queue (backpressure)
+        self.max_depth = 0  # deepest input queue observed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "in": self.items_in,
+            "out": self.items_out,
+            "batches": self.batches,
+            "errors": self.errors,
+            "busy_s": round(self.busy, 3),
+            "starved_s": round(self.starved, 3),
+            "blocked_s": round(self.blocked, 3),
+            "max_depth": self.max_depth,
+        }
+
+
+@contextmanager
+def db_cursor(db_pool):
+    """Pooled connection + cursor bounded by the process-wide DB slots; commits on success."""
+    with _DB_SLOTS:
+        conn = db_pool.getconn()
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            db_pool.putconn(conn)
+
+
+def _location_context(location: Optional[str]) -> Dict[str, Any]:
+    """Search-location inputs for scoring, resolved once per run."""
+    context = {"aliases": None, "user": UserLocation()}
+    if not location:
+        return context
+    parts = [p.strip() for p in str(location).split(',') if p.strip()]
+    user_city = parts[0] if parts else None
+    user_country = parts[-1] if len(parts) > 1 else None
+    search_city = extract_city(location.lower())
+    aliases: Dict[str, Any] = {}
+    try:
+        from utils.geonames import get_many_city_aliases
+        # Both cities in one batch: one Redis round trip for whatever isn't cached locally
+        aliases = get_many_city_aliases([c for c in (search_city, user_city) if c])
+    except Exception as e:
+        print(f"[Pipeline] Failed to fetch search location aliases: {e}")
+    if search_city:
+        context["aliases"] = {search_city} | set(aliases.get(search_city.strip().lower(), ()))
+    user_aliases = aliases.get(user_city.strip().lower()) if user_city else None
+    context["user"] = resolve_user_location(user_city, user_country, aliases=user_aliases or set())
+    return context
+
+
+def _location_tier_boost(score: float, context: Dict[str, Any], job: Dict[str, Any]) -> float:
+    """User-specific location boost (tier or distance decay) applied before persisting a score."""
+    return min(1.0, score * location_boost(context["user"], job))
+
+
+class UserScorer:
+    """Scores canonical job dicts for one user's query (memoized) and writes user_job_scores rows."""
+
+    def __init__(self, query: SearchQuery, user_id: str):
+        from scoring.memo import profile_signature
+        self.query = query
+        self.user_id = user_id
+        self.keywords = query.keywords or []
+        self.skills = getattr(query, "skills", []) or []
+        self.location = _location_context(query.location)
+        self.signature = profile_signature(
+            keywords=self.keywords,
+            skills=self.skills,
+            location=query.location,
+            experience_level=query.experience_level,
+            remote_preference=query.remote_type,
+            search_location_aliases=self.location["aliases"],
+        )
+
+    def row(self, job_id: str, job: Dict[str, Any]) -> Optional[tuple]:
+        """user_job_scores row for a job, or None when it has no description to score."""
+        from scoring.memo import memoized_unified_score
+        description = job.get("description") or ""
+        if not description.strip() or description == NO_DESCRIPTION:
+            return None
+        q = self.query
+        result = memoized_unified_score(
+            job,
+            keywords=self.keywords,
+            skills=self.skills,
+            location=q.location,
+            experience_level=q.experience_level,
+            remote_preference=q.remote_type,
+            search_location_aliases=self.location["aliases"],
+            signature=self.signature,
+        )
+        score = _location_tier_boost(result['score'], self.location, job)
+        components = result.get('components', {})
+        details = result.get('details', {})
+        return (
+            self.user_id,
+            str(job_id),
+            float(score),
+            json.dumps(components) if components else None,
+            json.dumps(details) if details else None,
+        )
+
+    @staticmethod
+    def write(cur, rows: List[tuple]) -> None:
+        if rows:
+            execute_values(cur, SCORE_UPSERT_SQL, rows, template="(%s, %s, %s, %s::jsonb, %s::jsonb)")
+
+
+def score_jobs_for_user(db_pool, job_ids: List[str], query: SearchQuery, user_id: str) -> int:
+    """Score already-stored jobs for a user (e.g. when their fetch was coalesced into another's)."""
+    if not user_id or not job_ids:
+        return 0
+    scorer = UserScorer(query, user_id)
+    with db_cursor(db_pool) as cur:
+        cur.execute(
+            """
+            SELECT id, title, company, description, location, city, country_code, geoname_id,
+                   latitude, longitude, skills, hash, experience_min, experience_max, posted_at, scraped_at
+            FROM jobs WHERE id = ANY(%s::bigint[])
+            """,
+            ([int(job_id) for job_id in job_ids],),
+        )
+        columns = [col[0] for col in cur.description]
+        rows = []
+        for record in cur.fetchall():
+            job = dict(zip(columns, record))
+            row = scorer.row(job["id"], job)
+            if row:
+                rows.append(row)
+        UserScorer.write(cur, rows)
+    return len(rows)
+
+
+class IngestPipeline:
+    """
+    Runs one fetch task as five stages joined by bounded asyncio queues:
+
+        fetch -> canonicalize -> dedupe -> persist -> score
+
+    The fetch stage consumes the connector's `fetch_stream`, so jobs start flowing
+    before the connector finishes. Every later stage pulls micro-batches (up to
+    `batch_size` items or `batch_wait` seconds) and runs its blocking work in a
+    thread, so DB round-trips overlap with network I/O. A full queue blocks the
+    stage in front of it, which in turn stops pulling from the connector: memory
+    stays bounded by the queue sizes no matter how many jobs a source returns.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        source_id: int,
+        connector: JobConnector,
+        queries: List[SearchQuery],
+        since,
+        db_pool,
+        context_query: SearchQuery,
+        user_id: Optional[str] = None,
+        update_existing: bool = False,
+        stop_when: Optional[Callable[[Dict[str, int]], bool]] = None,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        batch_wait: float = BATCH_WAIT_SECONDS,
+        concurrency: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            source / source_id: Source code and its row id
+            connector: Connector to stream from
+            queries: Queries fetched in order (e.g. LinkedIn's city -> country -> anywhere tiers)
+            since: Only jobs posted after this datetime
+            db_pool: psycopg2 connection pool
+            context_query: The user's query (scoring inputs)
+            user_id: Score jobs for this user (None = no scoring)
+            update_existing: Upsert jobs that already exist (refresh location/description)
+                instead of dropping them at the dedupe stage
+            stop_when: Checked before each query, once every job fetched so far has been
+                deduped; True skips the remaining queries
+        """
+        self.source = source
+        self.source_id = source_id
+        self.connector = connector
+        self.queries = queries
+        self.since = since
+        self.db_pool = db_pool
+        self.context_query = context_query
+        self.user_id = user_id
+        self.update_existing = update_existing
+        self.stop_when = stop_when
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.concurrency = {**STAGE_CONCURRENCY, **(concurrency or {})}
+
+        self.stats: Dict[str, StageStats] = {name: StageStats(name) for name in STAGES}
+        self.counts = {"fetched": 0, "new": 0, "duplicates": 0, "persisted": 0, "scored": 0}
+        self.fetch_error: Optional[Exception] = None
+        self._seen_external_ids = set()
+        self._new_urls = set()  # normalized URLs of this run's new jobs (not yet persisted)
+        self._company_ids: Dict[str, int] = {}
+        self._scorer: Optional[UserScorer] = None
+        self.job_ids: List[str] = []  # persisted job ids (capped), for coalesced requesters
+        self.newest_posted_at = None  # newest posted_at streamed, for the fetch watermark
+        # Items fetched but not yet through dedupe (counts["new"] is final only at zero)
+        self._undeduped = 0
+        self._deduped = asyncio.Event()
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _cursor(self):
+        return db_cursor(self.db_pool)
+
+    async def _next_batch(self, inq: asyncio.Queue, stats: StageStats):
+        """Up to batch_size items, waiting at most batch_wait after the first. Returns (batch, done)."""
+        stats.max_depth = max(stats.max_depth, inq.qsize())
+        first = await inq.get()
+        if first is _DONE:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            if not inq.empty():
+                item = inq.get_nowait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(inq.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _stage_worker(self, name: str, inq: asyncio.Queue, outq: Optional[asyncio.Queue], handler) -> None:
+        stats = self.stats[name]
+        while True:
+            waited = time.time()
+            batch, done = await self._next_batch(inq, stats)
+            stats.starved += time.time() - waited
+            if batch:
+                stats.items_in += len(batch)
+                stats.batches += 1
+                started = time.time()
+                try:
+                    out = await asyncio.to_thread(handler, batch)
+                except Exception as e:
+                    stats.errors += len(batch)
+                    print(f"[Pipeline][{self.source}] {name} failed for batch of {len(batch)}: {e}")
+                    out = []
+                stats.busy += time.time() - started
+                stats.items_out += len(out)
+                if name == "dedupe":
+                    self._settle(len(batch))
+                elif name == "canonicalize":
+                    self._settle(len(batch) - len(out))  # dropped before reaching dedupe
+                if outq is not None:
+                    blocked = time.time()
+                    for item in out:
+                        await outq.put(item)
+                    stats.blocked += time.time() - blocked
+            if done:
+                # Hand the marker back so sibling workers of this stage also stop
+                inq.put_nowait(_DONE)
+                return
+
+    async def _run_stage(self, name: str, inq: asyncio.Queue, outq: Optional[asyncio.Queue], handler) -> None:
+        workers = max(1, self.concurrency.get(name, 1))
+        await asyncio.gather(*(self._stage_worker(name, inq, outq, handler) for _ in range(workers)))
+        if outq is not None:
+            await outq.put(_DONE)
+
+    def _settle(self, n: int) -> None:
+        self._undeduped -= n
+        if self._undeduped <= 0:
+            self._deduped.set()
+
+    async def _wait_deduped(self) -> None:
+        """Until every job fetched so far has been through dedupe (and counted as new or not)."""
+        while self._undeduped > 0:
+            self._deduped.clear()
+            await self._deduped.wait()
+
+    # -- stages -----------------------------------------------------------
+
+    async def _fetch(self, outq: asyncio.Queue) -> None:
+        stats = self.stats["fetch"]
+        try:
+            for fetch_query in self.queries:
+                if self.stop_when is not None:
+                    await self._wait_deduped()
+                    if self.stop_when(self.counts):
+                        print(f"[Pipeline][{self.source}] Stop condition met; skipping remaining queries")
+                        break
+                accepted = 0
+                waited = time.time()
+                try:
+                    async for raw in self.connector.fetch_stream(fetch_query, since=self.since):
+                        stats.busy += time.time() - waited
+                        external_id = getattr(raw, 'external_id', None)
+                        refresh = bool(external_id) and external_id in self._seen_external_ids
+                        if not refresh:
+                            if accepted >= fetch_query.max_results:
+                                waited = time.time()
+                                continue
+                            accepted += 1
+                            self.counts["fetched"] += 1
+                            if external_id:
+                                self._seen_external_ids.add(external_id)
+                        stats.items_in += 1
+                        stats.items_out += 1
+                        blocked = time.time()
+                        self._undeduped += 1
+                        await outq.put(_Item(raw, refresh=refresh))
+                        stats.blocked += time.time() - blocked
+                        stats.max_depth = max(stats.max_depth, outq.qsize())
+                        waited = time.time()
+                except Exception as e:
+                    self.fetch_error = e
+                    stats.errors += 1
+                    print(f"[Pipeline][{self.source}] Fetch error (location={fetch_query.location!r}): {e}")
+                print(f"[Pipeline][{self.source}] Query location={fetch_query.location!r} streamed {accepted} jobs; totals: {self.counts}")
+        finally:
+            await outq.put(_DONE)
+
+    def _canonicalize(self, batch: List[_Item]) -> List[_Item]:
+        out = []
+        for item in batch:
+            try:
+                item.job = canonicalize_job(item.raw)
+                out.append(item)
+                posted_at = getattr(item.raw, "posted_at", None)
+                if posted_at and (self.newest_posted_at is None or to_utc(posted_at) > to_utc(self.newest_posted_at)):
+                    self.newest_posted_at = posted_at
+            except Exception as e:
+                self.stats["canonicalize"].errors += 1
+                print(f"[Pipeline][{self.source}] Canonicalization error: {e}")
+        return out
+
+    def _dedupe(self, batch: List[_Item]) -> List[_Item]:
+        first_seen = [item for item in batch if not item.refresh]
+        with self._cursor() as cur:
+            new_jobs, dup_jobs = dedupe_canonical_jobs(
+                [item.job for item in first_seen], cur, self.source_id, self._new_urls
+            )
+        new_ids = {id(job) for job in new_jobs}
+        for item in first_seen:
+            item.existing = id(item.job) not in new_ids
+        self.counts["new"] += len(new_jobs)
+        self.counts["duplicates"] += len(dup_jobs)
+        return [item for item in batch if item.refresh or not item.existing or self.update_existing]
+
+    def _resolve_companies(self, cur, names) -> None:
+        missing = [name for name in names if name not in self._company_ids]
+        if not missing:
+            return
+        cur.execute("SELECT name, id FROM companies WHERE name = ANY(%s)", (missing,))
+        for name, company_id in cur.fetchall():
+            self._company_ids.setdefault(name, company_id)
+        for name in missing:
+            if name not in self._company_ids:
+                cur.execute("INSERT INTO companies (name) VALUES (%s) RETURNING id", (name,))
+                self._company_ids[name] = cur.fetchone()[0]
+
+    def _persist(self, batch: List[_Item]) -> List[_Item]:
+        # One row per external_id: ON CONFLICT cannot touch the same row twice in a statement,
+        # and the latest version of a job (e.g. after enrichment) is the one to keep
+        latest: Dict[Any, _Item] = {}
+        for item in batch:
+            latest[item.job.get("external_id") or id(item)] = item
+        items = list(latest.values())
+        rows = []
+        try:
+            with self._cursor() as cur:
+                self._resolve_companies(cur, {item.job.get("company") for item in items if item.job.get("company")})
+                for item in items:
+                    job = item.job
+                    description = job.get("description") or None
+                    if description and description.strip() == NO_DESCRIPTION:
+                        description = None  # store NULL; the placeholder is applied on read
+                    rows.append((
+                        self.source_id,
+                        job.get("external_id"),
+                        self._company_ids.get(job.get("company")) if job.get("company") else None,
+                        job.get("company"),
+                        job.get("title"),
+                        job.get("normalized_title"),
+                        description,
+                        job.get("location"),
+                        job.get("city"),
+                        job.get("region"),
+                        job.get("country_code"),
+                        job.get("geoname_id"),
+                        job.get("latitude"),
+                        job.get("longitude"),
+                        job.get("geo_cell"),
+                        job.get("url"),
+                        job.get("posted_at"),
+                        job.get("min_salary"),
+                        job.get("max_salary"),
+                        job.get("currency"),
+                        job.get("experience_min"),
+                        job.get("experience_max"),
+                        job.get("employment_type"),
+                        job.get("remote_type"),
+                        job.get("skills", []),
+                        job.get("hash"),
+                        None,  # last_match_score is user-specific (user_job_scores)
+                    ))
+                returned = execute_values(cur, JOB_UPSERT_SQL, rows, page_size=len(rows), fetch=True)
+        except Exception:
+            # Company ids created in the rolled-back transaction no longer exist
+            self._company_ids.clear()
+            raise
+        ids = {external_id: str(job_id) for job_id, external_id in returned}
+        for item in items:
+            item.job_id = ids.get(item.job.get("external_id"))
+        persisted = [item for item in items if item.job_id]
+        self.counts["persisted"] += len(persisted)
+        room = MAX_TRACKED_JOB_IDS - len(self.job_ids)
+        if room > 0:
+            self.job_ids.extend(item.job_id for item in persisted[:room])
+        return persisted
+
+    def _score(self, batch: List[_Item]) -> List[_Item]:
+        if not self.user_id:
+            return batch
+        if self._scorer is None:
+            self._scorer = UserScorer(self.context_query, self.user_id)
+        score_rows: Dict[str, tuple] = {}
+        for item in batch:
+            row = self._scorer.row(item.job_id, item.job)
+            if row:
+                score_rows[item.job_id] = row
+        if score_rows:
+            with self._cursor() as cur:
+                UserScorer.write(cur, list(score_rows.values()))
+            self.counts["scored"] += len(score_rows)
+        return batch
+
+    # -- driver -----------------------------------------------------------
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.time()
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in STAGES[1:]}
+        tasks = [
+            asyncio.create_task(self._fetch(queues["canonicalize"])),
+            asyncio.create_task(self._run_stage("canonicalize", queues["canonicalize"], queues["dedupe"], self._canonicalize)),
+            asyncio.create_task(self._run_stage("dedupe", queues["dedupe"], queues["persist"], self._dedupe)),
+            asyncio.create_task(self._run_stage("persist", queues["persist"], queues["score"], self._persist)),
+            asyncio.create_task(self._run_stage("score", queues["score"], None, self._score)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        elapsed = time.time() - started
+        stages = {name: self.stats[name].as_dict() for name in STAGES}
+        for name in STAGES:
+            s = self.stats[name]
+            print(f"[Pipeline][{self.source}] stage={name} in={s.items_in} out={s.items_out} batches={s.batches} errors={s.errors} busy={s.busy:.2f}s starved={s.starved:.2f}s blocked={s.blocked:.2f}s max_depth={s.max_depth}")
+        print(f"[Pipeline][{self.source}] Done in {elapsed:.2f}s: {self.counts}")
+        return {
+            **self.counts,
+            "job_ids": list(dict.fromkeys(self.job_ids)),
+            "newest_posted_at": self.newest_posted_at,
+            "elapsed": round(elapsed, 3),
+            "stages": stages,
+            "fetch_error": str(self.fetch_error) if self.fetch_error else None,
+        }
@@ -6,6 +6,7 @@ import re
 from typing import Dict, Any, Optional
 from datetime import datetime
 from connectors.base import RawJob
+from utils.locations import parse_location
 
 
 def normalize_title(title: str) -> str:
@@ -87,6 +88,9 @@ def canonicalize_job(raw: RawJob) -> Dict[str, Any]:
         else:
             remote_type = "onsite"
     
+    # Parsed once here so ranking compares indexed columns instead of re-parsing text
+    parsed_location = parse_location(raw.location)
+    
     return {
         "source": raw.source,
         "external_id": raw.external_id,
@@ -94,6 +98,13 @@ def canonicalize_job(raw: RawJob) -> Dict[str, Any]:
         "normalized_title": normalized_title,
         "company": normalized_company,
         "location": raw.location,
+        "city": parsed_location.city,
+        "region": parsed_location.region,
+        "country_code": parsed_location.country_code,
+        "geoname_id": parsed_location.geoname_id,
+        "latitude": parsed_location.latitude,
+        "longitude": parsed_location.longitude,
+        "geo_cell": parsed_location.geo_cell,
         # Preserve HTML descriptions - don't strip them, scoring needs the full text
         "description": raw.description if raw.description else None,
         "url": raw.url,
@@ -0,0 +1,143 @@
+"""
+Decayed popularity of canonical search queries (fed by /api/search-new, read by the scheduler).
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from utils.search_queue import canonical_fetch_query
+
+POPULARITY_HALF_LIFE_SECONDS = float(os.getenv("POPULARITY_HALF_LIFE_SECONDS", str(6 * 3600)))
+POPULARITY_MAX_QUERIES = int(os.getenv("POPULARITY_MAX_QUERIES", "2000"))
+
+_SCORES_KEY = "popularity:queries"
+_META_KEY = "popularity:meta"
+_LANDMARK_KEY = "popularity:landmark"
+
+# Forward decay: a hit at time t adds 2^((t - landmark) / half_life), so ordering by raw
+# score is ordering by decayed score. Scores are rebased before the weights get too large.
+_RECORD_SCRIPT = """
+local now = tonumber(ARGV[3])
+local half_life = tonumber(ARGV[4])
+local landmark = tonumber(redis.call('GET', KEYS[3]) or '')
+if not landmark then
+    landmark = now
+    redis.call('SET', KEYS[3], landmark)
+end
+if now - landmark > tonumber(ARGV[6]) then
+    local factor = 2 ^ (-(now - landmark) / half_life)
+    local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+    for i = 1, #entries, 2 do
+        redis.call('ZADD', KEYS[1], tonumber(entries[i + 1]) * factor, entries[i])
+    end
+    landmark = now
+    redis.call('SET', KEYS[3], landmark)
+end
+redis.call('ZINCRBY', KEYS[1], tonumber(ARGV[7]) * 2 ^ ((now - landmark) / half_life), ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+local extra = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[5])
+if extra > 0 then
+    local dropped = redis.call('ZRANGE', KEYS[1], 0, extra - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, extra - 1)
+    redis.call('HDEL', KEYS[2], unpack(dropped))
+end
+return 1
+"""
+
+
+def query_key(keywords: List[str], location: Optional[str] = None, remote_type: Optional[str] = None) -> str:
+    """Source-independent key of a canonical search query."""
+    canonical = canonical_fetch_query(keywords, location, remote_type)
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()[:20]
+
+
+class QueryPopularity:
+    """
+    Exponentially decayed hit counts per canonical query (one hit is worth half as
+    much after `half_life` seconds). Only the `max_queries` most popular queries
+    are kept.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        half_life: float = POPULARITY_HALF_LIFE_SECONDS,
+        max_queries: int = POPULARITY_MAX_QUERIES,
+    ):
+        self.redis = redis_client
+        self.half_life = max(1.0, half_life)
+        self.max_queries = max(1, max_queries)
+
+    def record(
+        self,
+        keywords: List[str],
+        location: Optional[str],
+        remote_type: Optional[str],
+        sources: List[str],
+        weight: float = 1.0,
+    ) -> None:
+        """Count one search for this query (sources it was run against are remembered)."""
+        canonical = canonical_fetch_query(keywords, location, remote_type)
+        if not canonical["keywords"]:
+            return
+        key = query_key(keywords, location, remote_type)
+        try:
+            previous = self._meta([key]).get(key) or {}
+            merged_sources = sorted({*(previous.get("sources") or []), *(str(s).lower() for s in sources or [])})
+            meta = {**canonical, "sources": merged_sources, "last_seen": time.time()}
+            self.redis.eval(
+                _RECORD_SCRIPT, 3, _SCORES_KEY, _META_KEY, _LANDMARK_KEY,
+                key, json.dumps(meta), time.time(), self.half_life,
+                self.max_queries, 40 * self.half_life, weight,
+            )
+        except Exception as e:
+            print(f"[Popularity] Failed to record query {canonical['keywords']}: {e}")
+
+    def _meta(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not keys:
+            return {}
+        out = {}
+        for key, raw in zip(keys, self.redis.hmget(_META_KEY, keys)):
+            if raw is None:
+                continue
+            try:
+                out[key] = json.loads(raw)
+            except Exception:
+                continue
+        return out
+
+    def top(self, limit: int, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Most popular queries (optionally only those searched on `source`), highest
+        first, each as {"key", "keywords", "location", "remote_type", "sources", "score"}
+        with `score` the decayed hit count as of now.
+        """
+        if limit <= 0:
+            return []
+        try:
+            landmark_raw = self.redis.get(_LANDMARK_KEY)
+            if landmark_raw is None:
+                return []
+            landmark = float(landmark_raw)
+            decay = 2 ** (-(time.time() - landmark) / self.half_life)
+            # Source filtering happens client-side, so scan a few times deeper than `limit`
+            scan = limit if source is None else limit * 4
+            entries = self.redis.zrevrange(_SCORES_KEY, 0, scan - 1, withscores=True)
+            keys = [k.decode() if isinstance(k, bytes) else k for k, _ in entries]
+            meta = self._meta(keys)
+        except Exception as e:
+            print(f"[Popularity] Failed to read top queries: {e}")
+            return []
+        hot = []
+        for key, (_, score) in zip(keys, entries):
+            info = meta.get(key)
+            if not info or (source and source.lower() not in (info.get("sources") or [])):
+                continue
+            hot.append({"key": key, **info, "score": score * decay})
+            if len(hot) >= limit:
+                break
+        return hot
@@ -3,15 +3,137 @@ Scheduler that enqueues periodic refresh tasks to Redis Streams.
 """
 import asyncio
 import json
+import math
+import os
+import random
+import socket
 import time
-from datetime import datetime, timedelta
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
 import redis
-from deps import get_redis_client, STREAM_FANOUT
+from deps import PRIORITY_LOW, get_redis_client
+from pipelines.popularity import QueryPopularity
+from pipelines.watermarks import WatermarkStore
+from pipelines.yield_stats import YieldStats, cadence_factor
+from utils.search_queue import publish_fetch_task
+
+# Hot queries refreshed per source, and the bounds on a single query's cadence (seconds)
+SCHEDULER_TOP_K = int(os.getenv("SCHEDULER_TOP_K", "10"))
+SCHEDULER_MIN_CADENCE = int(os.getenv("SCHEDULER_MIN_CADENCE", "120"))
+SCHEDULER_MAX_CADENCE = int(os.getenv("SCHEDULER_MAX_CADENCE", str(6 * 3600)))
+SCHEDULER_REFRESH_MAX_RESULTS = int(os.getenv("SCHEDULER_REFRESH_MAX_RESULTS", "50"))
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "60"))
+# +/- fraction applied to every interval so refreshes don't line up into bursts
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SCHEDULER_LEASE_TTL = int(os.getenv("SCHEDULER_LEASE_TTL", str(int(3 * SCHEDULER_TICK_SECONDS))))
+SCHEDULER_LEADER_KEY = "scheduler:leader"
+SCHEDULER_DUE_KEY = "scheduler:next_due"  # sorted set: "{source}:{query key}" -> next due time
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def query_cadence(base: float, score: float, top_score: float, yield_factor: float = 1.0) -> float:
+    """
+    Refresh interval for one hot query: the source's base cadence for the hottest
+    query, stretched by sqrt(top_score / score) for less popular ones, times the
+    yield multiplier (see yield_stats.cadence_factor).
+    """
+    popularity = math.sqrt(top_score / score) if score > 0 and top_score > 0 else SCHEDULER_MAX_CADENCE / base
+    return max(SCHEDULER_MIN_CADENCE, min(SCHEDULER_MAX_CADENCE, base * popularity * yield_factor))
+
+
+def _refresh_payload(source: str, hot: Dict[str, Any], since) -> Dict[str, Any]:
+    return {
+        "sources": [source],
+        "query": {
+            "keywords": hot["keywords"],
+            "location": hot["location"] or None,
+            "remote_type": hot["remote_type"] or None,
+            "max_results": SCHEDULER_REFRESH_MAX_RESULTS,
+        },
+        "user_id": None,  # shared refresh: stored jobs are scored when users search
+        "since": since.isoformat() if since else None,
+    }
+
+
+class LeaderLease:
+    """
+    Redis lease electing one active scheduler among replicas: taken with SET NX EX,
+    renewed (only by its owner) every tick, released on shutdown. A leader that
+    dies stops renewing and a standby takes over once the lease expires.
+    """
+
+    def __init__(self, redis_client: redis.Redis, key: str = SCHEDULER_LEADER_KEY, ttl: int = SCHEDULER_LEASE_TTL):
+        self.redis = redis_client
+        self.key = key
+        self.ttl = max(1, ttl)
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def hold(self) -> bool:
+        """Renew the lease if we own it, else try to take it. Returns True while we are leader."""
+        try:
+            if self.redis.eval(_RENEW_SCRIPT, 1, self.key, self.token, self.ttl):
+                return True
+            return bool(self.redis.set(self.key, self.token, nx=True, ex=self.ttl))
+        except Exception as e:
+            print(f"[Scheduler] Leader lease check failed: {e}")
+            return False
+
+    def release(self) -> None:
+        try:
+            self.redis.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception:
+            pass
+
+
+def _jittered(interval: float) -> float:
+    return interval * random.uniform(1 - SCHEDULER_JITTER, 1 + SCHEDULER_JITTER)
+
+
+def _run_due(redis_client: redis.Redis, candidates: List[Tuple[str, float, Callable[[], None]]], now: float) -> None:
+    """
+    Enqueue every candidate (member, interval, enqueue) whose next-due time in Redis has
+    passed and push it one jittered interval ahead. Unknown (or long overdue) members are
+    scheduled at a random point within their interval, so restarts, failovers and new
+    deployments spread out instead of refreshing everything at once.
+    """
+    if not candidates:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for member, _, _ in candidates:
+        pipe.zscore(SCHEDULER_DUE_KEY, member)
+    dues = pipe.execute()
+    updates = {}
+    for (member, interval, enqueue), due in zip(candidates, dues):
+        if due is None or due < now - interval:
+            # New, or overdue by a whole interval (no leader for a while): spread, don't burst
+            updates[member] = now + random.uniform(0, interval)
+        elif due - now > interval * (1 + SCHEDULER_JITTER):
+            updates[member] = now + _jittered(interval)  # cadence tightened since it was scheduled
+        elif due <= now:
+            enqueue()
+            updates[member] = now + _jittered(interval)
+    if updates:
+        redis_client.zadd(SCHEDULER_DUE_KEY, updates)
+    # Drop members that stopped being scheduled (no longer hot) long ago
+    redis_client.zremrangebyscore(SCHEDULER_DUE_KEY, "-inf", now - 2 * SCHEDULER_MAX_CADENCE)
 
 
 async def scheduler_loop(redis_client: redis.Redis):
-    """Scheduler loop that enqueues refresh tasks."""
-    # Per-source refresh cadence (seconds)
+    """Scheduler loop that enqueues refresh tasks (only on the replica holding the leader lease)."""
+    # Per-source refresh cadence (seconds) for its most popular query
     cadences = {
         "adzuna": 300,  # 5 min
         "jooble": 300,
@@ -19,45 +141,62 @@ async def scheduler_loop(redis_client: redis.Redis):
         "linkedin": 300,
         "iimjobs": 600,
     }
-    
-    last_enqueued = {}
-    
-    print("[Scheduler] Started")
-    
-    while True:
-        try:
-            now = time.time()
-            for source, cadence in cadences.items():
-                last = last_enqueued.get(source, 0)
-                if now - last >= cadence:
-                    # Get last seen timestamp
-                    last_seen_key = f"source:last_seen:{source}"
-                    last_seen_bytes = redis_client.get(last_seen_key)
-                    since = None
-                    if last_seen_bytes:
-                        try:
-                            since = datetime.fromisoformat(last_seen_bytes.decode())
-                        except:
-                            pass
-                    
-                    # Enqueue refresh task
-                    payload = {
-                        "sources": [source],
-                        "query": {
-                            "keywords": [],  # Will be filled by search queries
-                            "max_results": 50,
-                        },
-                        "since": since.isoformat() if since else None,
-                    }
-                    
-                    redis_client.xadd(STREAM_FANOUT, {"payload": json.dumps(payload)})
-                    last_enqueued[source] = now
-                    print(f"[Scheduler] Enqueued refresh for {source}")
-            
-            await asyncio.sleep(60)  # Check every minute
-        except Exception as e:
-            print(f"[Scheduler] Error: {e}")
-            await asyncio.sleep(60)
+
+    lease = LeaderLease(redis_client)
+    watermarks = WatermarkStore(redis_client)
+    popularity = QueryPopularity(redis_client)
+    yield_stats = YieldStats(redis_client)
+    leading = False
+
+    print(f"[Scheduler] Started as {lease.token} (top_k={SCHEDULER_TOP_K}, tick={SCHEDULER_TICK_SECONDS}s, lease_ttl={lease.ttl}s)")
+
+    try:
+        while True:
+            try:
+                is_leader = lease.hold()
+                if is_leader != leading:
+                    print(f"[Scheduler] {'Acquired' if is_leader else 'Lost'} leader lease")
+                    leading = is_leader
+                if not is_leader:
+                    await asyncio.sleep(_jittered(SCHEDULER_TICK_SECONDS))
+                    continue
+
+                now = time.time()
+                candidates = []
+                for source, cadence in cadences.items():
+                    hot_queries = popularity.top(SCHEDULER_TOP_K, source)
+                    # Back off sources whose refreshes only return duplicates, tighten when new jobs flow
+                    source_factor = cadence_factor(yield_stats.summary(source))
+                    if not hot_queries:
+                        # Nobody searched this source recently: keep its generic feed warm
+                        def enqueue_generic(source=source):
+                            since = watermarks.since(source, [])
+                            publish_fetch_task(redis_client, _refresh_payload(source, {"keywords": [], "location": "", "remote_type": ""}, since), priority=PRIORITY_LOW)
+                            print(f"[Scheduler] Enqueued generic refresh for {source} (since={since.isoformat() if since else 'full'})")
+                        candidates.append((f"{source}:*", min(SCHEDULER_MAX_CADENCE, cadence * source_factor), enqueue_generic))
+                        continue
+
+                    top_score = hot_queries[0]["score"]
+                    for hot in hot_queries:
+                        # A query's own yield once it has been refreshed, the source's until then
+                        query_stats = yield_stats.summary(source, hot["key"])
+                        factor = cadence_factor(query_stats) if query_stats["runs"] else source_factor
+                        interval = query_cadence(cadence, hot["score"], top_score, factor)
+
+                        def enqueue_hot(source=source, hot=hot, interval=interval):
+                            # Incremental refresh from this query's watermark (None = full fetch)
+                            since = watermarks.since(source, hot["keywords"], hot["location"], hot["remote_type"])
+                            publish_fetch_task(redis_client, _refresh_payload(source, hot, since), priority=PRIORITY_LOW)
+                            print(f"[Scheduler] Enqueued refresh for {source} keywords={hot['keywords']} loc='{hot['location']}' score={hot['score']:.2f} every {interval:.0f}s (since={since.isoformat() if since else 'full'})")
+                        candidates.append((f"{source}:{hot['key']}", interval, enqueue_hot))
+
+                _run_due(redis_client, candidates, now)
+                await asyncio.sleep(_jittered(SCHEDULER_TICK_SECONDS))
+            except Exception as e:
+                print(f"[Scheduler] Error: {e}")
+                await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+    finally:
+        lease.release()
 
 
 if __name__ == "__main__":
@@ -65,6 +204,5 @@ if __name__ == "__main__":
     if not redis_client:
         print("[Scheduler] Missing Redis config")
         exit(1)
-    
-    asyncio.run(scheduler_loop(redis_client))
 
+    asyncio.run(scheduler_loop(redis_client))
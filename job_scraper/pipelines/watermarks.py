@@ -0,0 +1,99 @@
+"""
+Fetch watermarks: newest posted_at seen per (source, canonical query), kept in Redis.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import redis
+
+from connectors.base import to_utc
+from utils.search_queue import fetch_key
+
+# Re-fetch this far behind the watermark: sources index late and some dates are day-granular
+WATERMARK_OVERLAP_SECONDS = int(os.getenv("WATERMARK_OVERLAP_SECONDS", str(6 * 3600)))
+# Watermarks of queries nobody refreshes any more fall out on their own
+WATERMARK_TTL_SECONDS = int(os.getenv("WATERMARK_TTL_SECONDS", str(30 * 24 * 3600)))
+# Dates further in the future than this are treated as parse errors and ignored
+_MAX_CLOCK_SKEW_SECONDS = 3600
+
+# Only ever move a watermark forward (concurrent fetches of the same query may finish out of order)
+_ADVANCE_SCRIPT = """
+local advanced = 0
+for i, key in ipairs(KEYS) do
+    local current = tonumber(redis.call('GET', key) or '0')
+    if tonumber(ARGV[1]) > current then
+        redis.call('SET', key, ARGV[1])
+        advanced = 1
+    end
+    redis.call('EXPIRE', key, ARGV[2])
+end
+return advanced
+"""
+
+
+class WatermarkStore:
+    """
+    Per (source, canonical query) high-water mark of job posting times. The worker
+    advances it after each successful fetch; incremental fetches pass it to the
+    connector as `since` (minus an overlap), so newest-first pagination stops as
+    soon as results are older. `source:last_seen:{source}` tracks the source-wide max.
+    """
+
+    def __init__(self, redis_client: redis.Redis, overlap: int = WATERMARK_OVERLAP_SECONDS, ttl: int = WATERMARK_TTL_SECONDS):
+        self.redis = redis_client
+        self.overlap = overlap
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(source: str, keywords: List[str], location: Optional[str], remote_type: Optional[str]) -> str:
+        return f"watermark:{fetch_key(source, keywords, location, remote_type)}"
+
+    @staticmethod
+    def _parse(raw) -> Optional[float]:
+        if raw is None:
+            return None
+        try:
+            return float(raw.decode() if isinstance(raw, bytes) else raw)
+        except (TypeError, ValueError):
+            return None
+
+    def newest(self, source: str, keywords: List[str], location: Optional[str] = None, remote_type: Optional[str] = None) -> Optional[datetime]:
+        """Newest posted_at recorded for this query (no overlap applied)."""
+        try:
+            value = self._parse(self.redis.get(self._key(source, keywords, location, remote_type)))
+        except Exception as e:
+            print(f"[Watermark] Read failed for {source}: {e}")
+            return None
+        return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+    def since(self, source: str, keywords: List[str], location: Optional[str] = None, remote_type: Optional[str] = None) -> Optional[datetime]:
+        """`since` to fetch this query with: the watermark minus the overlap, or None for a full fetch."""
+        newest = self.newest(source, keywords, location, remote_type)
+        if newest is None:
+            return None
+        return datetime.fromtimestamp(newest.timestamp() - self.overlap, tz=timezone.utc)
+
+    def advance(self, source: str, keywords: List[str], location: Optional[str], remote_type: Optional[str], posted_at: Optional[datetime]) -> bool:
+        """Move the query's (and the source's) watermark up to `posted_at`; returns True if it moved."""
+        if posted_at is None:
+            return False
+        ts = to_utc(posted_at).timestamp()
+        if ts > time.time() + _MAX_CLOCK_SKEW_SECONDS:
+            print(f"[Watermark] Ignoring future posted_at {posted_at} for {source}")
+            return False
+        keys = [self._key(source, keywords, location, remote_type), f"source:last_seen:{source}"]
+        try:
+            return bool(self.redis.eval(_ADVANCE_SCRIPT, len(keys), *keys, ts, self.ttl))
+        except Exception as e:
+            print(f"[Watermark] Advance failed for {source}: {e}")
+            return False
+
+    def last_seen(self, source: str) -> Optional[datetime]:
+        """Newest posted_at recorded for any query of this source."""
+        try:
+            value = self._parse(self.redis.get(f"source:last_seen:{source}"))
+        except Exception:
+            return None
+        return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
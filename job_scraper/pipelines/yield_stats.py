@@ -0,0 +1,118 @@
+"""
+Time-bucketed refresh yield per source and per (source, query): new vs duplicate jobs and fetch cost.
+"""
+import os
+import time
+from typing import Dict, Optional
+
+import redis
+
+YIELD_BUCKET_SECONDS = int(os.getenv("YIELD_BUCKET_SECONDS", "3600"))
+YIELD_WINDOW_BUCKETS = int(os.getenv("YIELD_WINDOW_BUCKETS", "24"))
+# Cadence multiplier bounds: x2 per consecutive duplicate-only refresh up to the max,
+# down to the min when nearly everything fetched is new
+YIELD_MAX_BACKOFF = float(os.getenv("YIELD_MAX_BACKOFF", "16"))
+YIELD_MIN_FACTOR = float(os.getenv("YIELD_MIN_FACTOR", "0.5"))
+
+_BUCKET_KEY = "yield:{scope}:{bucket}"
+_STREAK_KEY = "yield:streak:{scope}"
+_FIELDS = ("runs", "fetched", "new", "duplicates", "seconds", "tokens")
+
+
+def _scope(source: str, query_key: Optional[str] = None) -> str:
+    return f"source:{source}" if query_key is None else f"query:{source}:{query_key}"
+
+
+class YieldStats:
+    """
+    Refresh outcomes summed into `bucket_seconds` buckets (kept for the window plus
+    one bucket), together with the current streak of refreshes that found no new
+    job. The scheduler turns a summary into a cadence multiplier.
+    """
+
+    def __init__(self, redis_client: redis.Redis, bucket_seconds: int = YIELD_BUCKET_SECONDS, window_buckets: int = YIELD_WINDOW_BUCKETS):
+        self.redis = redis_client
+        self.bucket_seconds = max(60, bucket_seconds)
+        self.window_buckets = max(1, window_buckets)
+
+    def _bucket(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // self.bucket_seconds)
+
+    def record(
+        self,
+        source: str,
+        query_key: Optional[str],
+        fetched: int,
+        new: int,
+        duplicates: int,
+        seconds: float,
+        tokens: int = 1,
+    ) -> None:
+        """Add one completed refresh to the source's and the query's current bucket."""
+        bucket = self._bucket()
+        ttl = self.bucket_seconds * (self.window_buckets + 1)
+        values = {"runs": 1, "fetched": fetched, "new": new, "duplicates": duplicates, "tokens": tokens}
+        scopes = [_scope(source)] + ([_scope(source, query_key)] if query_key else [])
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for scope in scopes:
+                key = _BUCKET_KEY.format(scope=scope, bucket=bucket)
+                for field, value in values.items():
+                    pipe.hincrby(key, field, int(value or 0))
+                pipe.hincrbyfloat(key, "seconds", round(seconds, 3))
+                pipe.expire(key, ttl)
+                streak = _STREAK_KEY.format(scope=scope)
+                if new > 0:
+                    pipe.delete(streak)
+                else:
+                    pipe.incr(streak)
+                    pipe.expire(streak, ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"[YieldStats] Failed to record refresh for {source}: {e}")
+
+    def summary(self, source: str, query_key: Optional[str] = None) -> Dict[str, float]:
+        """Totals over the window plus derived rates and the duplicate-only streak."""
+        scope = _scope(source, query_key)
+        current = self._bucket()
+        totals = {field: 0.0 for field in _FIELDS}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for bucket in range(current - self.window_buckets + 1, current + 1):
+                pipe.hgetall(_BUCKET_KEY.format(scope=scope, bucket=bucket))
+            pipe.get(_STREAK_KEY.format(scope=scope))
+            *buckets, streak = pipe.execute()
+        except Exception as e:
+            print(f"[YieldStats] Failed to read stats for {scope}: {e}")
+            buckets, streak = [], None
+        for raw in buckets:
+            for k, v in (raw or {}).items():
+                k = k.decode() if isinstance(k, bytes) else k
+                if k in totals:
+                    try:
+                        totals[k] += float(v)
+                    except (TypeError, ValueError):
+                        continue
+        seen = totals["new"] + totals["duplicates"]
+        return {
+            **{k: round(v, 3) for k, v in totals.items()},
+            "new_ratio": round(totals["new"] / seen, 3) if seen else None,
+            "new_per_second": round(totals["new"] / totals["seconds"], 3) if totals["seconds"] else None,
+            "new_per_token": round(totals["new"] / totals["tokens"], 3) if totals["tokens"] else None,
+            "empty_streak": int(streak) if streak is not None else 0,
+        }
+
+
+def cadence_factor(summary: Dict[str, float]) -> float:
+    """
+    Multiplier for a refresh cadence: doubles with every consecutive refresh that
+    found only duplicates (capped at YIELD_MAX_BACKOFF); otherwise shrinks towards
+    YIELD_MIN_FACTOR as the share of new jobs in the window grows. 1.0 without data.
+    """
+    streak = int(summary.get("empty_streak") or 0)
+    if streak > 0:
+        return min(YIELD_MAX_BACKOFF, 2.0 ** streak)
+    new_ratio = summary.get("new_ratio")
+    if new_ratio is None:
+        return 1.0
+    return max(YIELD_MIN_FACTOR, 1.0 - (1.0 - YIELD_MIN_FACTOR) * new_ratio * 2)
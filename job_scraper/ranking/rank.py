@@ -2,171 +2,18 @@
 Hybrid ranking for job search results.
 """
 import psycopg2
-import re
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
-# Optional import: geonames-backed city alias resolver
-try:
-    from utils.geonames import get_city_aliases
-    _GEONAMES_AVAILABLE = True
-except Exception:
-    try:
-        from job_scraper.utils.geonames import get_city_aliases
-        _GEONAMES_AVAILABLE = True
-    except Exception:
-        _GEONAMES_AVAILABLE = False
-        def get_city_aliases(city: str, country: Optional[str] = None):
-            return set()
-
-
-def _extract_city_from_location(location: str) -> str:
-    """Extract the primary city name from a location string."""
-    if not location:
-        return ""
-    
-    location_lower = location.strip().lower()
-    
-    # First, try splitting by commas/semicolons
-    parts = [p.strip() for p in re.split(r'[,;|]', location_lower)]
-    if parts and parts[0]:
-        city_part = parts[0]
-    else:
-        city_part = location_lower
-    
-    # Split by spaces to get individual words
-    words = city_part.split()
-    if not words:
-        return ""
-    
-    # Words to skip (administrative divisions, suffixes, states, countries)
-    skip_words = {
-        'urban', 'metro', 'city', 'district', 'region', 'area', 'zone',
-        'karnataka', 'maharashtra', 'tamil', 'nadu', 'gujarat',
-        'rajasthan', 'punjab', 'haryana', 'uttar', 'pradesh', 'west', 'bengal',
-        'telangana', 'andhra', 'kerala', 'odisha', 'bihar',
-        'india', 'in', 'usa', 'us', 'united', 'states', 'uk', 'kingdom',
-        'ca', 'california', 'tx', 'texas', 'fl', 'florida', 'ny'
-    }
-    
-    # Extract city name: take words until we hit a skip word
-    city_words = []
-    i = 0
-    while i < len(words) and len(city_words) < 3:
-        word = words[i]
-        if word in skip_words:
-            break
-        if city_words and word == city_words[0]:
-            break
-        city_words.append(word)
-        i += 1
-    
-    if not city_words:
-        city_words = [words[0]] if words else []
-    
-    city = ' '.join(city_words).strip()
-    city = re.sub(r'\s+(urban|metro|city|district)$', '', city, flags=re.IGNORECASE)
-    return city.strip()
-
-
-def _city_matches_with_aliases(job_location: str, user_city: str, user_city_aliases: Optional[set] = None) -> bool:
-    """Check if job location matches user city, considering aliases.
-    
-    Args:
-        job_location: Job's location string
-        user_city: User's city name
-        user_city_aliases: Pre-computed set of user city aliases (for efficiency)
-    """
-    if not job_location or not user_city:
-        return False
-    
-    job_location_lower = job_location.lower()
-    
-    # Use pre-computed aliases if provided (more efficient)
-    if user_city_aliases:
-        # Check if any user city alias appears in job location
-        for alias in user_city_aliases:
-            if alias and alias.lower() in job_location_lower:
-                return True
-        return False
-    
-    # Fallback: simple string match
-    user_city_lower = user_city.lower()
-    return user_city_lower in job_location_lower
-
-
-def get_country_variants(country_str):
-    """Returns a set of country name and code variants for matching."""
-    if not country_str:
-        return set()
-    
-    country_lower = country_str.strip().lower()
-    variants = {country_lower}
-    
-    # Country name to code mapping
-    country_to_code = {
-        'india': 'in',
-        'united states': 'us',
-        'usa': 'us',
-        'united kingdom': 'gb',
-        'uk': 'gb',
-        'canada': 'ca',
-        'australia': 'au',
-        'germany': 'de',
-        'france': 'fr',
-        'spain': 'es',
-        'italy': 'it',
-        'netherlands': 'nl',
-        'belgium': 'be',
-        'switzerland': 'ch',
-        'austria': 'at',
-        'sweden': 'se',
-        'norway': 'no',
-        'denmark': 'dk',
-        'finland': 'fi',
-        'poland': 'pl',
-        'portugal': 'pt',
-        'greece': 'gr',
-        'ireland': 'ie',
-        'japan': 'jp',
-        'china': 'cn',
-        'south korea': 'kr',
-        'singapore': 'sg',
-        'malaysia': 'my',
-        'thailand': 'th',
-        'indonesia': 'id',
-        'philippines': 'ph',
-        'vietnam': 'vn',
-        'brazil': 'br',
-        'mexico': 'mx',
-        'argentina': 'ar',
-        'chile': 'cl',
-        'colombia': 'co',
-        'south africa': 'za',
-        'egypt': 'eg',
-        'uae': 'ae',
-        'united arab emirates': 'ae',
-        'saudi arabia': 'sa',
-        'israel': 'il',
-        'turkey': 'tr',
-        'russia': 'ru',
-        'new zealand': 'nz',
-    }
-    
-    # Code to country name mapping
-    code_to_country = {v: k for k, v in country_to_code.items()}
-    
-    # If it's a 2-letter code, add the country name
-    if len(country_lower) == 2 and country_lower.isalpha():
-        variants.add(country_lower)
-        if country_lower in code_to_country:
-            variants.add(code_to_country[country_lower])
-    
-    # If it's a country name, add the code
-    if country_lower in country_to_code:
-        variants.add(country_to_code[country_lower])
-    
-    return variants
+from utils.geo import distance_sql, within_sql
+from utils.locations import (
+    TIER_NAMES,
+    distance_km,
+    location_boost,
+    location_tier,
+    location_tier_sql,
+    resolve_user_location,
+)
 
 
 def rank_jobs(
@@ -181,6 +28,7 @@ def rank_jobs(
     user_location_city: Optional[str] = None,  # User's city for tiered location matching
     user_location_country: Optional[str] = None,  # User's country for tiered location matching
     user_id: Optional[str] = None,  # Current user for per-user score ordering
+    within_km: Optional[float] = None,  # Only jobs this close to the user's city (needs coordinates)
 ) -> List[Dict[str, Any]]:
     """
     Rank jobs using hybrid FTS + boosts.
@@ -219,6 +67,32 @@ def rank_jobs(
         if query_keywords:
             user_id = None
         
+        # Location tier computed in SQL from the canonical columns (sql/005_job_locations.sql)
+        user_location = None
+        location_select = ""
+        location_params: List[Any] = []
+        if user_location_city or user_location_country:
+            user_location = resolve_user_location(user_location_city, user_location_country)
+            tier_sql, location_params = location_tier_sql(user_location)
+            location_select = f", {tier_sql} AS _location_tier"
+            if user_location.latitude is not None and user_location.longitude is not None:
+                # Distance from the searcher's city (sql/006_job_coordinates.sql)
+                dist_sql, dist_params = distance_sql(user_location.latitude, user_location.longitude)
+                location_select += f", {dist_sql} AS _distance_km"
+                location_params = location_params + dist_params
+            print(f"[Rank] User location: city={user_location.city}, country={user_location.country_code}, "
+                  f"geoname_id={user_location.geoname_id}, {len(user_location.city_names)} city names, "
+                  f"coordinates={user_location.latitude},{user_location.longitude}")
+
+        # Radius filter (applied to every query below): geo_cell index prefilter, then haversine
+        radius_sql = ""
+        radius_params: List[Any] = []
+        if within_km:
+            if user_location is not None and user_location.latitude is not None and user_location.longitude is not None:
+                radius_sql, radius_params = within_sql(user_location.latitude, user_location.longitude, float(within_km))
+            else:
+                print(f"[Rank] within_km={within_km} ignored: no coordinates for the user's city")
+
         # Short-circuit path: If user_id is provided (and not disabled above), prioritize jobs already scored for this user.
         # Fetch directly from user_job_scores ordered by last_match_score, and join job details.
         # This guarantees the highest user-specific scores show first.
@@ -226,14 +100,15 @@ def rank_jobs(
             try:
                 # First, check total count to ensure we have enough jobs for this offset
                 cur.execute(
-                    """
+                    f"""
                     SELECT COUNT(*)
                     FROM user_job_scores ujs
                     JOIN jobs j ON j.id::text = ujs.job_id
                     WHERE ujs.user_id = %s
                       AND (j.is_active IS NULL OR j.is_active = TRUE)
+                      {f"AND {radius_sql}" if radius_sql else ""}
                     """,
-                    (user_id,),
+                    [user_id] + radius_params,
                 )
                 total_count = cur.fetchone()[0]
                 print(f"[Rank] User-first query: user_id={user_id}, limit={limit}, offset={offset}, total_available={total_count}")
@@ -243,16 +118,17 @@ def rank_jobs(
                     return []
                 
                 cur.execute(
-                    """
+                    f"""
                     SELECT j.*, ujs.last_match_score AS _user_score
                     FROM user_job_scores ujs
                     JOIN jobs j ON j.id::text = ujs.job_id
                     WHERE ujs.user_id = %s
                       AND (j.is_active IS NULL OR j.is_active = TRUE)
+                      {f"AND {radius_sql}" if radius_sql else ""}
                     ORDER BY ujs.last_match_score DESC NULLS LAST, j.posted_at DESC NULLS LAST, j.id ASC
                     LIMIT %s OFFSET %s
                     """,
-                    (user_id, limit, offset),
+                    [user_id] + radius_params + [limit, offset],
                 )
                 direct_cols = [d[0] for d in cur.description]
                 direct_rows = [dict(zip(direct_cols, r)) for r in cur.fetchall()]
@@ -292,6 +168,7 @@ def rank_jobs(
                 {fts_func}('english', %s)
             ) * 0.5
             ) AS score
+            {location_select}
             {user_score_select}
         FROM jobs j
         {user_score_join}
@@ -305,9 +182,11 @@ def rank_jobs(
         # IMPORTANT: Parameter order must match placeholder order in SQL
         # Order of placeholders:
         # 1-2: score calculation (title+desc and desc only) - 2 placeholders
+        # then (if present) the location tier CASE and distance
         # then (if present) JOIN user_job_scores ... %s (user_id)
         # 3: WHERE ts_query - 1 placeholder
         params = [ts_query_param, ts_query_param]  # 2 params for SELECT score calculation
+        params.extend(location_params)
         if user_score_params:
             params.extend(user_score_params)  # user_id for JOIN
         params.append(ts_query_param)  # WHERE ts_query
@@ -336,6 +215,9 @@ def rank_jobs(
             # Handle NULL experience bounds in data
             filters.append("((j.experience_min IS NULL OR j.experience_min <= %s) AND (j.experience_max IS NULL OR j.experience_max >= %s))")
             params.extend([max_exp, min_exp])
+        if radius_sql:
+            filters.append(radius_sql)
+            params.extend(radius_params)
 
         # Hard filter: only fetch rows whose titles exactly match one of the keyword phrases (case-insensitive).
         # This completely blocks unrelated domains like "Director Growth Monetization" when searching engineering titles.
@@ -354,10 +236,11 @@ def rank_jobs(
         if filters:
             base_query += " AND " + " AND ".join(filters)
         
-        # Simple ORDER BY: FTS score, then posted date, then id for uniqueness
-        order_by_parts = [
-            "score DESC",  # FTS relevance score (primary sort)
-        ]
+        # ORDER BY: location tier (when the user has a location), FTS score, then posted date, then id for uniqueness
+        order_by_parts = []
+        if location_select:
+            order_by_parts.append("_location_tier DESC")  # exact > city > country > other, before paging
+        order_by_parts.append("score DESC")  # FTS relevance score
         if user_id:
             order_by_parts.append("ujs.last_match_score DESC NULLS LAST")
         order_by_parts.extend([
@@ -436,124 +319,24 @@ def rank_jobs(
         jobs = [dict(zip(columns, row)) for row in cur.fetchall()]
         
         
-        # Helper function to check if country variant matches in job location
-        def country_matches(job_location: str, country_variants: set) -> bool:
-            """Check if any country variant (name or code) appears in job location."""
-            if not country_variants or not job_location:
-                return False
-            
-            # Normalize job location: split by comma and check each part
-            location_parts = [part.strip().lower() for part in job_location.split(',')]
-            job_location_lower = job_location.lower()
-            
-            for variant in country_variants:
-                variant_lower = variant.lower().strip()
-                
-                # For country codes (2 letters), check if it appears as the last part
-                # or as a standalone word in any part
-                if len(variant_lower) == 2:
-                    # Check if code appears as the last part (most common case: "City, Country Code")
-                    if location_parts and location_parts[-1].strip() == variant_lower:
-                        return True
-                    # Check if code appears as a standalone word in any part (word boundary)
-                    for part in location_parts:
-                        part_clean = part.strip()
-                        if part_clean == variant_lower:
-                            return True
-                        # Use word boundary to match standalone country codes
-                        if re.search(r'\b' + re.escape(variant_lower) + r'\b', part_clean):
-                            return True
-                    # Also check the full location string with word boundaries
-                    if re.search(r'\b' + re.escape(variant_lower) + r'\b', job_location_lower):
-                        return True
-                else:
-                    # For country names, check if it appears in any part or anywhere in the location
-                    for part in location_parts:
-                        part_clean = part.strip()
-                        if variant_lower in part_clean:
-                            return True
-                    # Also check the full location string for partial matches
-                    if variant_lower in job_location_lower:
-                        return True
-            
-            return False
-        
         # Add location_tier to each job for frontend grouping
         # Also boost match scores based on location tier to ensure location-matched jobs appear first
         # Only add tier when user_location is provided (for "Any" searches)
-        if user_location_city or user_location_country:
-            # Get country variants (name and code) for matching
-            country_variants = get_country_variants(user_location_country) if user_location_country else set()
-            
-            # Location tier boost multipliers (higher = better location match)
-            tier_boost = {
-                'exact': 1.3,    # 30% boost for exact location match
-                'city': 1.2,     # 20% boost for city match
-                'country': 1.1,  # 10% boost for country match
-                'other': 1.0,    # No boost for other locations
-            }
-            
-            # Debug logging
-            if country_variants:
-                print(f"[Rank] Country variants for matching: {country_variants}")
-            
-            # Fetch user city aliases once (for efficiency)
-            user_city_aliases = None
-            if user_location_city and _GEONAMES_AVAILABLE:
-                try:
-                    user_city_lower = user_location_city.lower()
-                    user_city_aliases = {user_city_lower} | set(get_city_aliases(user_city_lower))
-                    print(f"[Rank] ✅ Fetched {len(user_city_aliases)} aliases for user city '{user_location_city}': {sorted(list(user_city_aliases))[:10]}")
-                except Exception as e:
-                    print(f"[Rank] ⚠️  Failed to fetch city aliases: {e}")
-                    user_city_aliases = {user_location_city.lower()}
-            elif user_location_city:
-                user_city_aliases = {user_location_city.lower()}
-            
+        if user_location is not None:
             for job in jobs:
-                job_location_raw = job.get('location') or ''
-                job_location = job_location_raw.lower()
-                
-                # Determine location tier
-                if user_location_city and user_location_country:
-                    # Check for exact match (city + country/code) using aliases
-                    city_match = _city_matches_with_aliases(job_location_raw, user_location_city, user_city_aliases)
-                    country_match = country_matches(job_location, country_variants)
-                    
-                    if city_match and country_match:
-                        job['location_tier'] = 'exact'  # Exact match (city + country)
-                    elif city_match:
-                        job['location_tier'] = 'city'  # City match (including aliases)
-                    elif country_match:
-                        job['location_tier'] = 'country'  # Country match
-                    else:
-                        job['location_tier'] = 'other'  # Rest of world
-                elif user_location_city:
-                    # Check city match using aliases
-                    if _city_matches_with_aliases(job_location_raw, user_location_city, user_city_aliases):
-                        job['location_tier'] = 'city'
-                    else:
-                        job['location_tier'] = 'other'
-                elif user_location_country:
-                    # Check if any country variant (name or code) matches
-                    country_match = country_matches(job_location, country_variants)
-                    if country_match:
-                        job['location_tier'] = 'country'
-                        # Debug logging
-                        if len([j for j in jobs if j.get('location')]) <= 3:
-                            print(f"[Rank] ✅ Matched country for job: '{job_location_raw}' -> tier: country")
-                    else:
-                        job['location_tier'] = 'other'
-                        # Debug logging
-                        if len([j for j in jobs if j.get('location')]) <= 3:
-                            print(f"[Rank] ❌ No country match for job: '{job_location_raw}' -> tier: other")
-                else:
-                    job['location_tier'] = None
+                tier = job.pop('_location_tier', None)
+                distance = job.pop('_distance_km', None)
+                if job.get('city') is None and job.get('country_code') is None:
+                    # Row stored before canonical columns existed: parse its location text (cached)
+                    distance = distance_km(user_location, job)
+                    tier = location_tier(user_location, job, distance)
+                job['location_tier'] = TIER_NAMES[tier or 0]
+                if distance is not None:
+                    job['distance_km'] = round(float(distance), 1)
                 
-                # Boost match score based on location tier
-                # This ensures location-matched jobs rank higher across all pages
-                location_tier = job.get('location_tier', 'other')
-                boost_multiplier = tier_boost.get(location_tier, 1.0)
+                # Boost match score based on location tier, or distance decay when closer
+                # (page order already follows the tier: see ORDER BY above)
+                boost_multiplier = location_boost(user_location, job, tier or 0, distance)
                 
                 # Get current score (from last_match_score or compute)
                 current_score = job.get('last_match_score')
@@ -620,6 +403,9 @@ def rank_jobs(
                     min_exp, max_exp = exp_ranges.get(experience_level, (0, 999))
                     ilike_filters.append("((j.experience_min IS NULL OR j.experience_min <= %s) AND (j.experience_max IS NULL OR j.experience_max >= %s))")
                     ilike_params.extend([max_exp, min_exp])
+                if radius_sql:
+                    ilike_filters.append(radius_sql)
+                    ilike_params.extend(radius_params)
                 
                 if ilike_filters:
                     ilike_query += " AND " + " AND ".join(ilike_filters)
@@ -661,6 +447,7 @@ def rank_jobs(
                 WHERE (j.is_active IS NULL OR j.is_active = TRUE)
                   AND j.source_id = li.id
                   AND to_tsvector('english', coalesce(j.title,'') || ' ' || coalesce(j.description,'')) @@ {fts_func}('english', %s)
+                  {"AND " + radius_sql if radius_sql else ""}
                   {"AND j.id NOT IN (" + ",".join(["%s"] * len(existing_ids)) + ")" if existing_ids else ""}
                 ORDER BY COALESCE(j.last_match_score, 0.1) DESC, j.posted_at DESC NULLS LAST, j.id ASC
                 LIMIT %s OFFSET 0
@@ -668,6 +455,7 @@ def rank_jobs(
                 supp_params: List[Any] = []  # type: ignore
                 supp_params.append(ts_query_param if ts_query_param else '')
                 # Removed location params - we're not filtering by location, just ranking
+                supp_params.extend(radius_params)
                 if existing_ids:
                     supp_params.extend(list(existing_ids))
                 supp_params.append(remaining)
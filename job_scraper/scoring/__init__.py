@@ -1,6 +1,6 @@
 """Scoring utilities for job matching."""
 
 from .unified import compute_unified_score  # noqa: F401
+from .memo import memoized_unified_score, profile_signature  # noqa: F401
 
-__all__ = ["compute_unified_score"]
-
+__all__ = ["compute_unified_score", "memoized_unified_score", "profile_signature"]
@@ -0,0 +1,269 @@
+"""
+Content-addressed memo for unified scores, shared by the worker and the API.
+
+Scores are keyed by (job content hash, profile signature) so the same posting
+scored for the same search profile is computed once, no matter which process
+or source produced it. A small in-process LRU sits in front of Redis.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from .unified import compute_unified_score
+
+_LOCAL_MAX_ENTRIES = 4096
+# Recency is scored against now, so keys include the current TTL-sized time bucket:
+# a memoized score is never reused across buckets (at most 6h of job ageing)
+_MEMO_TTL_SECONDS = 60 * 60 * 6
+_LOCK_TTL_MS = 2000
+_LOCK_WAIT_ATTEMPTS = 5
+_LOCK_WAIT_SECONDS = 0.02
+# Request handlers wait for another process's result at most this many times (one short sleep)
+REQUEST_LOCK_WAIT_ATTEMPTS = 1
+_KEY_PREFIX = "score:memo:"
+
+_LOCAL: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+_LOCAL_LOCK = threading.Lock()
+_REDIS = None
+
+
+def _get_redis():
+    """Lazily create one Redis client per process (None if Redis is unavailable)."""
+    global _REDIS
+    if _REDIS is None:
+        try:
+            from deps import get_redis_client
+            _REDIS = get_redis_client() or False
+        except Exception:
+            _REDIS = False
+    return _REDIS or None
+
+
+def _norm_list(values: Optional[Iterable[str]]) -> list:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    return sorted({str(v).strip().lower() for v in values if v and str(v).strip()})
+
+
+def profile_signature(
+    *,
+    keywords: Iterable[str],
+    skills: Iterable[str],
+    location: Optional[str] = None,
+    experience_level: Optional[str] = None,
+    remote_preference: Optional[str] = None,
+    search_location_aliases: Optional[set] = None,
+) -> str:
+    """Stable signature of every scoring input that is not part of the job itself."""
+    source = {
+        'keywords': _norm_list(keywords),
+        'skills': _norm_list(skills),
+        'location': (location or '').strip().lower(),
+        'experience_level': (experience_level or '').strip().lower(),
+        'remote_preference': (remote_preference or '').strip().lower(),
+        'aliases': _norm_list(search_location_aliases),
+    }
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _hash_hex(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex() if value else None
+    value = str(value).strip()
+    if value.startswith('\\x'):
+        value = value[2:]
+    return value or None
+
+
+def _day(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)[:10] if value else ''
+
+
+def content_key(job: Dict[str, Any]) -> str:
+    """
+    Content address of a job for scoring purposes.
+    Uses the canonical `hash` (title|company|location|description) when present and
+    folds in the remaining fields the scorer reads, so identical postings from
+    different sources share a key while edited descriptions do not.
+    """
+    description = job.get('description') or ''
+    base = _hash_hex(job.get('hash'))
+    if not base:
+        base_src = "|".join([
+            str(job.get('title') or '').lower().strip(),
+            str(job.get('company') or job.get('company_name') or '').lower().strip(),
+            str(job.get('location') or '').lower().strip(),
+            description[:1000].lower().strip(),
+        ])
+        base = hashlib.sha1(base_src.encode()).hexdigest()
+    skills = job.get('skills') or job.get('skills_required') or []
+    extra = "|".join([
+        str(len(description)),
+        ",".join(_norm_list(skills)),
+        str(job.get('experience_min') or ''),
+        str(job.get('experience_max') or ''),
+        _day(job.get('posted_at')),
+        '' if job.get('posted_at') else _day(job.get('scraped_at')),
+    ])
+    return hashlib.sha1(f"{base}|{extra}".encode()).hexdigest()
+
+
+def _memo_key(job: Dict[str, Any], signature: str) -> str:
+    bucket = int(time.time() // _MEMO_TTL_SECONDS)
+    digest = hashlib.sha1(f"{content_key(job)}:{signature}:{bucket}".encode()).hexdigest()[:24]
+    return f"{_KEY_PREFIX}{digest}"
+
+
+def _pack(result: Dict[str, Any]) -> bytes:
+    """Compact Redis encoding: short keys, rounded floats, no whitespace."""
+    comps = result.get('components') or {}
+    details = result.get('details') or {}
+    packed = {
+        's': result.get('score', 0.0),
+        'c': {k: round(float(v), 4) for k, v in comps.items()},
+        'm': details.get('matched_skills', []),
+        'x': details.get('missing_skills', []),
+        'k': details.get('keyword_hits', {}),
+    }
+    return json.dumps(packed, separators=(',', ':')).encode()
+
+
+def _unpack(raw: Any) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    try:
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode()
+        data = json.loads(raw)
+        return {
+            'score': data.get('s', 0.0),
+            'components': data.get('c', {}),
+            'details': {
+                'matched_skills': data.get('m', []),
+                'missing_skills': data.get('x', []),
+                'keyword_hits': data.get('k', {}),
+            },
+        }
+    except Exception:
+        return None
+
+
+def _copy(result: Dict[str, Any]) -> Dict[str, Any]:
+    details = result.get('details') or {}
+    return {
+        'score': result.get('score', 0.0),
+        'components': dict(result.get('components') or {}),
+        'details': {
+            'matched_skills': list(details.get('matched_skills') or []),
+            'missing_skills': list(details.get('missing_skills') or []),
+            'keyword_hits': dict(details.get('keyword_hits') or {}),
+        },
+    }
+
+
+def _local_get(key: str) -> Optional[Dict[str, Any]]:
+    with _LOCAL_LOCK:
+        entry = _LOCAL.get(key)
+        if not entry:
+            return None
+        expires_at, result = entry
+        if expires_at < time.time():
+            _LOCAL.pop(key, None)
+            return None
+        _LOCAL.move_to_end(key)
+        return result
+
+
+def _local_put(key: str, result: Dict[str, Any]) -> None:
+    with _LOCAL_LOCK:
+        _LOCAL[key] = (time.time() + _MEMO_TTL_SECONDS, result)
+        _LOCAL.move_to_end(key)
+        while len(_LOCAL) > _LOCAL_MAX_ENTRIES:
+            _LOCAL.popitem(last=False)
+
+
+def memoized_unified_score(
+    job: Dict[str, Any],
+    *,
+    keywords: Iterable[str],
+    skills: Iterable[str],
+    location: Optional[str] = None,
+    experience_level: Optional[str] = None,
+    remote_preference: Optional[str] = None,
+    search_location_aliases: Optional[set] = None,
+    signature: Optional[str] = None,
+    redis_client: Any = None,
+    lock_wait_attempts: int = _LOCK_WAIT_ATTEMPTS,
+) -> Dict[str, Any]:
+    """
+    Drop-in replacement for compute_unified_score that checks the local LRU, then
+    Redis, and only computes on a miss. Concurrent misses across processes are
+    collapsed with a short SET NX lock so identical work is done once. Waiting on
+    that lock sleeps, so request handlers pass REQUEST_LOCK_WAIT_ATTEMPTS.
+    """
+    if signature is None:
+        signature = profile_signature(
+            keywords=keywords,
+            skills=skills,
+            location=location,
+            experience_level=experience_level,
+            remote_preference=remote_preference,
+            search_location_aliases=search_location_aliases,
+        )
+    key = _memo_key(job, signature)
+
+    local = _local_get(key)
+    if local is not None:
+        return _copy(local)
+
+    r = redis_client or _get_redis()
+    lock_key = f"{key}:lock"
+    have_lock = False
+    if r is not None:
+        try:
+            cached = _unpack(r.get(key))
+            if cached is None:
+                have_lock = bool(r.set(lock_key, b"1", nx=True, px=_LOCK_TTL_MS))
+                if not have_lock:
+                    # Another process is scoring this exact (content, profile) pair
+                    for _ in range(max(0, lock_wait_attempts)):
+                        time.sleep(_LOCK_WAIT_SECONDS)
+                        cached = _unpack(r.get(key))
+                        if cached is not None:
+                            break
+            if cached is not None:
+                _local_put(key, cached)
+                return _copy(cached)
+        except Exception:
+            r = None
+
+    result = compute_unified_score(
+        job,
+        keywords=keywords,
+        skills=skills,
+        location=location,
+        experience_level=experience_level,
+        remote_preference=remote_preference,
+        search_location_aliases=search_location_aliases,
+    )
+    _local_put(key, _copy(result))
+    if r is not None:
+        try:
+            r.setex(key, _MEMO_TTL_SECONDS, _pack(result))
+            if have_lock:
+                r.delete(lock_key)
+        except Exception:
+            pass
+    return _copy(result)
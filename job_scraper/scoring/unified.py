@@ -35,6 +35,11 @@ except Exception as e:
         def get_city_aliases(city: str, country: Optional[str] = None):
             return set()
 
+try:
+    from utils.locations import extract_city as _extract_city_from_location  # type: ignore
+except Exception:
+    from ..utils.locations import extract_city as _extract_city_from_location  # type: ignore
+
 _WHITESPACE_RE = re.compile(r"[^a-z0-9+]+")
 
 
@@ -353,67 +358,6 @@ def _experience_score(job: Dict[str, any], experience_level: Optional[str]) -> f
     return round(score, 4)
 
 
-def _extract_city_from_location(location: str) -> str:
-    """Extract the primary city name from a location string like 'Bangalore, India' or 'Bangalore Urban, Karnataka, India'."""
-    if not location:
-        return ""
-    
-    location_lower = location.strip().lower()
-    
-    # First, try splitting by commas/semicolons (common delimiters)
-    parts = [p.strip() for p in re.split(r'[,;|]', location_lower)]
-    if parts and parts[0]:
-        city_part = parts[0]
-    else:
-        # If no delimiters, use the whole string
-        city_part = location_lower
-    
-    # Split by spaces to get individual words
-    words = city_part.split()
-    if not words:
-        return ""
-    
-    # Words to skip (administrative divisions, suffixes, states, countries)
-    # These should appear AFTER the city name
-    skip_words = {
-        'urban', 'metro', 'city', 'district', 'region', 'area', 'zone',
-        'karnataka', 'maharashtra', 'tamil', 'nadu', 'gujarat',
-        'rajasthan', 'punjab', 'haryana', 'uttar', 'pradesh', 'west', 'bengal',
-        'telangana', 'andhra', 'kerala', 'odisha', 'bihar',
-        'india', 'in', 'usa', 'us', 'united', 'states', 'uk', 'kingdom',
-        'ca', 'california', 'tx', 'texas', 'fl', 'florida', 'ny'
-    }
-    
-    # Extract city name: take words until we hit a skip word
-    # But handle special cases for multi-word cities
-    city_words = []
-    i = 0
-    while i < len(words) and len(city_words) < 3:  # Max 3 words for city names
-        word = words[i]
-        
-        # If we hit a skip word, stop
-        if word in skip_words:
-            break
-        
-        # If we see the same word again (e.g., "Delhi, Delhi"), stop at first occurrence
-        if city_words and word == city_words[0]:
-            break
-        
-        city_words.append(word)
-        i += 1
-    
-    if not city_words:
-        # Fallback: use first word if all were skipped
-        city_words = [words[0]] if words else []
-    
-    city = ' '.join(city_words).strip()
-    
-    # Remove trailing suffixes that might have been included
-    city = re.sub(r'\s+(urban|metro|city|district)$', '', city, flags=re.IGNORECASE)
-    
-    return city.strip()
-
-
 def _location_score(job_location: Optional[str], search_location: Optional[str], remote_preference: Optional[str], search_location_aliases: Optional[set] = None) -> float:
     if not search_location:
         return 0.7 if remote_preference else 1.0
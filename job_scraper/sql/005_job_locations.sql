@@ -0,0 +1,13 @@
+-- Canonical job locations, parsed once at ingest (utils/locations.parse_location)
+-- city is lowercase (the gazetteer's name when known), country_code is ISO alpha-2 uppercase
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS city TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS region TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS country_code CHAR(2);
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS geoname_id INTEGER;
+
+-- Location tiering filters/sorts on these instead of pattern-matching jobs.location
+CREATE INDEX IF NOT EXISTS jobs_country_city_idx ON jobs(country_code, city) WHERE country_code IS NOT NULL;
+CREATE INDEX IF NOT EXISTS jobs_city_idx ON jobs(city) WHERE city IS NOT NULL;
+CREATE INDEX IF NOT EXISTS jobs_geoname_id_idx ON jobs(geoname_id) WHERE geoname_id IS NOT NULL;
+
+-- Rows stored before this migration are parsed by: python backfill_locations.py --canonical
@@ -0,0 +1,10 @@
+-- Job coordinates from the local gazetteer (utils/geonames_index), set at ingest with the canonical location
+-- geo_cell is the utils/geo grid cell (GEO_CELL_DEGREES squares, row-major) of (latitude, longitude)
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS geo_cell INTEGER;
+
+-- Radius queries look up the few cells around the searcher, then check the exact distance
+CREATE INDEX IF NOT EXISTS jobs_geo_cell_idx ON jobs(geo_cell) WHERE geo_cell IS NOT NULL;
+
+-- Rows parsed before this migration get coordinates from: python backfill_locations.py --canonical --recompute
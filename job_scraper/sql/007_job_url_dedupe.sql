@@ -0,0 +1,5 @@
+-- Ingest dedupe looks up each batch's normalized URLs (pipelines.dedupe.URL_NORM_SQL)
+-- instead of loading every stored URL of the source; the expression must match it exactly
+CREATE INDEX IF NOT EXISTS jobs_source_url_norm_idx
+  ON jobs(source_id, lower(rtrim(split_part(split_part(url, '#', 1), '?', 1), '/')))
+  WHERE url IS NOT NULL;
@@ -0,0 +1,76 @@
+from utils.geo import (
+    GEO_CELL_DEGREES,
+    GEO_MAX_CELLS,
+    _COLS,
+    cells_within,
+    distance_boost,
+    geo_cell,
+    haversine_km,
+    within_sql,
+)
+
+
+def _cols(cells):
+    return {cell % _COLS for cell in cells}
+
+
+def test_haversine_known_distance():
+    # London -> Paris is about 344 km
+    assert 340 < haversine_km(51.5074, -0.1278, 48.8566, 2.3522) < 348
+    assert haversine_km(12.97, 77.59, 12.97, 77.59) == 0
+
+
+def test_geo_cell_is_stable_and_none_without_coordinates():
+    assert geo_cell(None, 77.59) is None
+    assert geo_cell(12.97, None) is None
+    assert geo_cell(12.6, 77.6) == geo_cell(12.6 + GEO_CELL_DEGREES / 10, 77.6)
+    assert geo_cell(12.6, 77.6) != geo_cell(12.6 + GEO_CELL_DEGREES, 77.6)
+    # Longitude wraps: 180 and -180 are the same meridian
+    assert geo_cell(10.0, 180.0) == geo_cell(10.0, -180.0)
+
+
+def test_cells_within_contains_every_nearby_point():
+    lat, lon = 12.97, 77.59
+    cells = set(cells_within(lat, lon, 40))
+    for dlat in (-0.35, 0.0, 0.35):
+        for dlon in (-0.35, 0.0, 0.35):
+            if haversine_km(lat, lon, lat + dlat, lon + dlon) <= 40:
+                assert geo_cell(lat + dlat, lon + dlon) in cells
+
+
+def test_cells_within_wraps_the_antimeridian():
+    # Fiji straddles 180: points just east and west of the line are ~20 km apart
+    west, east = (-17.0, 179.9), (-17.0, -179.9)
+    assert haversine_km(*west, *east) < 25
+    cells = cells_within(*west, 40)
+    assert geo_cell(*east) in cells
+    assert geo_cell(*west) in cells
+    assert _cols(cells) >= {0, _COLS - 1}
+    assert geo_cell(*west) in cells_within(*east, 40)
+
+
+def test_cells_within_near_the_pole_covers_every_longitude():
+    cells = cells_within(89.9, 10.0, 50)
+    assert _cols(cells) == set(range(_COLS))
+
+
+def test_cells_within_gives_up_past_the_cell_budget():
+    assert cells_within(0.0, 0.0, 20000) is None
+    cells = cells_within(0.0, 0.0, 200)
+    assert cells is not None and len(cells) <= GEO_MAX_CELLS
+
+
+def test_distance_boost_decays():
+    assert distance_boost(None) == 1.0
+    assert distance_boost(0) > distance_boost(50) > distance_boost(500) > 1.0
+
+
+def test_within_sql_placeholders_match_params():
+    sql, params = within_sql(12.97, 77.59, 40)
+    assert sql.count("%s") == len(params)
+    assert params[0] == cells_within(12.97, 77.59, 40)
+    assert params[-1] == 40
+
+    sql, params = within_sql(0.0, 0.0, 20000)
+    assert "geo_cell" not in sql
+    assert sql.count("%s") == len(params)
@@ -0,0 +1,87 @@
+import pytest
+
+from utils.geonames_index import GeoNamesIndex, build_index, normalize_name
+
+
+def _city(geoname_id, name, ascii_name, alternates, lat, lon, country, admin1, population, feature_class="P"):
+    cols = [
+        str(geoname_id), name, ascii_name, ",".join(alternates), str(lat), str(lon), feature_class, "PPL",
+        country, "", admin1, "", "", "", str(population), "", "0", "UTC", "2024-01-01",
+    ]
+    return "\t".join(cols) + "\n"
+
+
+@pytest.fixture
+def index(tmp_path):
+    cities = tmp_path / "cities.txt"
+    cities.write_text(
+        _city(1277333, "Bengaluru", "Bengaluru", ["Bangalore", "Bengalooru"], 12.97194, 77.59369, "IN", "19", 8443675)
+        + _city(4749005, "Cambridge", "Cambridge", [], 42.3751, -71.1056, "US", "MA", 118403)
+        + _city(2653941, "Cambridge", "Cambridge", [], 52.2, 0.11667, "GB", "ENG", 145818)
+        + _city(1, "Tinyville", "Tinyville", [], 1.0, 1.0, "IN", "19", 10)
+        + _city(2, "Some Hill", "Some Hill", [], 2.0, 2.0, "IN", "19", 99999, feature_class="T"),
+        encoding="utf-8",
+    )
+    alternate_names = tmp_path / "alternateNamesV2.txt"
+    alternate_names.write_text(
+        "10\t1277333\ten\tBengaluru City\t\t\t\t\t\t\n"
+        "11\t1277333\tiata\tBLR\t\t\t\t\t\t\n"
+        "12\t999\ten\tNowhere\t\t\t\t\t\t\n",
+        encoding="utf-8",
+    )
+    admin1 = tmp_path / "admin1CodesASCII.txt"
+    admin1.write_text("IN.19\tKarnataka\tKarnataka\t1267701\n", encoding="utf-8")
+
+    out = tmp_path / "geonames.idx"
+    counts = build_index(
+        str(cities), out_path=str(out), alternate_names_path=str(alternate_names),
+        admin1_path=str(admin1), min_population=100,
+    )
+    assert counts["places"] == 3  # Tinyville is below min_population, Some Hill is not a populated place
+    idx = GeoNamesIndex(str(out))
+    yield idx
+    idx.close()
+
+
+def test_normalize_name():
+    assert normalize_name("  New   York ") == "new york"
+    assert normalize_name(None) == ""
+
+
+def test_lookup_by_name_ascii_and_alternate_names(index):
+    for name in ("Bengaluru", "bangalore", "BENGALOORU", "bengaluru  city"):
+        place = index.best(name)
+        assert place is not None and place.geoname_id == 1277333
+    place = index.best("bangalore")
+    assert place.name == "Bengaluru"
+    assert place.country_code == "IN"
+    assert place.region == "Karnataka"
+    assert place.lat == pytest.approx(12.97194, abs=1e-4)
+
+
+def test_lookup_orders_by_population_and_filters_by_country(index):
+    assert [p.country_code for p in index.lookup("Cambridge")] == ["GB", "US"]
+    assert index.best("cambridge", "us").geoname_id == 4749005
+    assert index.best("cambridge", "IN") is None
+    # Unmapped admin1 codes fall back to the raw code
+    assert index.best("cambridge", "US").region == "MA"
+
+
+def test_skipped_and_unknown_names(index):
+    assert index.lookup("blr") == []  # IATA codes are not aliases
+    assert index.lookup("nowhere") == []
+    assert index.lookup("tinyville") == []
+    assert index.lookup("some hill") == []
+    assert index.city_aliases("atlantis") is None
+
+
+def test_aliases(index):
+    assert index.city_aliases("Bangalore") == {"bengaluru", "bangalore", "bengalooru", "bengaluru city"}
+    assert index.aliases(index.best("cambridge", "GB")) == {"cambridge"}
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-an-index"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        GeoNamesIndex(str(path))
@@ -0,0 +1,141 @@
+import pytest
+
+import utils.locations as locations
+from utils.geonames_index import GeoNamesIndex, build_index
+from utils.locations import (
+    TIER_CITY,
+    TIER_COUNTRY,
+    TIER_EXACT,
+    TIER_OTHER,
+    ParsedLocation,
+    UserLocation,
+    location_tier,
+    location_tier_sql,
+    parse_location,
+)
+
+
+def _city(geoname_id, name, alternates, lat, lon, country, admin1, population):
+    cols = [
+        str(geoname_id), name, name, ",".join(alternates), str(lat), str(lon), "P", "PPL",
+        country, "", admin1, "", "", "", str(population), "", "0", "UTC", "2024-01-01",
+    ]
+    return "\t".join(cols) + "\n"
+
+
+@pytest.fixture
+def no_gazetteer(monkeypatch):
+    monkeypatch.setattr(locations, "_gazetteer", lambda: None)
+    parse_location.cache_clear()
+    yield
+    parse_location.cache_clear()
+
+
+@pytest.fixture
+def gazetteer(tmp_path, monkeypatch):
+    cities = tmp_path / "cities.txt"
+    cities.write_text(
+        _city(1277333, "Bengaluru", ["Bangalore"], 12.97194, 77.59369, "IN", "19", 8443675)
+        + _city(5391959, "San Francisco", [], 37.77493, -122.41942, "US", "CA", 864816),
+        encoding="utf-8",
+    )
+    admin1 = tmp_path / "admin1.txt"
+    admin1.write_text("IN.19\tKarnataka\tKarnataka\t1267701\n", encoding="utf-8")
+    out = tmp_path / "geonames.idx"
+    build_index(str(cities), out_path=str(out), admin1_path=str(admin1))
+    index = GeoNamesIndex(str(out))
+    monkeypatch.setattr(locations, "_gazetteer", lambda: index)
+    parse_location.cache_clear()
+    yield index
+    parse_location.cache_clear()
+    index.close()
+
+
+@pytest.mark.parametrize("text", [None, "", "Remote", "remote, India", "Anywhere", "WFH"])
+def test_parse_location_remote_and_empty(no_gazetteer, text):
+    assert parse_location(text) == ParsedLocation()
+
+
+@pytest.mark.parametrize("text, city, region, code", [
+    ("Bangalore, India", "bangalore", None, "IN"),
+    ("Bangalore Urban, Karnataka, India", "bangalore", "karnataka", "IN"),
+    ("Pune, Maharashtra", "pune", "maharashtra", "IN"),
+    ("  London ,  UK ", "london", None, "GB"),
+    ("Berlin", "berlin", None, None),
+])
+def test_parse_location_without_gazetteer(no_gazetteer, text, city, region, code):
+    parsed = parse_location(text)
+    assert (parsed.city, parsed.region, parsed.country_code) == (city, region, code)
+    assert parsed.latitude is None and parsed.geo_cell is None
+
+
+def test_parse_location_country_only(no_gazetteer):
+    assert parse_location("India") == ParsedLocation(country_code="IN")
+
+
+def test_parse_location_state_abbreviation_is_not_a_country(no_gazetteer):
+    # "CA" is Canada's code too; without a gazetteer a two-part US-style location keeps the state
+    parsed = parse_location("San Francisco, CA")
+    assert parsed.city == "san francisco"
+    assert parsed.country_code == "US"
+
+
+def test_parse_location_with_gazetteer(gazetteer):
+    parsed = parse_location("Bangalore, India")
+    assert parsed.city == "bengaluru"
+    assert parsed.geoname_id == 1277333
+    assert parsed.region == "karnataka"
+    assert parsed.country_code == "IN"
+    assert parsed.latitude == pytest.approx(12.97194, abs=1e-4)
+    assert parsed.geo_cell is not None
+
+    parsed = parse_location("San Francisco, CA")
+    assert parsed.country_code == "US"
+    assert parsed.geoname_id == 5391959
+
+
+def _user(**kwargs):
+    defaults = dict(
+        city="bengaluru", country_code="IN", geoname_id=1277333,
+        city_names=frozenset({"bengaluru", "bangalore"}), latitude=12.97194, longitude=77.59369,
+    )
+    defaults.update(kwargs)
+    return UserLocation(**defaults)
+
+
+def test_location_tier_sql_params_follow_placeholders():
+    user = _user()
+    sql, params = location_tier_sql(user)
+    assert sql.count("%s") == len(params)
+    # The city condition appears twice (EXACT and CITY) and the country condition twice
+    city_params = [sorted(user.city_names), user.geoname_id] + locations.within_sql(
+        user.latitude, user.longitude, locations.GEO_LOCAL_RADIUS_KM, "j")[1]
+    assert params == city_params + ["IN"] + city_params + ["IN"]
+    # Placeholders come in the same order: city (ANY), geoname id, radius ..., then country
+    first_city = sql.index("j.city = ANY(%s)")
+    assert first_city < sql.index("j.geoname_id = %s") < sql.index("j.country_code = %s")
+
+
+def test_location_tier_sql_without_city_or_country():
+    sql, params = location_tier_sql(_user(city=None, city_names=frozenset(), geoname_id=None))
+    assert sql.count("%s") == len(params) == 2
+    assert params == ["IN", "IN"]
+
+    sql, params = location_tier_sql(UserLocation())
+    assert params == []
+    assert f"ELSE {TIER_OTHER}" in sql
+
+    sql, params = location_tier_sql(_user(geoname_id=None, latitude=None, longitude=None, country_code=None))
+    assert sql.count("%s") == len(params)
+    assert params == [["bangalore", "bengaluru"], ["bangalore", "bengaluru"]]
+
+
+def test_location_tier_matches_sql_tiers():
+    user = _user()
+    assert location_tier(user, {"city": "bangalore", "country_code": "IN"}) == TIER_EXACT
+    assert location_tier(user, {"city": "bangalore", "country_code": "US"}) == TIER_CITY
+    assert location_tier(user, {"city": "mysore", "country_code": "IN"}) == TIER_COUNTRY
+    assert location_tier(user, {"city": "berlin", "country_code": "DE"}) == TIER_OTHER
+    # A nearby suburb with coordinates counts as the city
+    suburb = {"city": "whitefield", "country_code": "IN", "latitude": 12.9698, "longitude": 77.7500}
+    assert location_tier(user, suburb) == TIER_EXACT
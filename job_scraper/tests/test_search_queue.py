@@ -0,0 +1,51 @@
+import pytest
+
+# utils.search_queue imports the Redis/Postgres clients through deps
+pytest.importorskip("redis")
+pytest.importorskip("psycopg2")
+
+from utils.search_queue import canonical_fetch_query, fetch_key  # noqa: E402
+
+
+def test_equivalent_searches_compare_equal():
+    a = canonical_fetch_query(["Data Engineer", "python  developer"], "Bangalore , India", "Hybrid")
+    b = canonical_fetch_query(["python developer", "data engineer", "DATA ENGINEER", "  "], "bangalore, india", " hybrid ")
+    assert a == b
+    assert a == {
+        "keywords": ["data engineer", "python developer"],
+        "location": "bangalore, india",
+        "remote_type": "hybrid",
+    }
+
+
+@pytest.mark.parametrize("location", [None, "", "  ", "Any", "anywhere", "Everywhere"])
+def test_non_locations_are_blank(location):
+    assert canonical_fetch_query(["x"], location)["location"] == ""
+
+
+def test_start_offset_only_keys_offset_paginated_sources():
+    base = canonical_fetch_query(["x"], "pune")
+    assert canonical_fetch_query(["x"], "pune", source="adzuna", start_offset=25) == base
+    assert canonical_fetch_query(["x"], "pune", source="LinkedIn", start_offset=0) == base
+    assert canonical_fetch_query(["x"], "pune", source="linkedin", start_offset=25) == {**base, "start_offset": 25}
+
+
+def test_fetch_key():
+    assert fetch_key("Adzuna", ["b", "a"], "Pune") == fetch_key("adzuna", ["A", "B"], "pune ")
+    assert fetch_key("adzuna", ["a"]) != fetch_key("jooble", ["a"])
+    # LinkedIn's first page keeps its old key; deeper pages get their own
+    assert fetch_key("linkedin", ["a"], start_offset=0) == fetch_key("linkedin", ["a"])
+    assert fetch_key("linkedin", ["a"], start_offset=25) != fetch_key("linkedin", ["a"])
+    assert fetch_key("adzuna", ["a"], start_offset=25) == fetch_key("adzuna", ["a"])
+
+
+def test_phrase_limited_sources_key_only_the_phrases_fetched():
+    six = ["a", "b", "c", "d", "e", "f"]
+    reordered = ["f", "e", "d", "c", "b", "a"]
+    # Adzuna searches the first five phrases in order: different sets, different keys
+    assert fetch_key("adzuna", six) != fetch_key("adzuna", reordered)
+    # Same five phrases searched (a sixth is never fetched): same key
+    assert fetch_key("adzuna", six) == fetch_key("adzuna", ["b", "a", "e", "d", "c", "x"])
+    assert canonical_fetch_query(six, source="jooble")["keywords"] == ["a", "b", "c", "d", "e"]
+    # LinkedIn searches every phrase, so order still does not matter
+    assert fetch_key("linkedin", six) == fetch_key("linkedin", reordered)
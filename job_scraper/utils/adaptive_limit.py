@@ -0,0 +1,245 @@
+"""
+Adaptive (AIMD) concurrency limiter with its limit shared through Redis.
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import redis
+
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"  # 429 / LinkedIn 999
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"  # other failures: neither grow nor shrink the limit
+
+# Atomic AIMD update. Lua numbers come back truncated to integers, so the limit is returned as a string.
+_AIMD_SCRIPT = """
+local key = KEYS[1]
+local op = ARGV[1]
+local min_limit = tonumber(ARGV[2])
+local max_limit = tonumber(ARGV[3])
+local initial = tonumber(ARGV[4])
+local step = tonumber(ARGV[5])
+local factor = tonumber(ARGV[6])
+local now = tonumber(ARGV[7])
+local cooldown = tonumber(ARGV[8])
+
+local limit = tonumber(redis.call('HGET', key, 'limit')) or initial
+if op == 'inc' then
+    limit = math.min(max_limit, limit + step / math.max(1, limit))
+    redis.call('HINCRBY', key, 'successes', 1)
+elseif op == 'dec' then
+    local last = tonumber(redis.call('HGET', key, 'last_decrease')) or 0
+    if now - last >= cooldown then
+        limit = math.max(min_limit, limit * factor)
+        redis.call('HSET', key, 'last_decrease', now)
+        redis.call('HINCRBY', key, 'decreases', 1)
+    end
+    redis.call('HINCRBY', key, 'throttles', 1)
+end
+redis.call('HSET', key, 'limit', limit, 'updated_at', now)
+redis.call('EXPIRE', key, 86400)
+return tostring(limit)
+"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bounds in-flight requests with an AIMD limit: +step per window of healthy
+    responses, x factor on throttling (429/999) or timeouts. The limit lives in
+    Redis (`adaptive:{key}`) so every worker learns from every other worker's
+    responses; without Redis it works process-locally.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis],
+        key: str,
+        min_limit: int = 1,
+        max_limit: int = 20,
+        initial_limit: int = 4,
+        step: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_target: float = 4.0,
+        cooldown: float = 2.0,
+        sync_interval: float = 2.0,
+    ):
+        """
+        Args:
+            redis_client: Redis client (None = local only)
+            key: Limiter identifier
+            min_limit / max_limit: Bounds for in-flight requests
+            initial_limit: Starting limit when no shared state exists
+            step: Additive increase per window of `limit` successes
+            decrease_factor: Multiplicative decrease on throttling
+            latency_target: Successes slower than this (seconds) hold the limit instead of growing it
+            cooldown: Minimum seconds between decreases (one cut per congestion event)
+            sync_interval: Seconds between refreshes of the shared limit
+        """
+        self.redis = redis_client
+        self.key = f"adaptive:{key}"
+        # EVALSHA after the first call instead of sending the script with every update
+        self._script = redis_client.register_script(_AIMD_SCRIPT) if redis_client is not None else None
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.initial_limit = initial_limit
+        self.step = step
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.sync_interval = sync_interval
+
+        self._limit = float(initial_limit)
+        self._last_sync = 0.0
+        self._last_local_decrease = 0.0
+        self._in_flight = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._stats = {"ok": 0, "throttled": 0, "timeout": 0, "error": 0}
+        self._latency_ewma: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, int(self._limit)))
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _update(self, op: str) -> None:
+        now = time.time()
+        if self._script is not None:
+            try:
+                # Sync redis-py client: run off the event loop
+                result = await asyncio.to_thread(
+                    self._script,
+                    keys=[self.key],
+                    args=[op, self.min_limit, self.max_limit, self.initial_limit,
+                          self.step, self.decrease_factor, now, self.cooldown],
+                )
+                self._limit = float(result.decode() if isinstance(result, bytes) else result)
+                self._last_sync = now
+                return
+            except Exception as e:
+                print(f"[AdaptiveLimit] Redis update failed for {self.key}: {e}")
+        if op == "inc":
+            self._limit = min(self.max_limit, self._limit + self.step / max(1.0, self._limit))
+        elif op == "dec" and now - self._last_local_decrease >= self.cooldown:
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._last_local_decrease = now
+
+    async def _sync(self) -> None:
+        """Pick up limit changes made by other workers (at most once per sync_interval)."""
+        now = time.time()
+        if self.redis is None or now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        try:
+            value = await asyncio.to_thread(self.redis.hget, self.key, "limit")
+            if value is not None:
+                self._limit = float(value.decode() if isinstance(value, bytes) else value)
+        except Exception:
+            pass
+
+    async def acquire(self) -> None:
+        cond = self._condition()
+        while True:
+            await self._sync()  # outside the condition: waiters are not held up by Redis
+            async with cond:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(cond.wait(), timeout=self.sync_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, outcome: str, latency: Optional[float] = None) -> None:
+        self._stats[outcome] = self._stats.get(outcome, 0) + 1
+        if latency is not None:
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        # Free the slot before the (Redis) limit update so it is released even if that is cancelled
+        cond = self._condition()
+        async with cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            cond.notify_all()
+        if outcome == OUTCOME_OK:
+            if latency is None or latency <= self.latency_target:
+                await self._update("inc")
+        elif outcome in (OUTCOME_THROTTLED, OUTCOME_TIMEOUT):
+            await self._update("dec")
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one in-flight slot. Call `report(outcome)` on the yielded handle;
+        exceptions count as errors (asyncio timeouts as timeouts).
+        """
+        await self.acquire()
+        handle = _SlotHandle()
+        started = time.time()
+        try:
+            yield handle
+        except asyncio.TimeoutError:
+            handle.outcome = OUTCOME_TIMEOUT
+            raise
+        except Exception:
+            handle.outcome = handle.outcome or OUTCOME_ERROR
+            raise
+        finally:
+            await self.release(handle.outcome or OUTCOME_OK, time.time() - started)
+
+    def backoff(self, attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+        """Exponential backoff with full jitter, stretched while the limit sits at its floor."""
+        pressure = 2.0 if self.limit <= self.min_limit else 1.0
+        return random.uniform(0, min(cap, base * pressure * (2 ** attempt)))
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "limit_raw": round(self._limit, 3),
+            "in_flight": self._in_flight,
+            "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            **self._stats,
+        }
+
+
+class _SlotHandle:
+    def __init__(self):
+        self.outcome: Optional[str] = None
+
+    def report(self, outcome: str) -> None:
+        self.outcome = outcome
+
+
+_LIMITERS: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, AdaptiveConcurrencyLimiter]] = {}
+
+
+def get_adaptive_limiter(redis_client: Optional[redis.Redis], key: str, **options) -> AdaptiveConcurrencyLimiter:
+    """Process-wide limiter per (event loop, key) so concurrent fetches share in-flight accounting."""
+    loop = asyncio.get_running_loop()
+    for k, (owner, _limiter) in list(_LIMITERS.items()):
+        if owner.is_closed():
+            _LIMITERS.pop(k, None)
+    entry = _LIMITERS.get((id(loop), key))
+    if entry and entry[0] is loop:
+        return entry[1]
+    limiter = AdaptiveConcurrencyLimiter(redis_client, key, **options)
+    _LIMITERS[(id(loop), key)] = (loop, limiter)
+    return limiter
+
+
+def get_adaptive_metrics(redis_client: redis.Redis, key: str) -> Dict[str, float]:
+    """Shared limiter state as stored in Redis (for dashboards / health endpoints)."""
+    raw = redis_client.hgetall(f"adaptive:{key}") or {}
+    metrics = {}
+    for k, v in raw.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        v = v.decode() if isinstance(v, bytes) else v
+        try:
+            metrics[k] = float(v)
+        except (TypeError, ValueError):
+            metrics[k] = v
+    return metrics
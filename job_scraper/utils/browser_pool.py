@@ -0,0 +1,266 @@
+"""
+Persistent Playwright browser pool: long-lived browsers with recyclable context/page slots.
+"""
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.browser_slots import browser_slot
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+DEFAULT_BLOCKED_RESOURCES = ("image", "font", "media")
+
+POOL_BROWSERS = int(os.getenv("BROWSER_POOL_BROWSERS", "2"))
+POOL_PAGES_PER_BROWSER = int(os.getenv("BROWSER_POOL_PAGES_PER_BROWSER", "3"))
+# Recycle a context after this many navigations to keep renderer RSS bounded
+POOL_MAX_NAVIGATIONS = int(os.getenv("BROWSER_POOL_MAX_NAVIGATIONS", "25"))
+# Close a returned context after this long unused (releasing its browser slot)
+POOL_IDLE_SECONDS = float(os.getenv("BROWSER_POOL_IDLE_SECONDS", "30"))
+
+
+class _Slot:
+    """One context + page living on a pooled browser, and the browser slot it holds while open."""
+
+    def __init__(self, browser_idx: int):
+        self.browser_idx = browser_idx
+        self.context = None
+        self.page = None
+        self.navigations = 0
+        self.lease = None  # entered utils.browser_slots.browser_slot() while the context is open
+        self.checked_out = False
+        self.idle_timer: Optional[asyncio.TimerHandle] = None
+
+
+class BrowserPool:
+    """
+    N Chromium browsers, each serving a fixed number of context/page slots.
+    Slots are recycled (context closed and recreated) after `max_navigations` uses or
+    on any page/browser crash. Image, font and media requests are aborted.
+
+    Every open context holds a host and a cluster browser slot (utils.browser_slots)
+    until it is closed, so pooled pages count against the limits even between
+    checkouts. Contexts unused for `idle_seconds` are closed, and a browser is closed
+    once none of its contexts is open.
+    """
+
+    def __init__(
+        self,
+        browsers: int = POOL_BROWSERS,
+        pages_per_browser: int = POOL_PAGES_PER_BROWSER,
+        max_navigations: int = POOL_MAX_NAVIGATIONS,
+        idle_seconds: float = POOL_IDLE_SECONDS,
+        user_agent: str = DEFAULT_USER_AGENT,
+        launch_args: Optional[List[str]] = None,
+        context_options: Optional[dict] = None,
+        init_script: Optional[str] = None,
+        blocked_resources: Iterable[str] = DEFAULT_BLOCKED_RESOURCES,
+        blocked_url_patterns: Iterable[str] = (),
+    ):
+        self.browsers_count = max(1, browsers)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.max_navigations = max(1, max_navigations)
+        self.idle_seconds = max(0.0, idle_seconds)
+        self.user_agent = user_agent
+        self.launch_args = launch_args or []
+        self.context_options = context_options or {}
+        self.init_script = init_script
+        self.blocked_resources = set(blocked_resources or ())
+        self._blocked_url_re = re.compile("|".join(blocked_url_patterns), re.I) if blocked_url_patterns else None
+
+        self._playwright = None
+        self._browsers: List = []
+        self._slots: Optional[asyncio.Queue] = None
+        self._all_slots: List[_Slot] = []
+        self._start_lock = asyncio.Lock()
+        # Serializes browser launch/close against contexts being opened on them
+        self._browser_lock = asyncio.Lock()
+        self._closed = False
+
+    @property
+    def started(self) -> bool:
+        return self._slots is not None
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self.started:
+                return
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browsers = [None] * self.browsers_count
+            slots: asyncio.Queue = asyncio.Queue()
+            self._all_slots = [
+                _Slot(browser_idx) for browser_idx in range(self.browsers_count) for _ in range(self.pages_per_browser)
+            ]
+            for slot in self._all_slots:
+                slots.put_nowait(slot)
+            self._slots = slots
+            self._closed = False
+            print(f"[BrowserPool] Started ({self.browsers_count} browser(s) x {self.pages_per_browser} page(s), recycle after {self.max_navigations} navigations)")
+
+    async def _browser(self, idx: int):
+        browser = self._browsers[idx]
+        if browser is None or not browser.is_connected():
+            print(f"[BrowserPool] Launching browser {idx}...")
+            browser = await self._playwright.chromium.launch(headless=True, args=self.launch_args)
+            self._browsers[idx] = browser
+        return browser
+
+    async def _route(self, route) -> None:
+        try:
+            request = route.request
+            if request.resource_type in self.blocked_resources or (
+                self._blocked_url_re is not None and self._blocked_url_re.search(request.url)
+            ):
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception:
+            pass
+
+    async def _open_slot(self, slot: _Slot) -> None:
+        # Bound open contexts per host (memory) and across all workers for as long as this one lives
+        lease = browser_slot()
+        await lease.__aenter__()
+        slot.lease = lease
+        async with self._browser_lock:
+            browser = await self._browser(slot.browser_idx)
+            context = await browser.new_context(user_agent=self.user_agent, **self.context_options)
+        slot.context = context
+        if self.init_script:
+            await context.add_init_script(self.init_script)
+        if self.blocked_resources or self._blocked_url_re is not None:
+            await context.route("**/*", self._route)
+        slot.page = await context.new_page()
+        slot.navigations = 0
+
+    async def _close_slot(self, slot: _Slot) -> None:
+        context, slot.context, slot.page = slot.context, None, None
+        lease, slot.lease = slot.lease, None
+        slot.navigations = 0
+        if context is not None:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if lease is not None:
+            try:
+                await lease.__aexit__(None, None, None)
+            except Exception as e:
+                print(f"[BrowserPool] Failed to release browser slot: {e}")
+        await self._close_idle_browser(slot.browser_idx)
+
+    async def _close_idle_browser(self, idx: int) -> None:
+        """Close a browser none of whose contexts is open; the next checkout relaunches it."""
+        async with self._browser_lock:
+            if idx >= len(self._browsers) or self._browsers[idx] is None:
+                return
+            if any(s.browser_idx == idx and (s.context is not None or s.lease is not None) for s in self._all_slots):
+                return
+            browser, self._browsers[idx] = self._browsers[idx], None
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    def _schedule_idle_close(self, slot: _Slot) -> None:
+        slot.idle_timer = asyncio.get_running_loop().call_later(
+            self.idle_seconds, lambda: asyncio.ensure_future(self._close_if_idle(slot))
+        )
+
+    async def _close_if_idle(self, slot: _Slot) -> None:
+        slot.idle_timer = None
+        if not slot.checked_out and slot.context is not None:
+            await self._close_slot(slot)
+
+    def _cancel_idle_close(self, slot: _Slot) -> None:
+        if slot.idle_timer is not None:
+            slot.idle_timer.cancel()
+            slot.idle_timer = None
+
+    @asynccontextmanager
+    async def page(self, cookies: Optional[List[dict]] = None):
+        """
+        Check out a pooled page; it is returned (or recycled) on exit. Opening a
+        context waits for a host and a cluster browser slot (utils.browser_slots).
+        """
+        if not self.started:
+            await self.start()
+        slots = self._slots
+        slot: _Slot = await slots.get()
+        slot.checked_out = True
+        self._cancel_idle_close(slot)
+        healthy = True
+        try:
+            if slot.page is None or slot.page.is_closed():
+                await self._close_slot(slot)
+                await self._open_slot(slot)
+            if cookies:
+                await slot.context.add_cookies(cookies)
+            slot.navigations += 1
+            yield slot.page
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            slot.checked_out = False
+            # close() may have torn the pool down (or it was restarted) while this page was out
+            retired = self._closed or self._slots is not slots
+            if not healthy or slot.navigations >= self.max_navigations or retired:
+                await self._close_slot(slot)
+            elif slot.context is not None:
+                self._schedule_idle_close(slot)
+            if not retired:
+                slots.put_nowait(slot)
+
+    async def close(self) -> None:
+        """Close idle slots and the browsers; pages still checked out are closed when released."""
+        self._closed = True
+        if self._slots is not None:
+            while not self._slots.empty():
+                slot = self._slots.get_nowait()
+                self._cancel_idle_close(slot)
+                await self._close_slot(slot)
+        for browser in self._browsers:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        self._browsers = []
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = None
+        self._slots = None
+
+
+# Playwright objects belong to the loop that created them, so pools are kept per (loop, name)
+_POOLS: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, BrowserPool]] = {}
+
+
+def get_browser_pool(name: str = "default", **options) -> BrowserPool:
+    """Return the named pool for the running loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    for key, (owner, _pool) in list(_POOLS.items()):
+        if owner.is_closed():
+            _POOLS.pop(key, None)
+    key = (id(loop), name)
+    entry = _POOLS.get(key)
+    if entry and entry[0] is loop:
+        return entry[1]
+    pool = BrowserPool(**options)
+    _POOLS[key] = (loop, pool)
+    return pool
+
+
+async def close_browser_pools() -> None:
+    """Shut down every pool owned by the running loop."""
+    loop = asyncio.get_running_loop()
+    for key, (owner, pool) in list(_POOLS.items()):
+        if owner is loop:
+            _POOLS.pop(key, None)
+            await pool.close()
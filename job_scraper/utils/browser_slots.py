@@ -0,0 +1,285 @@
+"""
+Cluster-wide (Redis leases) and per-host (memory-aware) caps on concurrently open browser pages.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import redis
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
+
+BROWSER_CLUSTER_SLOTS = int(os.getenv("BROWSER_CLUSTER_SLOTS", "6"))
+# A holder that stops renewing (crashed worker) loses its slot after this many seconds
+BROWSER_SLOT_LEASE_TTL = int(os.getenv("BROWSER_SLOT_LEASE_TTL", "120"))
+BROWSER_HOST_SLOTS = int(os.getenv("BROWSER_HOST_SLOTS", "6"))
+# Lock files shared by every worker process on the host (tmpfs, so they vanish on reboot)
+BROWSER_HOST_SLOT_DIR = os.getenv(
+    "BROWSER_HOST_SLOT_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "jobpilot-browser-slots"),
+)
+# Budget per open page (renderer + context) and memory the host keeps for everything else
+BROWSER_PAGE_MEMORY_MB = int(os.getenv("BROWSER_PAGE_MEMORY_MB", "350"))
+BROWSER_MEMORY_RESERVE_MB = int(os.getenv("BROWSER_MEMORY_RESERVE_MB", "512"))
+
+_SLOTS_KEY = "browser:slots"  # sorted set: lease token -> lease expiry
+
+# Drop expired leases, then take a slot if one is free
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+# Extend a lease we still hold
+_RENEW_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except Exception:
+        return None
+
+
+def available_memory_mb() -> Optional[float]:
+    """Memory still available to this host/container (MemAvailable, bounded by the cgroup limit)."""
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) / 1024.0
+                    break
+    except Exception:
+        pass
+    limit = _read_int("/sys/fs/cgroup/memory.max")
+    current = _read_int("/sys/fs/cgroup/memory.current")
+    if limit is not None and current is not None:
+        cgroup_free = (limit - current) / (1024.0 * 1024.0)
+        available = cgroup_free if available is None else min(available, cgroup_free)
+    return available
+
+
+class ClusterBrowserSlots:
+    """
+    Counting semaphore over every worker, stored as a Redis sorted set of lease
+    tokens scored by expiry. Holders renew their lease while they work; leases of
+    crashed holders expire and are reclaimed by the next acquire.
+    """
+
+    def __init__(self, redis_client: redis.Redis, limit: int = BROWSER_CLUSTER_SLOTS, lease_ttl: int = BROWSER_SLOT_LEASE_TTL):
+        self.redis = redis_client
+        self.limit = max(1, limit)
+        self.lease_ttl = max(3, lease_ttl)
+        self._acquire_script = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._renew_script = redis_client.register_script(_RENEW_SCRIPT)
+
+    def _try_acquire(self, token: str) -> bool:
+        now = time.time()
+        return bool(self._acquire_script(
+            keys=[_SLOTS_KEY],
+            args=[now, self.limit, now + self.lease_ttl, token, self.lease_ttl * 2],
+        ))
+
+    def _renew(self, token: str) -> bool:
+        return bool(self._renew_script(keys=[_SLOTS_KEY], args=[token, time.time() + self.lease_ttl, self.lease_ttl * 2]))
+
+    async def _heartbeat(self, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                if not await asyncio.to_thread(self._renew, token):
+                    print(f"[BrowserSlots] Lease {token} expired while held; the cluster may briefly exceed {self.limit} slots")
+                    return
+            except Exception as e:
+                print(f"[BrowserSlots] Lease renewal failed: {e}")
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one cluster-wide browser slot (polls with jittered backoff while all are taken)."""
+        token = uuid.uuid4().hex
+        delay = 0.2
+        while True:
+            try:
+                if await asyncio.to_thread(self._try_acquire, token):
+                    break
+            except Exception as e:
+                # Redis trouble must not stop browser work: fall back to the per-host limit
+                print(f"[BrowserSlots] Cluster slot acquire failed, proceeding without a lease: {e}")
+                yield None
+                return
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(2.0, delay * 1.5)
+        heartbeat = asyncio.create_task(self._heartbeat(token))
+        try:
+            yield token
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            try:
+                await asyncio.to_thread(self.redis.zrem, _SLOTS_KEY, token)
+            except Exception as e:
+                print(f"[BrowserSlots] Failed to release lease {token} (expires in {self.lease_ttl}s): {e}")
+
+    def in_use(self) -> int:
+        return int(self.redis.zcount(_SLOTS_KEY, time.time(), "+inf"))
+
+
+class HostBrowserGate:
+    """
+    Host-wide cap on open pages, shared by every worker process on the machine: at
+    most `max_slots`, and no new page unless the host has room for one more
+    (`page_memory_mb` above `reserve_mb` of free memory). Slots are `flock`ed files
+    in `slot_dir` (tmpfs when available); the kernel drops the lock when a holder
+    exits, so crashed workers never leak slots. A page is always admitted when no
+    other page is open on the host, so work cannot stall completely.
+    """
+
+    def __init__(
+        self,
+        max_slots: int = BROWSER_HOST_SLOTS,
+        page_memory_mb: int = BROWSER_PAGE_MEMORY_MB,
+        reserve_mb: int = BROWSER_MEMORY_RESERVE_MB,
+        slot_dir: str = BROWSER_HOST_SLOT_DIR,
+    ):
+        self.max_slots = max(1, max_slots)
+        self.page_memory_mb = max(1, page_memory_mb)
+        self.reserve_mb = reserve_mb
+        self.slot_dir = slot_dir
+        os.makedirs(slot_dir, exist_ok=True)
+
+    def _has_memory_for_page(self) -> bool:
+        available = available_memory_mb()
+        return available is None or available - self.reserve_mb >= self.page_memory_mb
+
+    def _try_acquire(self) -> Optional[int]:
+        """Lock a free slot file and return its fd, or None if the host is at its limit."""
+        fd = None
+        busy = 0
+        for i in range(self.max_slots):
+            candidate = os.open(os.path.join(self.slot_dir, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(candidate)
+                busy += 1
+                continue
+            if fd is None:
+                fd = candidate
+            else:
+                os.close(candidate)  # only probing how many slots are taken
+        if fd is not None and busy and not self._has_memory_for_page():
+            os.close(fd)
+            return None
+        return fd
+
+    @asynccontextmanager
+    async def slot(self):
+        delay = 0.1
+        while True:
+            fd = self._try_acquire()  # non-blocking flock probes; cheap enough for the loop
+            if fd is not None:
+                break
+            # Released slots and freed memory are both noticed by polling
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(1.0, delay * 1.5)
+        try:
+            yield
+        finally:
+            os.close(fd)  # closing the descriptor releases the flock
+
+    def in_use(self) -> int:
+        """Pages currently open on this host, across all processes."""
+        held = 0
+        for i in range(self.max_slots):
+            path = os.path.join(self.slot_dir, f"slot-{i}.lock")
+            if not os.path.exists(path):
+                continue
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                held += 1
+            finally:
+                os.close(fd)
+        return held
+
+
+_GATE: Optional[HostBrowserGate] = None
+_GATE_CHECKED = False
+_CLUSTER: Optional[ClusterBrowserSlots] = None
+_CLUSTER_CHECKED = False
+
+
+def _host_gate() -> Optional[HostBrowserGate]:
+    global _GATE, _GATE_CHECKED
+    if not _GATE_CHECKED:
+        _GATE_CHECKED = True
+        if fcntl is None:
+            print("[BrowserSlots] fcntl unavailable; no per-host page limit")
+        else:
+            try:
+                _GATE = HostBrowserGate()
+            except Exception as e:
+                print(f"[BrowserSlots] Host slot directory {BROWSER_HOST_SLOT_DIR} unusable, no per-host page limit: {e}")
+    return _GATE
+
+
+def _cluster_slots() -> Optional[ClusterBrowserSlots]:
+    global _CLUSTER, _CLUSTER_CHECKED
+    if not _CLUSTER_CHECKED:
+        _CLUSTER_CHECKED = True
+        try:
+            from deps import get_redis_client
+            redis_client = get_redis_client()
+            if redis_client:
+                _CLUSTER = ClusterBrowserSlots(redis_client)
+            else:
+                print("[BrowserSlots] Redis not configured; only the per-host limit applies")
+        except Exception as e:
+            print(f"[BrowserSlots] Cluster slots unavailable, only the per-host limit applies: {e}")
+    return _CLUSTER
+
+
+@asynccontextmanager
+async def _no_gate():
+    yield
+
+
+@asynccontextmanager
+async def browser_slot():
+    """Hold a host slot and a cluster slot for as long as one browser context/page is open."""
+    started = time.time()
+    gate = _host_gate()
+    async with (gate.slot() if gate is not None else _no_gate()):
+        cluster = _cluster_slots()
+        if cluster is None:
+            yield
+            return
+        async with cluster.slot():
+            waited = time.time() - started
+            if waited > 1.0:
+                print(f"[BrowserSlots] Waited {waited:.1f}s for a browser slot")
+            yield
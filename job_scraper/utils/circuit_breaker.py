@@ -1,10 +1,12 @@
 """
 Circuit breaker pattern for connector resilience.
 """
+import os
+import threading
 import time
 import redis
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 
 class CircuitState(Enum):
@@ -13,9 +15,117 @@ class CircuitState(Enum):
     HALF_OPEN = "half_open"  # Testing recovery
 
 
+# Seconds a process trusts its cached CLOSED state without asking Redis
+CIRCUIT_LOCAL_TTL = float(os.getenv("CIRCUIT_LOCAL_TTL", "2"))
+CIRCUIT_EVENTS_CHANNEL = "circuit:events"
+
+# The whole state machine in one call. Returns {state, seconds until it may change, allowed}.
+_STATE_SCRIPT = """
+local key = KEYS[1]
+local op = ARGV[1]
+local now = tonumber(ARGV[2])
+local threshold = tonumber(ARGV[3])
+local timeout = tonumber(ARGV[4])
+local half_open_timeout = tonumber(ARGV[5])
+local channel = ARGV[6]
+
+local data = redis.call('HMGET', key, 'state', 'failures', 'opened_at', 'probe_at')
+local state = data[1] or 'closed'
+local failures = tonumber(data[2]) or 0
+local opened_at = tonumber(data[3]) or 0
+local probe_at = tonumber(data[4]) or 0
+
+if state == 'open' and now - opened_at >= timeout then
+    state = 'half_open'
+    probe_at = 0
+    redis.call('HSET', key, 'state', state, 'probe_at', 0)
+end
+
+if op == 'check' then
+    if state == 'open' then
+        return {state, tostring(opened_at + timeout - now), 0}
+    end
+    if state == 'half_open' then
+        -- One probe per half_open_timeout; a probe that never reports back frees the slot
+        if now - probe_at >= half_open_timeout then
+            redis.call('HSET', key, 'probe_at', now)
+            redis.call('EXPIRE', key, timeout * 2 + half_open_timeout)
+            return {state, '0', 1}
+        end
+        return {state, tostring(probe_at + half_open_timeout - now), 0}
+    end
+    return {state, '0', 1}
+elseif op == 'success' then
+    if state ~= 'closed' or failures > 0 then
+        redis.call('DEL', key)
+        if state ~= 'closed' then
+            redis.call('PUBLISH', channel, key .. '|closed')
+        end
+    end
+    return {'closed', '0', 1}
+end
+
+-- failure
+failures = failures + 1
+if state == 'half_open' or failures >= threshold then
+    redis.call('HSET', key, 'state', 'open', 'failures', failures, 'opened_at', now)
+    redis.call('EXPIRE', key, timeout * 2 + half_open_timeout)
+    redis.call('PUBLISH', channel, key .. '|open')
+    return {'open', tostring(timeout), 0}
+end
+redis.call('HSET', key, 'state', state, 'failures', failures)
+redis.call('EXPIRE', key, timeout * 2)
+return {state, '0', 1}
+"""
+
+# Per-process view of breaker states: redis key -> (state, valid until)
+_STATE_CACHE: Dict[str, Tuple[CircuitState, float]] = {}
+_STATE_LOCK = threading.Lock()
+_LISTENERS: Dict[int, Any] = {}
+
+
+def _cached_state(key: str) -> Optional[CircuitState]:
+    entry = _STATE_CACHE.get(key)
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+
+def _on_event(message) -> None:
+    """Pub/sub handler: forget the cached state so the next check reads the new one from Redis."""
+    try:
+        data = message.get("data")
+        data = data.decode() if isinstance(data, bytes) else str(data)
+        key = data.rsplit("|", 1)[0]
+        with _STATE_LOCK:
+            _STATE_CACHE.pop(key, None)
+    except Exception:
+        pass
+
+
+def _ensure_listener(redis_client: redis.Redis) -> None:
+    """Subscribe once per client to breaker transitions published by any worker."""
+    with _STATE_LOCK:
+        if id(redis_client) in _LISTENERS:
+            return
+        _LISTENERS[id(redis_client)] = None
+    try:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{CIRCUIT_EVENTS_CHANNEL: _on_event})
+        _LISTENERS[id(redis_client)] = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    except Exception as e:
+        # Without pub/sub, cached CLOSED states still expire after CIRCUIT_LOCAL_TTL
+        print(f"[CircuitBreaker] Pub/sub unavailable, relying on local TTL: {e}")
+
+
 class CircuitBreaker:
-    """Circuit breaker for source connectors."""
-    
+    """
+    Circuit breaker for source connectors. Every transition runs as one atomic
+    Redis script; each process caches CLOSED for CIRCUIT_LOCAL_TTL seconds and an
+    OPEN state until it may half-open, so the hot path is a dict lookup. OPEN and
+    CLOSED transitions are published so other processes drop their cached state.
+    """
+
     def __init__(
         self,
         redis_client: redis.Redis,
@@ -37,42 +147,69 @@ class CircuitBreaker:
         self.failure_threshold = failure_threshold
         self.timeout = timeout
         self.half_open_timeout = half_open_timeout
-    
+        self._script = redis_client.register_script(_STATE_SCRIPT)
+        self._dirty = False  # this process recorded failures since its last success
+        _ensure_listener(redis_client)
+
+    def _run(self, op: str) -> Tuple[CircuitState, bool]:
+        state, wait, allowed = self._script(
+            keys=[self.key],
+            args=[op, time.time(), self.failure_threshold, self.timeout, self.half_open_timeout, CIRCUIT_EVENTS_CHANNEL],
+        )
+        state = CircuitState(state.decode() if isinstance(state, bytes) else state)
+        wait = float(wait.decode() if isinstance(wait, bytes) else wait)
+        with _STATE_LOCK:
+            if state == CircuitState.CLOSED:
+                _STATE_CACHE[self.key] = (state, time.time() + CIRCUIT_LOCAL_TTL)
+            elif not allowed and wait > 0:
+                _STATE_CACHE[self.key] = (state, time.time() + wait)
+            else:
+                _STATE_CACHE.pop(self.key, None)
+        return state, bool(allowed)
+
     def record_success(self):
-        """Record a successful operation."""
-        self.redis.delete(f"{self.key}:failures")
-        self.redis.delete(f"{self.key}:opened_at")
-        self.redis.delete(f"{self.key}:half_open_at")
-    
+        """Record a successful operation (no Redis call while the circuit is known closed)."""
+        if not self._dirty and _cached_state(self.key) == CircuitState.CLOSED:
+            return
+        self._run("success")
+        self._dirty = False
+
     def record_failure(self):
         """Record a failed operation."""
-        failures = self.redis.incr(f"{self.key}:failures")
-        self.redis.expire(f"{self.key}:failures", self.timeout * 2)
-        if failures >= self.failure_threshold:
-            self.redis.set(f"{self.key}:opened_at", time.time(), ex=self.timeout)
-    
+        self._dirty = True
+        self._run("failure")
+
+    def _state(self) -> CircuitState:
+        cached = _cached_state(self.key)
+        if cached is not None:
+            return cached
+        raw = self.redis.hget(self.key, "state")
+        return CircuitState(raw.decode() if isinstance(raw, bytes) else raw) if raw else CircuitState.CLOSED
+
     def is_open(self) -> bool:
         """Check if circuit is open."""
-        opened_at = self.redis.get(f"{self.key}:opened_at")
-        if not opened_at:
-            return False
-        opened_time = float(opened_at)
-        if time.time() - opened_time > self.timeout:
-            # Move to half-open
-            self.redis.set(f"{self.key}:half_open_at", time.time(), ex=self.half_open_timeout)
-            self.redis.delete(f"{self.key}:opened_at")
-            return False
-        return True
-    
+        return self._state() == CircuitState.OPEN
+
     def is_half_open(self) -> bool:
         """Check if circuit is half-open."""
-        return bool(self.redis.get(f"{self.key}:half_open_at"))
-    
+        return self._state() == CircuitState.HALF_OPEN
+
     def can_proceed(self) -> bool:
-        """Check if operation can proceed."""
-        if self.is_open():
-            return False
-        if self.is_half_open():
-            return True  # Allow one attempt
-        return True
+        """Check if operation can proceed (claims the single probe when half-open)."""
+        cached = _cached_state(self.key)
+        if cached is not None:
+            return cached == CircuitState.CLOSED
+        _, allowed = self._run("check")
+        return allowed
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
 
+def get_circuit_breaker(redis_client: redis.Redis, key: str, **options) -> CircuitBreaker:
+    """Process-wide breaker per source (avoids re-registering scripts on every call)."""
+    breaker = _BREAKERS.get(key)
+    if breaker is None or breaker.redis is not redis_client:
+        breaker = CircuitBreaker(redis_client, key, **options)
+        _BREAKERS[key] = breaker
+    return breaker
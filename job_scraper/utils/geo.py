@@ -0,0 +1,86 @@
+"""
+Great-circle distances and the fixed lat/lon grid used to index job coordinates (jobs.geo_cell).
+"""
+import math
+import os
+from typing import Any, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+# Grid cell size in degrees; changing it requires re-running the coordinate backfill
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.5"))
+# Jobs this close to the searcher's city count as the same city (Navi Mumbai, Noida, ...)
+GEO_LOCAL_RADIUS_KM = float(os.getenv("GEO_LOCAL_RADIUS_KM", "40"))
+# Distance boost: GEO_MAX_BOOST at 0 km, halving its excess every GEO_DECAY_HALF_KM
+GEO_MAX_BOOST = float(os.getenv("GEO_MAX_BOOST", "1.3"))
+GEO_DECAY_HALF_KM = float(os.getenv("GEO_DECAY_HALF_KM", "50"))
+# Above this many cells a radius query skips the cell prefilter (it would match most rows anyway)
+GEO_MAX_CELLS = 4096
+
+_ROWS = int(math.ceil(180.0 / GEO_CELL_DEGREES))
+_COLS = int(math.ceil(360.0 / GEO_CELL_DEGREES))
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _row(lat: float) -> int:
+    return min(_ROWS - 1, max(0, int((lat + 90.0) // GEO_CELL_DEGREES)))
+
+
+def _col(lon: float) -> int:
+    return int(((lon + 180.0) % 360.0) // GEO_CELL_DEGREES) % _COLS
+
+
+def geo_cell(lat: Optional[float], lon: Optional[float]) -> Optional[int]:
+    """Grid cell id of a coordinate (row-major, GEO_CELL_DEGREES squares)."""
+    if lat is None or lon is None:
+        return None
+    return _row(lat) * _COLS + _col(lon)
+
+
+def cells_within(lat: float, lon: float, radius_km: float) -> Optional[List[int]]:
+    """Every cell that may hold a point within radius_km, or None when that is more than GEO_MAX_CELLS."""
+    dlat = radius_km / _KM_PER_DEGREE
+    lat_lo, lat_hi = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    rows = range(_row(lat_lo), _row(lat_hi) + 1)
+    widest = math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+    if widest <= 1e-6 or radius_km / (_KM_PER_DEGREE * widest) >= 180.0:
+        cols = range(_COLS)
+    else:
+        dlon = radius_km / (_KM_PER_DEGREE * widest)
+        first, count = _col(lon - dlon), int(math.ceil(2 * dlon / GEO_CELL_DEGREES)) + 1
+        cols = [(first + i) % _COLS for i in range(min(count, _COLS))]
+    if len(rows) * len(cols) > GEO_MAX_CELLS:
+        return None
+    return [r * _COLS + c for r in rows for c in cols]
+
+
+def distance_boost(distance_km: Optional[float]) -> float:
+    """Score multiplier that decays with distance from the searcher (1.0 when unknown)."""
+    if distance_km is None:
+        return 1.0
+    return 1.0 + (GEO_MAX_BOOST - 1.0) * 0.5 ** (max(0.0, distance_km) / GEO_DECAY_HALF_KM)
+
+
+def distance_sql(lat: float, lon: float, alias: str = "j") -> Tuple[str, List[Any]]:
+    """Haversine distance in km from (lat, lon) to a job's coordinates, as SQL (NULL without coordinates)."""
+    sql = (
+        f"({2 * EARTH_RADIUS_KM} * ASIN(SQRT(LEAST(1.0,"
+        f" POWER(SIN(RADIANS({alias}.latitude - %s) / 2), 2)"
+        f" + COS(RADIANS(%s)) * COS(RADIANS({alias}.latitude))"
+        f" * POWER(SIN(RADIANS({alias}.longitude - %s) / 2), 2)))))"
+    )
+    return sql, [lat, lat, lon]
+
+
+def within_sql(lat: float, lon: float, radius_km: float, alias: str = "j") -> Tuple[str, List[Any]]:
+    """Radius filter: the indexed cell prefilter plus the exact distance check."""
+    distance, params = distance_sql(lat, lon, alias)
+    cells = cells_within(lat, lon, radius_km)
+    if cells is None:
+        return f"({distance} <= %s)", params + [radius_km]
+    return f"({alias}.geo_cell = ANY(%s) AND {distance} <= %s)", [cells] + params + [radius_km]
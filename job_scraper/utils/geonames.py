@@ -1,7 +1,10 @@
 import json
 import os
+import threading
 import time
-from typing import List, Optional, Set
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 try:
     import httpx
@@ -18,8 +21,53 @@ except Exception:
         def get_redis_client():
             return None
 
-_IN_MEMORY_CACHE: dict[str, tuple[float, Set[str]]] = {}
+try:
+    from utils.geonames_index import get_geonames_index
+except Exception:
+    try:
+        from job_scraper.utils.geonames_index import get_geonames_index
+    except Exception:
+        def get_geonames_index():
+            return None
+
 _CACHE_TTL_SECONDS = 60 * 60 * 24 * 30  # 30 days
+# Cities Geonames doesn't know are remembered too, for less time (in memory and in Redis)
+_NEGATIVE_TTL_SECONDS = int(os.getenv("GEONAMES_NEGATIVE_TTL", str(60 * 60 * 24)))
+# API errors are not the city's fault: retry after a few minutes, and only per process
+_ERROR_TTL_SECONDS = 300
+_LRU_MAX_ENTRIES = int(os.getenv("GEONAMES_LRU_SIZE", "2048"))
+# Followers wait this long for an in-flight lookup before giving up with what they have
+_SINGLEFLIGHT_WAIT_SECONDS = 15.0
+_REDIS_RETRY_SECONDS = 60
+_MAX_CONCURRENT_LOOKUPS = int(os.getenv("GEONAMES_MAX_CONCURRENCY", "4"))
+GEONAMES_PREWARM_LIMIT = int(os.getenv("GEONAMES_PREWARM_LIMIT", "50"))
+
+# Static common aliases that we know users care about (fast path)
+_STATIC_ALIASES = {
+    "bengaluru": {"bangalore"},
+    "bangalore": {"bengaluru"},
+    "gurgaon": {"gurugram"},
+    "gurugram": {"gurgaon"},
+    "mumbai": {"bombay"},
+    "bombay": {"mumbai"},
+    "kolkata": {"calcutta"},
+    "calcutta": {"kolkata"},
+    "puducherry": {"pondicherry"},
+    "pondicherry": {"puducherry"},
+    "pune": {"poona"},
+    "poona": {"pune"},
+    "delhi": {"new delhi"},
+    "new delhi": {"delhi"},
+}
+# Warmed at startup even before any search has been counted
+GEONAMES_PREWARM_CITIES = [
+    c.strip().lower()
+    for c in os.getenv(
+        "GEONAMES_PREWARM_CITIES",
+        "bengaluru,mumbai,delhi,gurugram,noida,hyderabad,chennai,pune,kolkata,ahmedabad",
+    ).split(",")
+    if c.strip()
+]
 
 
 def _cache_key(city: str, country: Optional[str]) -> str:
@@ -28,139 +76,335 @@ def _cache_key(city: str, country: Optional[str]) -> str:
     return f"geonames:aliases:{city_norm}:{country_norm}"
 
 
+def _decode_aliases(data) -> Optional[Set[str]]:
+    """Redis value -> alias set (empty for a cached miss), None if unreadable."""
+    if not data:
+        return None
+    try:
+        decoded = json.loads(data.decode("utf-8") if isinstance(data, bytes) else data)
+    except Exception:
+        return None
+    if not isinstance(decoded, list):
+        return None
+    return {str(x).strip().lower() for x in decoded if x}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Set[str] = set()
+
+
+class GeonamesResolver:
+    """
+    City alias lookups in tiers: static aliases, the offline index, a bounded
+    in-process LRU, Redis, then the Geonames API. Misses are cached in both
+    caches (negative entries), and concurrent lookups of the same city in a
+    process share one in-flight Redis/API request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = _LRU_MAX_ENTRIES,
+        ttl: int = _CACHE_TTL_SECONDS,
+        negative_ttl: int = _NEGATIVE_TTL_SECONDS,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lru: "OrderedDict[str, Tuple[float, frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self._redis = None
+        self._redis_checked_at = 0.0
+        self.stats = {"static": 0, "offline": 0, "memory": 0, "redis": 0, "api": 0, "negative": 0, "shared": 0}
+
+    # --- shared client -------------------------------------------------------
+
+    def _redis_client(self):
+        """One Redis client per process (connection attempts retried at most once a minute)."""
+        if self._redis is None and time.time() - self._redis_checked_at >= _REDIS_RETRY_SECONDS:
+            self._redis_checked_at = time.time()
+            try:
+                self._redis = get_redis_client()
+            except Exception as e:
+                print(f"[Geonames] ⚠️  Redis unavailable: {e}")
+        return self._redis
+
+    # --- in-process LRU ------------------------------------------------------
+
+    def _local_get(self, key: str) -> Optional[frozenset]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            expires_at, aliases = entry
+            if expires_at < time.time():
+                self._lru.pop(key, None)
+                return None
+            self._lru.move_to_end(key)
+            return aliases
+
+    def _local_put(self, key: str, aliases: Set[str], ttl: float) -> None:
+        with self._lock:
+            self._lru[key] = (time.time() + ttl, frozenset(aliases))
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    # --- lookups -------------------------------------------------------------
+
+    def _local_tiers(self, city_norm: str, country: Optional[str]) -> Tuple[Set[str], bool]:
+        """Static + offline aliases; True when no remote lookup is needed."""
+        base_set = {city_norm}
+        static_found = _STATIC_ALIASES.get(city_norm)
+        if static_found:
+            base_set |= static_found
+            self.stats["static"] += 1
+
+        index = get_geonames_index()
+        if index is not None:
+            try:
+                offline_aliases = index.city_aliases(city_norm, country)
+            except Exception as e:
+                offline_aliases = None
+                print(f"[Geonames] ⚠️  Offline index lookup error: {e}")
+            if offline_aliases is not None:
+                self.stats["offline"] += 1
+                return base_set | offline_aliases, True
+
+        if not os.getenv("GEONAMES_USERNAME") or httpx is None:
+            return base_set, True
+        return base_set, False
+
+    def get(self, city: str, country: Optional[str] = None) -> Set[str]:
+        """
+        Return a set of alternate names for a city (always including the normalized city).
+        If Geonames is not configured or unavailable, returns the static aliases only.
+        """
+        if not city:
+            return set()
+        city_norm = city.strip().lower()
+        base_set, resolved = self._local_tiers(city_norm, country)
+        if resolved:
+            return base_set
+        key = _cache_key(city_norm, country)
+        cached = self._local_get(key)
+        if cached is not None:
+            self.stats["memory"] += 1
+            return base_set | cached
+        return base_set | self._singleflight(key, city_norm, country)
+
+    def get_many(self, cities: Iterable[str], country: Optional[str] = None) -> Dict[str, Set[str]]:
+        """
+        Aliases for several cities, keyed by normalized city. Cache misses are read
+        from Redis in one MGET and the remaining API lookups run concurrently.
+        """
+        results: Dict[str, Set[str]] = {}
+        pending: Dict[str, str] = {}  # cache key -> city
+        for city in cities or []:
+            if not city or not str(city).strip():
+                continue
+            city_norm = str(city).strip().lower()
+            if city_norm in results:
+                continue
+            base_set, resolved = self._local_tiers(city_norm, country)
+            results[city_norm] = base_set
+            if resolved:
+                continue
+            key = _cache_key(city_norm, country)
+            cached = self._local_get(key)
+            if cached is not None:
+                self.stats["memory"] += 1
+                results[city_norm] |= cached
+            else:
+                pending[key] = city_norm
+
+        redis = self._redis_client() if pending else None
+        if redis is not None:
+            keys = list(pending)
+            try:
+                for key, data in zip(keys, redis.mget(keys)):
+                    aliases = _decode_aliases(data)
+                    if aliases is None:
+                        continue
+                    self.stats["redis"] += 1
+                    self._local_put(key, aliases, self.ttl if aliases else self.negative_ttl)
+                    results[pending.pop(key)] |= aliases
+            except Exception as e:
+                print(f"[Geonames] ⚠️  Redis batch read error: {e}")
+
+        if pending:
+            print(f"[Geonames] 🌐 Resolving {len(pending)} uncached cities via Geonames")
+            workers = max(1, min(_MAX_CONCURRENT_LOOKUPS, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    key: pool.submit(self._singleflight, key, city_norm, country)
+                    for key, city_norm in pending.items()
+                }
+                for key, future in futures.items():
+                    try:
+                        results[pending[key]] |= future.result()
+                    except Exception as e:
+                        print(f"[Geonames] ⚠️  Lookup for '{pending[key]}' failed: {e}")
+        return results
+
+    def _singleflight(self, key: str, city_norm: str, country: Optional[str]) -> Set[str]:
+        """Run _load once per key at a time; concurrent callers wait for its result."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+        if not leader:
+            self.stats["shared"] += 1
+            flight.done.wait(_SINGLEFLIGHT_WAIT_SECONDS)
+            return set(flight.result)
+        try:
+            flight.result = self._load(key, city_norm, country)
+            return set(flight.result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _load(self, key: str, city_norm: str, country: Optional[str]) -> Set[str]:
+        """Redis, then the Geonames API; stores hits and misses in both caches."""
+        # Another thread may have finished this key between our cache check and the flight
+        cached = self._local_get(key)
+        if cached is not None:
+            self.stats["memory"] += 1
+            return set(cached)
+
+        redis = self._redis_client()
+        if redis is not None:
+            try:
+                aliases = _decode_aliases(redis.get(key))
+                if aliases is not None:
+                    self.stats["redis"] += 1
+                    self._local_put(key, aliases, self.ttl if aliases else self.negative_ttl)
+                    print(f"[Geonames] 💾 Found Redis cache: {len(aliases)} aliases for '{city_norm}'")
+                    return aliases
+            except Exception as e:
+                print(f"[Geonames] ⚠️  Redis cache read error: {e}")
+
+        aliases, found = self._fetch_api(city_norm, country)
+        self.stats["api"] += 1
+        if found is None:
+            # API error: don't hammer it, but don't record the city as unknown either
+            self._local_put(key, set(), _ERROR_TTL_SECONDS)
+            return set()
+        if not aliases:
+            self.stats["negative"] += 1
+        ttl = self.ttl if aliases else self.negative_ttl
+        if redis is not None:
+            try:
+                redis.setex(key, ttl, json.dumps(sorted(aliases)).encode("utf-8"))
+            except Exception as e:
+                print(f"[Geonames] ⚠️  Redis cache write error: {e}")
+        self._local_put(key, aliases, ttl)
+        print(f"[Geonames] 💾 Cached {len(aliases)} aliases for '{city_norm}' (TTL: {ttl}s)")
+        return aliases
+
+    def _fetch_api(self, city_norm: str, country: Optional[str]) -> Tuple[Set[str], Optional[bool]]:
+        """(aliases, found): found is False when Geonames doesn't know the city, None on errors."""
+        username = os.getenv("GEONAMES_USERNAME")
+        aliases: Set[str] = set()
+        print(f"[Geonames] 🌐 Making API call to Geonames for '{city_norm}'...")
+        try:
+            with httpx.Client(timeout=12.0) as client:
+                # Search the city to find geonameId
+                params = {"q": city_norm, "maxRows": 1, "username": username}
+                if country:
+                    params["country"] = country
+                r = client.get("http://api.geonames.org/searchJSON", params=params)
+                r.raise_for_status()
+                data = r.json()
+                geonames = (data or {}).get("geonames") or []
+                geoname_id = geonames[0].get("geonameId") if geonames else None
+                if not geoname_id:
+                    print(f"[Geonames] ⚠️  No results found for '{city_norm}' in Geonames search")
+                    return aliases, False
+
+                # Fetch alternate names for that geonameId
+                r2 = client.get("http://api.geonames.org/getJSON", params={"geonameId": geoname_id, "username": username})
+                r2.raise_for_status()
+                alt = r2.json().get("alternateNames") or []
+                for item in alt:
+                    name = (item.get("name") or "").strip().lower()
+                    # Keep short, meaningful names; skip transliterations with weird scripts
+                    if name and 2 <= len(name) <= 64:
+                        aliases.add(name)
+                print(f"[Geonames] ✅ Extracted {len(aliases)} alternate names for geonameId {geoname_id}")
+        except Exception as e:
+            print(f"[Geonames] ❌ API error: {type(e).__name__}: {e}")
+            return set(), None
+        return aliases, True
+
+    def prewarm(self, cities: Iterable[str], country: Optional[str] = None) -> int:
+        """Resolve `cities` ahead of traffic; returns how many were warmed."""
+        started = time.time()
+        results = self.get_many(cities, country)
+        print(f"[Geonames] 🔥 Prewarmed {len(results)} cities in {time.time() - started:.1f}s")
+        return len(results)
+
+
+_RESOLVER: Optional[GeonamesResolver] = None
+_RESOLVER_LOCK = threading.Lock()
+_PREWARM_STARTED = False
+
+
+def get_resolver() -> GeonamesResolver:
+    """Process-wide resolver (one LRU, one Redis client)."""
+    global _RESOLVER
+    if _RESOLVER is None:
+        with _RESOLVER_LOCK:
+            if _RESOLVER is None:
+                _RESOLVER = GeonamesResolver()
+    return _RESOLVER
+
+
 def get_city_aliases(city: str, country: Optional[str] = None) -> Set[str]:
     """
     Return a set of alternate names for a city using Geonames, with Redis + in-memory caching.
     If Geonames is not configured or unavailable, returns at least the input city (normalized).
     """
-    base_set: Set[str] = set()
-    if not city:
-        return base_set
-    city_norm = city.strip().lower()
-    base_set.add(city_norm)
-
-    print(f"[Geonames] 🔍 Looking up aliases for city: '{city_norm}'" + (f", country: '{country}'" if country else ""))
-
-    # Static common aliases that we know users care about (fast path)
-    static_aliases = {
-        "bengaluru": {"bangalore"},
-        "bangalore": {"bengaluru"},
-        "gurgaon": {"gurugram"},
-        "gurugram": {"gurgaon"},
-        "mumbai": {"bombay"},
-        "bombay": {"mumbai"},
-        "kolkata": {"calcutta"},
-        "calcutta": {"kolkata"},
-        "puducherry": {"pondicherry"},
-        "pondicherry": {"puducherry"},
-        "pune": {"poona"},
-        "poona": {"pune"},
-        "delhi": {"new delhi"},
-        "new delhi": {"delhi"},
-    }
-    if city_norm in static_aliases:
-        static_found = static_aliases[city_norm]
-        base_set |= static_found
-        print(f"[Geonames] ✅ Found static aliases: {static_found}")
-
-    # Geonames lookup (if configured)
-    username = os.getenv("GEONAMES_USERNAME")
-    if not username:
-        print(f"[Geonames] ⚠️  GEONAMES_USERNAME not configured, using static aliases only")
-        return base_set
-    if httpx is None:
-        print(f"[Geonames] ⚠️  httpx not available, using static aliases only")
-        return base_set
-    
-    print(f"[Geonames] ✅ Geonames username configured: {username[:3]}***")
-
-    key = _cache_key(city_norm, country)
-    now = time.time()
-
-    # In-memory cache
-    cached = _IN_MEMORY_CACHE.get(key)
-    if cached and (now - cached[0] < _CACHE_TTL_SECONDS):
-        cached_aliases = cached[1]
-        print(f"[Geonames] 💾 Found in-memory cache: {len(cached_aliases)} aliases")
-        return base_set | cached_aliases
-
-    # Redis cache
-    aliases: Set[str] = set()
-    redis = get_redis_client()
-    if redis:
+    return get_resolver().get(city, country)
+
+
+def get_many_city_aliases(cities: Iterable[str], country: Optional[str] = None) -> Dict[str, Set[str]]:
+    """Batch form of get_city_aliases, keyed by normalized (lowercased) city."""
+    return get_resolver().get_many(cities, country)
+
+
+def top_cities(limit: int = GEONAMES_PREWARM_LIMIT) -> List[str]:
+    """GEONAMES_PREWARM_CITIES followed by the cities of the most popular searches."""
+    cities = list(GEONAMES_PREWARM_CITIES)
+    redis = get_resolver()._redis_client()
+    if redis is not None:
         try:
-            data = redis.get(key)
-            if data:
-                decoded = json.loads(data.decode("utf-8"))
-                if isinstance(decoded, list):
-                    aliases |= {str(x).strip().lower() for x in decoded if x}
-                    _IN_MEMORY_CACHE[key] = (now, set(aliases))
-                    print(f"[Geonames] 💾 Found Redis cache: {len(aliases)} aliases")
-                    return base_set | aliases
+            from pipelines.popularity import QueryPopularity
+            for query in QueryPopularity(redis).top(limit):
+                city = (query.get("location") or "").split(",")[0].strip().lower()
+                if city and city not in ("remote", "anywhere"):
+                    cities.append(city)
         except Exception as e:
-            print(f"[Geonames] ⚠️  Redis cache read error: {e}")
-    else:
-        print(f"[Geonames] ⚠️  Redis not available, skipping cache")
+            print(f"[Geonames] ⚠️  Could not read popular search locations: {e}")
+    return list(dict.fromkeys(cities))[:max(limit, len(GEONAMES_PREWARM_CITIES))]
 
-    print(f"[Geonames] 🌐 Making API call to Geonames for '{city_norm}'...")
-    try:
-        with httpx.Client(timeout=12.0) as client:
-            # Search the city to find geonameId
-            params = {"q": city_norm, "maxRows": 1, "username": username}
-            if country:
-                params["country"] = country
-            print(f"[Geonames] 📡 GET searchJSON: q='{city_norm}'" + (f", country='{country}'" if country else ""))
-            r = client.get("http://api.geonames.org/searchJSON", params=params)
-            r.raise_for_status()
-            data = r.json()
-            geonames = (data or {}).get("geonames") or []
-            if not geonames:
-                print(f"[Geonames] ⚠️  No results found for '{city_norm}' in Geonames search")
-                _IN_MEMORY_CACHE[key] = (now, set())
-                return base_set
-            geoname_id = geonames[0].get("geonameId")
-            found_name = geonames[0].get("name", "")
-            print(f"[Geonames] ✅ Found geonameId: {geoname_id} (name: '{found_name}')")
-            if not geoname_id:
-                print(f"[Geonames] ⚠️  No geonameId in search result")
-                _IN_MEMORY_CACHE[key] = (now, set())
-                return base_set
-
-            # Fetch alternate names for that geonameId
-            print(f"[Geonames] 📡 GET getJSON: geonameId={geoname_id}")
-            r2 = client.get("http://api.geonames.org/getJSON", params={"geonameId": geoname_id, "username": username})
-            r2.raise_for_status()
-            data2 = r2.json()
-            alt = data2.get("alternateNames") or []
-            print(f"[Geonames] 📋 Received {len(alt)} alternate name entries from API")
-            for item in alt:
-                name = (item.get("name") or "").strip().lower()
-                if not name:
-                    continue
-                # Keep short, meaningful names; skip transliterations with weird scripts
-                if 2 <= len(name) <= 64:
-                    aliases.add(name)
-            print(f"[Geonames] ✅ Extracted {len(aliases)} valid alternate names: {sorted(list(aliases))[:10]}{'...' if len(aliases) > 10 else ''}")
-    except Exception as e:
-        print(f"[Geonames] ❌ API error: {type(e).__name__}: {e}")
-        # Fail silently; just return what we have
-        pass
-
-    if aliases:
-        # Save to Redis
-        if redis:
-            try:
-                redis.setex(key, _CACHE_TTL_SECONDS, json.dumps(sorted(aliases)).encode("utf-8"))
-                print(f"[Geonames] 💾 Saved {len(aliases)} aliases to Redis cache (TTL: {_CACHE_TTL_SECONDS}s)")
-            except Exception as e:
-                print(f"[Geonames] ⚠️  Redis cache write error: {e}")
-        _IN_MEMORY_CACHE[key] = (now, set(aliases))
-        print(f"[Geonames] 💾 Saved {len(aliases)} aliases to in-memory cache")
-    else:
-        print(f"[Geonames] ⚠️  No alternate names found from API, using static aliases only")
 
-    final_aliases = base_set | aliases
-    print(f"[Geonames] ✅ Final result: {len(final_aliases)} total aliases for '{city_norm}': {sorted(list(final_aliases))[:15]}{'...' if len(final_aliases) > 15 else ''}")
-    return final_aliases
+def start_prewarm(limit: int = GEONAMES_PREWARM_LIMIT) -> None:
+    """Warm the alias caches for the top cities in a background thread (once per process)."""
+    global _PREWARM_STARTED
+    if _PREWARM_STARTED or limit <= 0:
+        return
+    _PREWARM_STARTED = True
 
+    def _run():
+        try:
+            get_resolver().prewarm(top_cities(limit))
+        except Exception as e:
+            print(f"[Geonames] ⚠️  Prewarm failed: {e}")
 
+    threading.Thread(target=_run, name="geonames-prewarm", daemon=True).start()
@@ -0,0 +1,302 @@
+"""
+Offline GeoNames index: a sorted, memory-mapped name -> place -> aliases table built from a GeoNames dump.
+"""
+import mmap
+import os
+import struct
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Default location of the built index (python -m utils.geonames_index --cities ...)
+GEONAMES_INDEX_PATH = os.getenv(
+    "GEONAMES_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "geonames.idx"),
+)
+
+_MAGIC = b"GNIX"
+_VERSION = 1
+# magic, version, n_places, n_names, places / names / aliases / strings section offsets
+_HEADER = struct.Struct("<4sIIIQQQQ")
+# geoname_id, population, lat, lon, name ref, region ref, alias start, alias count, country code
+_PLACE = struct.Struct("<IIffIIII2s2x")
+# name ref, place index (sorted by name, then population descending)
+_NAME = struct.Struct("<II")
+_REF = struct.Struct("<I")
+_LEN = struct.Struct("<H")
+
+# alternateNames "languages" that are not names (links, postcodes, airport codes, ...)
+_SKIP_NAME_TYPES = {"link", "post", "iata", "icao", "faac", "wkdt", "unlc", "fr_1793", "tcid"}
+MIN_ALIAS_LEN = 2
+MAX_ALIAS_LEN = 64
+
+
+class GeoPlace(NamedTuple):
+    idx: int
+    geoname_id: int
+    name: str
+    country_code: str
+    region: str
+    lat: float
+    lon: float
+    population: int
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(str(name or "").strip().lower().split())
+
+
+def _keep(name: str) -> bool:
+    return MIN_ALIAS_LEN <= len(name) <= MAX_ALIAS_LEN
+
+
+def _read_admin1(path: Optional[str]) -> Dict[str, str]:
+    """admin1CodesASCII.txt: "IN.19<TAB>Karnataka<TAB>Karnataka<TAB>1267701" -> {"IN.19": "Karnataka"}."""
+    names: Dict[str, str] = {}
+    if not path:
+        return names
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) >= 2:
+                names[cols[0]] = cols[1]
+    return names
+
+
+def build_index(
+    cities_path: str,
+    out_path: str = GEONAMES_INDEX_PATH,
+    alternate_names_path: Optional[str] = None,
+    admin1_path: Optional[str] = None,
+    min_population: int = 0,
+) -> Dict[str, int]:
+    """
+    Build the index from a GeoNames cities dump (e.g. cities15000.txt; populated places
+    only), optionally enriched with alternateNamesV2.txt and admin1CodesASCII.txt.
+    Every name, ASCII name and alternate name of a place becomes a lookup key.
+    Returns counts of places, lookup names and distinct strings written.
+    """
+    admin1 = _read_admin1(admin1_path)
+    places: List[dict] = []
+    by_id: Dict[int, dict] = {}
+    with open(cities_path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] != "P":
+                continue
+            try:
+                population = int(cols[14] or 0)
+                place = {
+                    "geoname_id": int(cols[0]),
+                    "name": cols[1],
+                    "lat": float(cols[4]),
+                    "lon": float(cols[5]),
+                    "country_code": cols[8][:2].upper(),
+                    "region": admin1.get(f"{cols[8]}.{cols[10]}", cols[10]),
+                    "population": population,
+                }
+            except (TypeError, ValueError):
+                continue
+            if population < min_population:
+                continue
+            aliases = {normalize_name(cols[1]), normalize_name(cols[2])}
+            aliases |= {normalize_name(a) for a in cols[3].split(",")}
+            place["aliases"] = {a for a in aliases if _keep(a)}
+            places.append(place)
+            by_id[place["geoname_id"]] = place
+
+    if alternate_names_path:
+        # Streamed: the full file is several hundred MB and most rows are not cities
+        with open(alternate_names_path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 4 or cols[2] in _SKIP_NAME_TYPES:
+                    continue
+                try:
+                    place = by_id.get(int(cols[1]))
+                except ValueError:
+                    continue
+                if place is not None:
+                    alias = normalize_name(cols[3])
+                    if _keep(alias):
+                        place["aliases"].add(alias)
+
+    # Most populous first, so equal names resolve to the largest place
+    places.sort(key=lambda p: -p["population"])
+
+    strings = bytearray()
+    string_refs: Dict[str, int] = {}
+
+    def ref(value: str) -> int:
+        existing = string_refs.get(value)
+        if existing is not None:
+            return existing
+        data = value.encode("utf-8")[:0xFFFF]
+        offset = len(strings)
+        strings.extend(_LEN.pack(len(data)))
+        strings.extend(data)
+        string_refs[value] = offset
+        return offset
+
+    place_records = bytearray()
+    alias_records = bytearray()
+    names: List[Tuple[bytes, int, int]] = []
+    alias_count = 0
+    for idx, place in enumerate(places):
+        aliases = sorted(place["aliases"])
+        place_records.extend(_PLACE.pack(
+            place["geoname_id"], min(place["population"], 0xFFFFFFFF), place["lat"], place["lon"],
+            ref(place["name"]), ref(place["region"] or ""), alias_count, len(aliases),
+            place["country_code"].encode("ascii", "replace")[:2].ljust(2),
+        ))
+        for alias in aliases:
+            alias_ref = ref(alias)
+            alias_records.extend(_REF.pack(alias_ref))
+            names.append((alias.encode("utf-8"), idx, alias_ref))
+        alias_count += len(aliases)
+    # Places are already in population order, so a stable sort keeps the largest first per name
+    names.sort(key=lambda n: n[0])
+    name_records = bytearray()
+    for _, idx, alias_ref in names:
+        name_records.extend(_NAME.pack(alias_ref, idx))
+
+    places_off = _HEADER.size
+    names_off = places_off + len(place_records)
+    aliases_off = names_off + len(name_records)
+    strings_off = aliases_off + len(alias_records)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(_HEADER.pack(_MAGIC, _VERSION, len(places), len(names), places_off, names_off, aliases_off, strings_off))
+        out.write(place_records)
+        out.write(name_records)
+        out.write(alias_records)
+        out.write(strings)
+    os.replace(tmp_path, out_path)  # readers never see a half-written index
+    return {"places": len(places), "names": len(names), "strings": len(string_refs)}
+
+
+class GeoNamesIndex:
+    """
+    Read-only view over a built index. Opening maps the file and parses the header
+    only; lookups binary-search the sorted name table in the mapping, so memory is
+    shared between processes and nothing is loaded up front.
+    """
+
+    def __init__(self, path: str = GEONAMES_INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_places, self.n_names,
+         self._places_off, self._names_off, self._aliases_off, self._strings_off) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a GeoNames index (version {_VERSION})")
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _string(self, offset: int) -> bytes:
+        start = self._strings_off + offset
+        (length,) = _LEN.unpack_from(self._mm, start)
+        return self._mm[start + 2:start + 2 + length]
+
+    def _name(self, i: int) -> Tuple[bytes, int]:
+        name_ref, place_idx = _NAME.unpack_from(self._mm, self._names_off + i * _NAME.size)
+        return self._string(name_ref), place_idx
+
+    def _place_indexes(self, name: str) -> List[int]:
+        key = normalize_name(name).encode("utf-8")
+        lo, hi = 0, self.n_names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.n_names:
+            current, place_idx = self._name(lo)
+            if current != key:
+                break
+            found.append(place_idx)
+            lo += 1
+        return found
+
+    def place(self, idx: int) -> GeoPlace:
+        (geoname_id, population, lat, lon, name_ref, region_ref, _, _, country) = _PLACE.unpack_from(
+            self._mm, self._places_off + idx * _PLACE.size
+        )
+        return GeoPlace(
+            idx, geoname_id, self._string(name_ref).decode("utf-8"), country.decode("ascii", "replace").strip(),
+            self._string(region_ref).decode("utf-8"), lat, lon, population,
+        )
+
+    def lookup(self, name: str, country: Optional[str] = None) -> List[GeoPlace]:
+        """Places known by this name, most populous first (optionally in one ISO country)."""
+        places = [self.place(idx) for idx in self._place_indexes(name)]
+        if country and len(country.strip()) == 2:
+            places = [p for p in places if p.country_code == country.strip().upper()]
+        return places
+
+    def best(self, name: str, country: Optional[str] = None) -> Optional[GeoPlace]:
+        places = self.lookup(name, country)
+        return places[0] if places else None
+
+    def aliases(self, place: GeoPlace) -> Set[str]:
+        _, _, _, _, _, _, start, count, _ = _PLACE.unpack_from(self._mm, self._places_off + place.idx * _PLACE.size)
+        out = set()
+        for i in range(start, start + count):
+            (alias_ref,) = _REF.unpack_from(self._mm, self._aliases_off + i * _REF.size)
+            out.add(self._string(alias_ref).decode("utf-8"))
+        return out
+
+    def city_aliases(self, city: str, country: Optional[str] = None) -> Optional[Set[str]]:
+        """All names of the most populous place called `city`; None when the index doesn't know it."""
+        place = self.best(city, country)
+        return self.aliases(place) if place else None
+
+
+_INDEX: Optional[GeoNamesIndex] = None
+_INDEX_CHECKED = False
+
+
+def get_geonames_index() -> Optional[GeoNamesIndex]:
+    """Process-wide index at GEONAMES_INDEX_PATH, or None if it has not been built."""
+    global _INDEX, _INDEX_CHECKED
+    if not _INDEX_CHECKED:
+        _INDEX_CHECKED = True
+        if os.path.exists(GEONAMES_INDEX_PATH):
+            try:
+                _INDEX = GeoNamesIndex(GEONAMES_INDEX_PATH)
+                print(f"[Geonames] Offline index loaded: {_INDEX.n_places} places, {_INDEX.n_names} names ({GEONAMES_INDEX_PATH})")
+            except Exception as e:
+                print(f"[Geonames] Failed to open offline index {GEONAMES_INDEX_PATH}: {e}")
+    return _INDEX
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Build the offline GeoNames alias index')
+    parser.add_argument('--cities', required=True, help='GeoNames cities dump, e.g. cities15000.txt')
+    parser.add_argument('--alternate-names', help='alternateNamesV2.txt (optional, adds alternate spellings)')
+    parser.add_argument('--admin1', help='admin1CodesASCII.txt (optional, adds region names)')
+    parser.add_argument('--min-population', type=int, default=0, help='Skip smaller places (default: 0)')
+    parser.add_argument('--out', default=GEONAMES_INDEX_PATH, help=f'Output path (default: {GEONAMES_INDEX_PATH})')
+    args = parser.parse_args()
+
+    started = time.time()
+    counts = build_index(
+        args.cities,
+        out_path=args.out,
+        alternate_names_path=args.alternate_names,
+        admin1_path=args.admin1,
+        min_population=args.min_population,
+    )
+    size_mb = os.path.getsize(args.out) / (1024.0 * 1024.0)
+    print(f"[Geonames] Built {args.out}: {counts['places']} places, {counts['names']} names, "
+          f"{size_mb:.1f} MB in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""
+Canonical location parsing (city / region / country code / geonameId) and location tiers.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from utils.geo import GEO_LOCAL_RADIUS_KM, distance_boost, geo_cell, haversine_km, within_sql
+
+# Country name (and common shorthand) -> ISO 3166-1 alpha-2
+COUNTRY_CODES = {
+    'india': 'in',
+    'united states': 'us',
+    'united states of america': 'us',
+    'usa': 'us',
+    'united kingdom': 'gb',
+    'uk': 'gb',
+    'great britain': 'gb',
+    'england': 'gb',
+    'canada': 'ca',
+    'australia': 'au',
+    'germany': 'de',
+    'france': 'fr',
+    'spain': 'es',
+    'italy': 'it',
+    'netherlands': 'nl',
+    'belgium': 'be',
+    'switzerland': 'ch',
+    'austria': 'at',
+    'sweden': 'se',
+    'norway': 'no',
+    'denmark': 'dk',
+    'finland': 'fi',
+    'poland': 'pl',
+    'portugal': 'pt',
+    'greece': 'gr',
+    'ireland': 'ie',
+    'japan': 'jp',
+    'china': 'cn',
+    'south korea': 'kr',
+    'singapore': 'sg',
+    'malaysia': 'my',
+    'thailand': 'th',
+    'indonesia': 'id',
+    'philippines': 'ph',
+    'vietnam': 'vn',
+    'brazil': 'br',
+    'mexico': 'mx',
+    'argentina': 'ar',
+    'chile': 'cl',
+    'colombia': 'co',
+    'south africa': 'za',
+    'egypt': 'eg',
+    'uae': 'ae',
+    'united arab emirates': 'ae',
+    'saudi arabia': 'sa',
+    'israel': 'il',
+    'turkey': 'tr',
+    'russia': 'ru',
+    'new zealand': 'nz',
+}
+_KNOWN_CODES = set(COUNTRY_CODES.values())
+
+# Regions that pin the country when a posting leaves it out ("Pune, Maharashtra")
+REGION_COUNTRIES = {
+    'karnataka': 'in', 'maharashtra': 'in', 'tamil nadu': 'in', 'gujarat': 'in',
+    'rajasthan': 'in', 'punjab': 'in', 'haryana': 'in', 'uttar pradesh': 'in',
+    'west bengal': 'in', 'telangana': 'in', 'andhra pradesh': 'in', 'kerala': 'in',
+    'odisha': 'in', 'bihar': 'in', 'madhya pradesh': 'in', 'delhi': 'in', 'goa': 'in',
+    'ncr': 'in', 'delhi ncr': 'in',
+    'california': 'us', 'texas': 'us', 'florida': 'us', 'new york': 'us', 'washington': 'us',
+    'massachusetts': 'us', 'illinois': 'us', 'colorado': 'us', 'georgia': 'us',
+    'ca': 'us', 'tx': 'us', 'fl': 'us', 'ny': 'us', 'wa': 'us', 'ma': 'us', 'il': 'us', 'co': 'us',
+    'ontario': 'ca', 'british columbia': 'ca', 'quebec': 'ca',
+}
+
+_REMOTE_WORDS = {'remote', 'anywhere', 'worldwide', 'work from home', 'wfh', 'n/a', 'na'}
+
+# Words that follow the city name (administrative divisions, suffixes, states, countries)
+_CITY_SKIP_WORDS = {
+    'urban', 'metro', 'city', 'district', 'region', 'area', 'zone',
+    'karnataka', 'maharashtra', 'tamil', 'nadu', 'gujarat',
+    'rajasthan', 'punjab', 'haryana', 'uttar', 'pradesh', 'west', 'bengal',
+    'telangana', 'andhra', 'kerala', 'odisha', 'bihar',
+    'india', 'in', 'usa', 'us', 'united', 'states', 'uk', 'kingdom',
+    'ca', 'california', 'tx', 'texas', 'fl', 'florida', 'ny'
+}
+
+# Location tiers, best first; comparisons are plain integer comparisons
+TIER_EXACT = 3  # city and country
+TIER_CITY = 2
+TIER_COUNTRY = 1
+TIER_OTHER = 0
+TIER_NAMES = {TIER_EXACT: 'exact', TIER_CITY: 'city', TIER_COUNTRY: 'country', TIER_OTHER: 'other'}
+TIER_BOOST = {TIER_EXACT: 1.3, TIER_CITY: 1.2, TIER_COUNTRY: 1.1, TIER_OTHER: 1.0}
+
+
+class ParsedLocation(NamedTuple):
+    city: Optional[str] = None  # lowercase; the gazetteer's name when it knows the place
+    region: Optional[str] = None
+    country_code: Optional[str] = None  # ISO alpha-2, uppercase
+    geoname_id: Optional[int] = None
+    latitude: Optional[float] = None  # from the gazetteer
+    longitude: Optional[float] = None
+    geo_cell: Optional[int] = None  # utils.geo grid cell of (latitude, longitude)
+
+
+class UserLocation(NamedTuple):
+    """A searcher's location, resolved once per request."""
+    city: Optional[str] = None
+    country_code: Optional[str] = None
+    geoname_id: Optional[int] = None
+    city_names: frozenset = frozenset()  # the city and all of its aliases
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+def extract_city(location: str) -> str:
+    """Extract the primary city name from a location string like 'Bangalore, India' or 'Bangalore Urban, Karnataka, India'."""
+    if not location:
+        return ""
+
+    location_lower = location.strip().lower()
+
+    # First, try splitting by commas/semicolons (common delimiters)
+    parts = [p.strip() for p in re.split(r'[,;|]', location_lower)]
+    city_part = parts[0] if parts and parts[0] else location_lower
+
+    words = city_part.split()
+    if not words:
+        return ""
+
+    # Take words until we hit a skip word (max 3 words for city names)
+    city_words = []
+    for word in words:
+        if len(city_words) >= 3 or word in _CITY_SKIP_WORDS:
+            break
+        # If we see the same word again (e.g., "Delhi Delhi"), stop at first occurrence
+        if city_words and word == city_words[0]:
+            break
+        city_words.append(word)
+
+    if not city_words:
+        # Fallback: use first word if all were skipped
+        city_words = [words[0]]
+
+    city = ' '.join(city_words).strip()
+    city = re.sub(r'\s+(urban|metro|city|district)$', '', city, flags=re.IGNORECASE)
+    return city.strip()
+
+
+def country_code(value: Optional[str]) -> Optional[str]:
+    """ISO alpha-2 code for a country name or code, or None if unknown."""
+    if not value:
+        return None
+    value = value.strip().lower().strip('().')
+    if value in COUNTRY_CODES:
+        return COUNTRY_CODES[value].upper()
+    if len(value) == 2 and value in _KNOWN_CODES:
+        return value.upper()
+    return None
+
+
+def _gazetteer():
+    try:
+        from utils.geonames_index import get_geonames_index
+        return get_geonames_index()
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def parse_location(location: Optional[str]) -> ParsedLocation:
+    """
+    Canonical parts of a free-text job location. Run once at ingest (and cached for
+    legacy rows that predate the columns). Remote/unknown locations parse to all None.
+    """
+    text = " ".join(str(location or "").lower().split())
+    parts = [p.strip() for p in re.split(r'[,;|]', text) if p.strip()]
+    if not parts or parts[0] in _REMOTE_WORDS:
+        return ParsedLocation()
+
+    code = country_code(parts[-1])
+    if code and len(parts) == 2 and parts[-1] in REGION_COUNTRIES:
+        # "San Francisco, CA": a state abbreviation that is also a country code
+        index = _gazetteer()
+        state_country = REGION_COUNTRIES[parts[-1]].upper()
+        city_guess = extract_city(parts[0])
+        if index is None or index.best(city_guess, state_country) is not None or index.best(city_guess, code) is None:
+            code = None
+    if code:
+        parts = parts[:-1]
+        if not parts:
+            return ParsedLocation(country_code=code)  # a country on its own
+    region = parts[-1] if len(parts) > 1 else None
+    if region and not code and REGION_COUNTRIES.get(region):
+        code = REGION_COUNTRIES[region].upper()
+
+    city = extract_city(parts[0]) or None
+    geoname_id = latitude = longitude = None
+    index = _gazetteer()
+    if index is not None and city:
+        try:
+            place = index.best(city, code)
+        except Exception:
+            place = None
+        if place is not None:
+            city = " ".join(place.name.lower().split())
+            geoname_id = place.geoname_id
+            region = region or (place.region.lower() if place.region else None)
+            code = code or place.country_code or None
+            latitude, longitude = round(place.lat, 5), round(place.lon, 5)
+    return ParsedLocation(city, region, code, geoname_id, latitude, longitude, geo_cell(latitude, longitude))
+
+
+def resolve_user_location(
+    city: Optional[str],
+    country: Optional[str] = None,
+    aliases: Optional[Set[str]] = None,
+) -> UserLocation:
+    """Canonical city (with aliases) and country code of a searcher's location (`aliases` if already looked up)."""
+    code = country_code(country) if country else None
+    if not city or country_code(city):
+        # Only a country was given ("India")
+        return UserLocation(country_code=code or country_code(city))
+    parsed = parse_location(f"{city}, {code}" if code else city)
+    names: Set[str] = {city.strip().lower()}
+    if parsed.city:
+        names.add(parsed.city)
+    if aliases is not None:
+        names |= {a.lower() for a in aliases if a}
+    else:
+        try:
+            from utils.geonames import get_city_aliases
+            names |= set(get_city_aliases(city.strip().lower()))
+        except Exception:
+            pass
+    return UserLocation(
+        parsed.city or city.strip().lower(), code, parsed.geoname_id,
+        frozenset(n for n in names if n), parsed.latitude, parsed.longitude,
+    )
+
+
+def _job_location(job: Dict[str, Any]) -> ParsedLocation:
+    """A job's canonical columns, parsed from its location text for rows that predate them."""
+    if job.get('city') is None and job.get('country_code') is None:
+        return parse_location(job.get('location'))
+    return ParsedLocation(
+        job.get('city'), job.get('region'), job.get('country_code'), job.get('geoname_id'),
+        job.get('latitude'), job.get('longitude'), job.get('geo_cell'),
+    )
+
+
+def distance_km(user: UserLocation, job: Dict[str, Any]) -> Optional[float]:
+    """Great-circle distance between the searcher and a job, when both have coordinates."""
+    if user.latitude is None or user.longitude is None:
+        return None
+    parsed = _job_location(job)
+    if parsed.latitude is None or parsed.longitude is None:
+        return None
+    return haversine_km(user.latitude, user.longitude, float(parsed.latitude), float(parsed.longitude))
+
+
+def location_tier(user: UserLocation, job: Dict[str, Any], distance: Optional[float] = None) -> int:
+    """
+    Tier of a job for a searcher, from the job's canonical columns (parsed on the fly
+    for older rows). Jobs within GEO_LOCAL_RADIUS_KM of the searcher's city count as
+    that city.
+    """
+    if not user.city and not user.country_code:
+        return TIER_OTHER
+    parsed = _job_location(job)
+    if distance is None:
+        distance = distance_km(user, job)
+    city_match = bool(user.city) and (
+        (user.geoname_id is not None and parsed.geoname_id == user.geoname_id)
+        or parsed.city in user.city_names
+        or (distance is not None and distance <= GEO_LOCAL_RADIUS_KM)
+    )
+    country_match = bool(user.country_code) and parsed.country_code == user.country_code
+    if city_match and country_match:
+        return TIER_EXACT
+    if city_match:
+        return TIER_CITY
+    if country_match:
+        return TIER_COUNTRY
+    return TIER_OTHER
+
+
+def location_tier_sql(user: UserLocation, alias: str = "j") -> Tuple[str, List[Any]]:
+    """The same tiering as a SQL CASE over the indexed canonical columns, with its params."""
+    params: List[Any] = []
+    if user.city:
+        city_sql = f"({alias}.city = ANY(%s)"
+        params.append(sorted(user.city_names))
+        if user.geoname_id is not None:
+            city_sql += f" OR {alias}.geoname_id = %s"
+            params.append(user.geoname_id)
+        if user.latitude is not None and user.longitude is not None:
+            # Same metro area: indexed cell prefilter, then the exact distance
+            local_sql, local_params = within_sql(user.latitude, user.longitude, GEO_LOCAL_RADIUS_KM, alias)
+            city_sql += f" OR {local_sql}"
+            params.extend(local_params)
+        city_sql += ")"
+    else:
+        city_sql = "FALSE"
+    if user.country_code:
+        country_sql = f"({alias}.country_code = %s)"
+        country_params = [user.country_code]
+    else:
+        country_sql, country_params = "FALSE", []
+    sql = (
+        f"CASE WHEN {city_sql} AND {country_sql} THEN {TIER_EXACT}"
+        f" WHEN {city_sql} THEN {TIER_CITY}"
+        f" WHEN {country_sql} THEN {TIER_COUNTRY}"
+        f" ELSE {TIER_OTHER} END"
+    )
+    return sql, params + country_params + params + country_params
+
+
+def location_boost(user: UserLocation, job: Dict[str, Any], tier: Optional[int] = None, distance: Optional[float] = None) -> float:
+    """Score multiplier for a job: its tier boost, or the distance-decay boost when that is larger."""
+    if distance is None:
+        distance = distance_km(user, job)
+    if tier is None:
+        tier = location_tier(user, job, distance)
+    return max(TIER_BOOST[tier], distance_boost(distance))
@@ -0,0 +1,76 @@
+"""
+Queueing-delay metrics per fetch priority lane (kept in Redis so every worker reports to one place).
+"""
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import redis
+
+_KEY = "metrics:queue:{lane}"
+_RECENT_KEY = "metrics:queue:{lane}:recent"
+_RECENT_SIZE = 500
+_TTL_SECONDS = 7 * 24 * 3600
+
+
+def message_age(msg_id: Any, now: Optional[float] = None) -> float:
+    """Seconds since a stream entry was added (the ID's first part is its ms timestamp)."""
+    if isinstance(msg_id, bytes):
+        msg_id = msg_id.decode()
+    try:
+        added_ms = int(str(msg_id).split("-", 1)[0])
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, (now or time.time()) - added_ms / 1000.0)
+
+
+def record_queue_delay(redis_client: redis.Redis, lane: str, delay: float, expired: bool = False) -> None:
+    """Record how long a message waited in its lane before a consumer picked it up."""
+    try:
+        key = _KEY.format(lane=lane)
+        recent = _RECENT_KEY.format(lane=lane)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(key, "count", 1)
+        pipe.hincrbyfloat(key, "delay_sum", round(delay, 4))
+        if expired:
+            pipe.hincrby(key, "expired", 1)
+        pipe.hset(key, "last_delay", round(delay, 4))
+        pipe.expire(key, _TTL_SECONDS)
+        pipe.lpush(recent, round(delay, 4))
+        pipe.ltrim(recent, 0, _RECENT_SIZE - 1)
+        pipe.expire(recent, _TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        print(f"[QueueMetrics] Failed to record delay for lane {lane}: {e}")
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def get_queue_delay_metrics(redis_client: redis.Redis, lanes: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """Totals plus p50/p95/max over the most recent messages, per lane."""
+    metrics = {}
+    for lane in lanes:
+        raw = redis_client.hgetall(_KEY.format(lane=lane)) or {}
+        totals = {}
+        for k, v in raw.items():
+            k = k.decode() if isinstance(k, bytes) else k
+            try:
+                totals[k] = float(v)
+            except (TypeError, ValueError):
+                continue
+        recent = sorted(float(v) for v in redis_client.lrange(_RECENT_KEY.format(lane=lane), 0, -1) or [])
+        count = totals.get("count", 0.0)
+        metrics[lane] = {
+            "count": int(count),
+            "expired": int(totals.get("expired", 0.0)),
+            "avg_delay": round(totals.get("delay_sum", 0.0) / count, 3) if count else 0.0,
+            "last_delay": totals.get("last_delay", 0.0),
+            "recent_p50": round(_percentile(recent, 0.5), 3),
+            "recent_p95": round(_percentile(recent, 0.95), 3),
+            "recent_max": round(recent[-1], 3) if recent else 0.0,
+        }
+    return metrics
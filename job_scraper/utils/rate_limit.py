@@ -1,82 +1,221 @@
 """
 Rate limiting utilities using Redis token bucket.
 """
+import atexit
+import os
+import threading
 import time
 import redis
-from typing import Optional
+from typing import Dict, Optional
+
+# Refill, then grant up to ARGV[4] tokens if at least ARGV[3] are available (0 otherwise)
+_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+
+local bucket = redis.call('HMGET', key, 'tokens', 'last_update')
+local current_tokens = tonumber(bucket[1]) or capacity
+local last_update = tonumber(bucket[2]) or now
+
+-- Add tokens based on elapsed time
+local elapsed = now - last_update
+current_tokens = math.min(capacity, current_tokens + (elapsed * rate))
+
+local granted = 0
+if current_tokens >= tokens then
+    granted = math.max(tokens, math.min(want, math.floor(current_tokens)))
+    current_tokens = current_tokens - granted
+end
+redis.call('HMSET', key, 'tokens', current_tokens, 'last_update', now)
+redis.call('EXPIRE', key, 3600)
+return granted
+"""
+
+# Give unused leased tokens back (never above capacity)
+_RETURN_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local returned = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', key, 'tokens', 'last_update')
+local current_tokens = tonumber(bucket[1]) or capacity
+local last_update = tonumber(bucket[2]) or now
+current_tokens = math.min(capacity, current_tokens + ((now - last_update) * rate) + returned)
+redis.call('HMSET', key, 'tokens', current_tokens, 'last_update', now)
+redis.call('EXPIRE', key, 3600)
+return 1
+"""
+
+# Tokens leased per Redis round trip, as a fraction of the bucket's capacity
+RATE_LIMIT_LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.25"))
+# Leased tokens unused after this many seconds go back to Redis (from a timer, so idle workers don't hoard them)
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "10"))
 
 
 class TokenBucket:
-    """Token bucket rate limiter."""
-    
-    def __init__(self, redis_client: redis.Redis, key: str, rate: int, capacity: int):
+    """
+    Token bucket rate limiter shared through Redis. The Lua scripts are registered
+    once and run with EVALSHA. With `lease_size` > 1, a miss on the local bucket
+    leases up to `lease_size` tokens from Redis in one call; later acquires are
+    served in-process until the lease is spent or older than `lease_ttl`, when a
+    timer returns the leftovers even if no further acquire comes. Leased tokens
+    are already taken from the shared bucket, so the global limit holds across workers.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key: str,
+        rate: int,
+        capacity: int,
+        lease_size: int = 1,
+        lease_ttl: float = RATE_LIMIT_LEASE_TTL,
+    ):
         """
         Args:
             redis_client: Redis client
             key: Redis key prefix
             rate: Tokens per second
             capacity: Max tokens
+            lease_size: Tokens to take from Redis per round trip (1 = no local leasing)
+            lease_ttl: Seconds before unused leased tokens are handed back
         """
         self.redis = redis_client
         self.key = key
         self.rate = rate
         self.capacity = capacity
-    
+        self.lease_size = max(1, int(lease_size))
+        self.lease_ttl = lease_ttl
+        self._acquire_script = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._return_script = redis_client.register_script(_RETURN_SCRIPT)
+        self._lock = threading.Lock()
+        self._local = 0
+        self._leased_at = 0.0
+        self._return_timer: Optional[threading.Timer] = None
+        self.stats = {"local": 0, "remote": 0, "denied": 0}
+
     def acquire(self, tokens: int = 1) -> bool:
         """Try to acquire tokens. Returns True if successful."""
-        now = time.time()
-        key = f"ratelimit:{self.key}"
-        
-        # Lua script for atomic token bucket
-        script = """
-        local key = KEYS[1]
-        local rate = tonumber(ARGV[1])
-        local capacity = tonumber(ARGV[2])
-        local tokens = tonumber(ARGV[3])
-        local now = tonumber(ARGV[4])
-        
-        local bucket = redis.call('HMGET', key, 'tokens', 'last_update')
-        local current_tokens = tonumber(bucket[1]) or capacity
-        local last_update = tonumber(bucket[2]) or now
-        
-        -- Add tokens based on elapsed time
-        local elapsed = now - last_update
-        current_tokens = math.min(capacity, current_tokens + (elapsed * rate))
-        
-        if current_tokens >= tokens then
-            current_tokens = current_tokens - tokens
-            redis.call('HMSET', key, 'tokens', current_tokens, 'last_update', now)
-            redis.call('EXPIRE', key, 3600)
-            return 1
-        else
-            redis.call('HSET', key, 'last_update', now)
-            redis.call('EXPIRE', key, 3600)
-            return 0
-        end
-        """
-        
-        result = self.redis.eval(
-            script,
-            1,
-            key,
-            self.rate,
-            self.capacity,
-            tokens,
-            now,
-        )
-        return bool(result)
+        with self._lock:
+            now = time.time()
+            if self._local and now - self._leased_at > self.lease_ttl:
+                self._give_back(now)
+            if self._local >= tokens:
+                self._local -= tokens
+                self.stats["local"] += 1
+                return True
+
+            want = max(tokens, self.lease_size)
+            granted = int(self._acquire_script(
+                keys=[f"ratelimit:{self.key}"],
+                args=[self.rate, self.capacity, tokens, want, now],
+            ) or 0)
+            self.stats["remote"] += 1
+            if granted < tokens:
+                self.stats["denied"] += 1
+                return False
+            if granted > tokens:
+                if not self._local:
+                    self._leased_at = now
+                    self._schedule_return(self.lease_ttl)
+                self._local += granted - tokens
+            return True
+
+    def _schedule_return(self, delay: float) -> None:
+        """Start the lease-expiry timer (caller holds the lock)."""
+        if self._return_timer is None:
+            self._return_timer = threading.Timer(max(0.0, delay), self._expire_lease)
+            self._return_timer.daemon = True
+            self._return_timer.start()
+
+    def _expire_lease(self) -> None:
+        with self._lock:
+            self._return_timer = None
+            if not self._local:
+                return
+            remaining = self._leased_at + self.lease_ttl - time.time()
+            if remaining > 0:
+                # The lease was spent and renewed since this timer started
+                self._schedule_return(remaining)
+            else:
+                self._give_back(time.time())
+
+    def _give_back(self, now: float) -> None:
+        leftover, self._local = self._local, 0
+        try:
+            self._return_script(keys=[f"ratelimit:{self.key}"], args=[self.rate, self.capacity, leftover, now])
+        except Exception as e:
+            print(f"[RateLimit] Failed to return {leftover} leased token(s) for {self.key}: {e}")
+
+    def release(self) -> None:
+        """Return any leased tokens that were not used (call on shutdown)."""
+        with self._lock:
+            if self._return_timer is not None:
+                self._return_timer.cancel()
+                self._return_timer = None
+            if self._local:
+                self._give_back(time.time())
+
+
+# Rate limits per source (requests per minute, burst capacity)
+SOURCE_RATE_LIMITS = {
+    "adzuna": (10, 20),  # 10 req/min, capacity 20
+    "jooble": (10, 20),
+    "remoteok": (5, 10),
+    "linkedin": (5, 10),  # HTTP-first, can be faster
+    "iimjobs": (2, 5),  # Playwright, slower
+}
+
+# One bucket per source per process, so leased tokens are shared by every fetch
+_LIMITERS: Dict[str, TokenBucket] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_source_burst(source: str) -> int:
+    """Burst capacity of a source's bucket (upper bound for in-flight requests)."""
+    return SOURCE_RATE_LIMITS.get(source, (5, 10))[1]
 
 
 def get_rate_limiter(redis_client: redis.Redis, source: str) -> TokenBucket:
-    """Get rate limiter for a source."""
-    # Rate limits per source (requests per minute)
-    limits = {
-        "adzuna": (10, 20),  # 10 req/min, capacity 20
-        "jooble": (10, 20),
-        "remoteok": (5, 10),
-        "linkedin": (5, 10),  # HTTP-first, can be faster
-        "iimjobs": (2, 5),  # Playwright, slower
-    }
-    rate, capacity = limits.get(source, (5, 10))
-    return TokenBucket(redis_client, f"source:{source}", rate / 60.0, capacity)
+    """Get the process-wide rate limiter for a source."""
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(source)
+        if limiter is None or limiter.redis is not redis_client:
+            if limiter is not None:
+                limiter.release()
+            rate, capacity = SOURCE_RATE_LIMITS.get(source, (5, 10))
+            lease_size = max(1, int(capacity * RATE_LIMIT_LEASE_FRACTION))
+            limiter = TokenBucket(redis_client, f"source:{source}", rate / 60.0, capacity, lease_size=lease_size)
+            _LIMITERS[source] = limiter
+        return limiter
+
+
+def get_source_limiter(source: str) -> Optional[TokenBucket]:
+    """
+    The process's bucket for a source for connectors that pay per upstream request:
+    the worker's if it has one, else one on the shared Redis client (None without Redis).
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(source)
+    if limiter is not None:
+        return limiter
+    from deps import get_shared_redis_client
+    redis_client = get_shared_redis_client()
+    return get_rate_limiter(redis_client, source) if redis_client is not None else None
+
+
+def release_rate_limiters() -> None:
+    """Hand every unused leased token back to Redis (registered to run at exit)."""
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    for limiter in limiters:
+        limiter.release()
+
 
+atexit.register(release_rate_limiters)
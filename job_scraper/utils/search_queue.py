@@ -2,10 +2,44 @@
 Utility to enqueue search queries to Redis Streams.
 """
 import json
+import time
 import redis
 import hashlib
 from typing import Dict, Any, List, Optional
-from deps import get_redis_client, STREAM_FANOUT
+from deps import (
+    get_redis_client,
+    fetch_stream_name,
+    source_class,
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    INTERACTIVE_DEADLINE_SECONDS,
+)
+
+
+def publish_fetch_task(
+    redis_client: redis.Redis,
+    payload: Dict[str, Any],
+    priority: str = PRIORITY_LOW,
+    deadline_seconds: Optional[float] = None,
+) -> List[str]:
+    """
+    XADD a fetch task to the per-class streams of the given priority lane, one
+    message per source class (each carrying only that class's sources).
+    High-priority messages carry a deadline after which workers demote them to the low lane.
+    Returns the message IDs.
+    """
+    now = time.time()
+    by_class: Dict[str, List[str]] = {}
+    for source in payload.get("sources") or []:
+        by_class.setdefault(source_class(source), []).append(source)
+    msg_ids = []
+    for cls, cls_sources in by_class.items():
+        message = {**payload, "sources": cls_sources, "priority": priority, "enqueued_at": now}
+        if priority == PRIORITY_HIGH:
+            message["deadline"] = now + (deadline_seconds or INTERACTIVE_DEADLINE_SECONDS)
+        msg_id = redis_client.xadd(fetch_stream_name(cls, priority), {"payload": json.dumps(message)})
+        msg_ids.append(msg_id.decode() if isinstance(msg_id, bytes) else msg_id)
+    return msg_ids
 
 
 def enqueue_search_query(
@@ -19,12 +53,13 @@ def enqueue_search_query(
     page: int = 1,
     page_size: int = 25,
     user_id: Optional[str] = None,  # User ID for user-specific scoring
+    priority: str = PRIORITY_HIGH,  # PRIORITY_LOW for background refreshes
 ) -> str:
     """
     Enqueue a search query to Redis Streams for async processing.
     
     Returns:
-        Message ID
+        Message ID(s), comma-separated when the sources span several stream classes
     """
     redis_client = get_redis_client()
     if not redis_client:
@@ -49,10 +84,10 @@ def enqueue_search_query(
         "since": None,  # Full refresh for search queries
     }
     
-    print(f"[Enqueue] Enqueuing fetch task: sources={sources}, keywords={keywords}, location={location}")
-    msg_id = redis_client.xadd(STREAM_FANOUT, {"payload": json.dumps(payload)})
-    msg_id_str = msg_id.decode() if isinstance(msg_id, bytes) else msg_id
-    print(f"[Enqueue] Enqueued message ID: {msg_id_str}")
+    print(f"[Enqueue] Enqueuing fetch task: sources={sources}, keywords={keywords}, location={location}, priority={priority}")
+    msg_ids = publish_fetch_task(redis_client, payload, priority=priority)
+    msg_id_str = ",".join(msg_ids)
+    print(f"[Enqueue] Enqueued message ID(s): {msg_id_str}")
     return msg_id_str
 
 
@@ -62,3 +97,56 @@ def get_cache_key(keywords: List[str], location: Optional[str] = None, **kwargs)
     key_str = "|".join(key_parts)
     return hashlib.md5(key_str.encode()).hexdigest()
 
+
+
+_NON_LOCATIONS = {"", "any", "anywhere", "everywhere"}
+# Connectors that fetch a single page at query.start_offset (LinkedIn's guest search HTTP path)
+OFFSET_PAGINATED_SOURCES = {"linkedin"}
+# Connectors that only search the first MAX_FETCH_PHRASES keyword phrases, in the order given
+PHRASE_LIMITED_SOURCES = {"adzuna", "jooble", "iimjobs"}
+MAX_FETCH_PHRASES = 5
+
+
+def canonical_fetch_query(
+    keywords: List[str],
+    location: Optional[str] = None,
+    remote_type: Optional[str] = None,
+    source: Optional[str] = None,
+    start_offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Connector-relevant part of a search, normalized so that equivalent searches
+    compare equal (case, whitespace, keyword order and duplicates are ignored).
+    Skills and user identity are left out: they do not change what a connector
+    fetches. Paging is left out too, except for OFFSET_PAGINATED_SOURCES, which
+    fetch a different page per start_offset; the first page keeps the plain key.
+    For PHRASE_LIMITED_SOURCES only the phrases actually searched count.
+    """
+    phrases = [k for k in (keywords or []) if str(k).strip()]
+    if (source or "").lower() in PHRASE_LIMITED_SOURCES:
+        phrases = phrases[:MAX_FETCH_PHRASES]
+    kws = sorted({" ".join(str(k).lower().split()) for k in phrases})
+    loc = " ".join(str(location or "").lower().replace(" ,", ",").split())
+    if loc in _NON_LOCATIONS:
+        loc = ""
+    canonical = {
+        "keywords": kws,
+        "location": loc,
+        "remote_type": (remote_type or "").strip().lower(),
+    }
+    if (source or "").lower() in OFFSET_PAGINATED_SOURCES and start_offset:
+        canonical["start_offset"] = int(start_offset)
+    return canonical
+
+
+def fetch_key(
+    source: str,
+    keywords: List[str],
+    location: Optional[str] = None,
+    remote_type: Optional[str] = None,
+    start_offset: int = 0,
+) -> str:
+    """Canonical key of a connector call: identical keys fetch identical results."""
+    canonical = canonical_fetch_query(keywords, location, remote_type, source, start_offset)
+    key_str = json.dumps({"source": (source or "").lower(), **canonical}, sort_keys=True)
+    return hashlib.sha1(key_str.encode()).hexdigest()[:20]